@@ -0,0 +1,273 @@
+"""Alert rules evaluated as readings are stored.
+
+Rules come from ALERT_RULES in config.py, in dashboard fields and units:
+
+    {"name": "CO2 high", "source": "Sensibo", "field": "co2", "above": 1200, "for_minutes": 15}
+    {"name": "Bad air", "source": "Weather", "field": "iaq", "above": 150}
+    {"name": "Heating up", "source": "Sensibo", "field": "temperature", "rise": 4, "within_minutes": 30}
+    {"name": "Solar silent", "source": "Enphase", "silent_minutes": 60}
+
+"room" limits a rule to one room. Threshold rules ("above"/"below") fire once
+the condition has held for for_minutes (default 0) and resolve when it stops
+holding; trend rules ("rise"/"fall") compare each reading with the lowest/
+highest of the last within_minutes (default 60), kept in monotonic deques; silence rules fire when a source (or
+room) has stored nothing for silent_minutes. Every reading costs O(1)
+amortized work per matching rule, and nothing is read back from SQLite.
+
+Notifications go to the ALERT_SINKS ("log", "file", "webhook") on a
+background thread so a slow webhook never holds up a collector.
+"""
+import collections
+import json
+import queue
+import threading
+import time
+
+import requests
+
+import config
+import queries
+import storage
+
+SILENCE_CHECK_SECONDS = 60
+
+_lock = threading.Lock()
+_rules = None
+_outbox = queue.Queue()
+
+
+def log_sink(event, options):
+    print(f"ALERT {event['message']}")
+
+
+def file_sink(event, options):
+    with open(options.get("path", "alerts.log"), "a") as f:
+        f.write(json.dumps(event) + "\n")
+
+
+def webhook_sink(event, options):
+    requests.post(options["url"], json=event, timeout=options.get("timeout", 10))
+
+
+# Sink type -> fn(event, options); add entries for other destinations
+SINKS = {
+    "log": log_sink,
+    "file": file_sink,
+    "webhook": webhook_sink,
+}
+
+
+class Rule:
+    """One configured rule plus its per-room state."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec["name"]
+        self.source = spec["source"]
+        self.room = spec.get("room")
+        self.field = spec.get("field")
+        source = next((s for s in queries.SOURCES if s["name"] == self.source), None)
+        if source is None:
+            raise ValueError(f"unknown source {self.source!r}")
+        if self.field is not None:
+            if self.field not in source["fields"]:
+                raise ValueError(f"{self.source} has no field {self.field!r}")
+            self.column, self.convert = source["fields"][self.field]
+        self.window_ms = 60000 * spec.get("for_minutes", spec.get("within_minutes", 60))
+        self.silent_ms = 60000 * spec["silent_minutes"] if "silent_minutes" in spec else None
+        kinds = ("above", "below", "rise", "fall", "silent_minutes")
+        if not any(kind in spec for kind in kinds):
+            raise ValueError("needs one of " + ", ".join(kinds))
+        if "for_minutes" not in spec and ("above" in spec or "below" in spec):
+            self.window_ms = 0  # fire on the first reading past the threshold
+        self.state = {}  # room -> state; silence rules start with a None placeholder
+
+    def describe(self, room, value):
+        where = f"{room} {self.source}" if room is not None else self.source
+        if self.silent_ms is not None:
+            return f"{self.name}: {where} silent for {self.spec['silent_minutes']} min"
+        return f"{self.name}: {where} {self.field} = {value}"
+
+    def update(self, room, ts, value):
+        """Fold in one reading; returns "firing", "resolved" or None."""
+        if "above" in self.spec or "below" in self.spec:
+            return self._threshold(room, ts, value)
+        return self._trend(room, ts, value)
+
+    def _threshold(self, room, ts, value):
+        state = self.state.setdefault(room, {"since": None, "firing": False})
+        if "above" in self.spec:
+            holds = value > self.spec["above"]
+        else:
+            holds = value < self.spec["below"]
+        if not holds:
+            state["since"] = None
+            if state["firing"]:
+                state["firing"] = False
+                return "resolved"
+            return None
+        if state["since"] is None:
+            state["since"] = ts
+        if not state["firing"] and ts - state["since"] >= self.window_ms:
+            state["firing"] = True
+            return "firing"
+        return None
+
+    def _trend(self, room, ts, value):
+        state = self.state.setdefault(
+            room, {"lows": collections.deque(), "highs": collections.deque(), "firing": False}
+        )
+        lows, highs = state["lows"], state["highs"]
+        # Monotonic deques: lows[0] / highs[0] are the window's min / max
+        while lows and lows[-1][1] >= value:
+            lows.pop()
+        lows.append((ts, value))
+        while highs and highs[-1][1] <= value:
+            highs.pop()
+        highs.append((ts, value))
+        cutoff = ts - self.window_ms
+        while lows[0][0] < cutoff:
+            lows.popleft()
+        while highs[0][0] < cutoff:
+            highs.popleft()
+        if "rise" in self.spec:
+            holds = value - lows[0][1] >= self.spec["rise"]
+        else:
+            holds = highs[0][1] - value >= self.spec["fall"]
+        if holds != state["firing"]:
+            state["firing"] = holds
+            return "firing" if holds else "resolved"
+        return None
+
+    def check_silence(self, now_ms):
+        """(room, "firing"/"resolved") transitions for a silence rule."""
+        changes = []
+        for room, state in self.state.items():
+            silent = now_ms - state["last"] >= self.silent_ms
+            if silent != state["firing"]:
+                state["firing"] = silent
+                changes.append((room, "firing" if silent else "resolved"))
+        return changes
+
+    def seen(self, room, ts):
+        if room is not None:
+            self.state.pop(None, None)
+        state = self.state.setdefault(room, {"last": ts, "firing": False})
+        state["last"] = max(state["last"], ts)
+
+
+def rules():
+    """Rules compiled from config, once; bad entries are reported and skipped."""
+    global _rules
+    if _rules is None:
+        compiled = []
+        for spec in getattr(config, "ALERT_RULES", []):
+            try:
+                compiled.append(Rule(spec))
+            except (KeyError, ValueError) as e:
+                print(f"Skipping alert rule {spec.get('name', spec)}: {e}")
+        _rules = compiled
+    return _rules
+
+
+def notify(rule, room, status, value, ts):
+    event = {
+        "rule": rule.name,
+        "status": status,
+        "source": rule.source,
+        "room": room,
+        "field": rule.field,
+        "value": value,
+        "timestamp": ts,
+        "message": ("RESOLVED " if status == "resolved" else "") + rule.describe(room, value),
+    }
+    _outbox.put(event)
+
+
+def on_store(table, columns, rows):
+    source = storage.source_for(table)
+    matching = [r for r in rules() if r.source == source["name"]]
+    if not matching:
+        return
+    ts_index = columns.index("timestamp")
+    room_index = columns.index(source["room_col"]) if "room_col" in source else None
+    index = {col: i for i, col in enumerate(columns)}
+    with _lock:
+        for row in rows:
+            ts = queries.iso_to_ms(row[ts_index])
+            room = row[room_index] if room_index is not None else source["room"]
+            for rule in matching:
+                if rule.room is not None and rule.room != room:
+                    continue
+                if rule.silent_ms is not None:
+                    rule.seen(room, ts)
+                    continue
+                i = index.get(rule.column)
+                if i is None or row[i] is None:
+                    continue
+                value = rule.convert(row[i]) if rule.convert else row[i]
+                status = rule.update(room, ts, value)
+                if status:
+                    notify(rule, room, status, value, row[ts_index])
+
+
+def check_silence():
+    now_ms = time.time() * 1000
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    with _lock:
+        for rule in rules():
+            if rule.silent_ms is None:
+                continue
+            for room, status in rule.check_silence(now_ms):
+                notify(rule, room, status, None, stamp)
+
+
+def deliver():
+    sinks = getattr(config, "ALERT_SINKS", [{"type": "log"}])
+    while True:
+        event = _outbox.get()
+        for options in sinks:
+            try:
+                SINKS[options["type"]](event, options)
+            except Exception as e:
+                print(f"Error delivering alert to {options['type']} sink: {e}")
+
+
+def seed_silence():
+    """Start silence rules from the latest stored readings.
+
+    Anything with no reading in twice the longest silence window counts as
+    last seen now, so it alerts if nothing arrives from here on.
+    """
+    silent = [rule for rule in rules() if rule.silent_ms is not None]
+    if not silent:
+        return
+    now_ms = time.time() * 1000
+    since = time.strftime(
+        "%Y-%m-%dT%H:%M:%SZ", time.gmtime((now_ms - 2 * max(r.silent_ms for r in silent)) / 1000)
+    )
+    conn = queries.connect()
+    summary = queries.summarize(conn, since)
+    conn.close()
+    with _lock:
+        for key, info in summary.items():
+            room, _, name = key.rpartition("|")
+            for rule in silent:
+                if rule.source == name and info.get("timestamp") and rule.room in (None, room):
+                    rule.seen(room, info["timestamp"])  # already epoch ms
+        for rule in silent:
+            if not rule.state:
+                rule.seen(rule.room, now_ms)
+
+
+def run_alerts():
+    """Follow stored readings and deliver alerts; returns if no rules are set."""
+    if not rules():
+        return
+    storage.add_listener(on_store)
+    threading.Thread(target=deliver, name="alert-delivery", daemon=True).start()
+    seed_silence()
+    print(f"Alerts: {len(rules())} rules")
+    while True:
+        time.sleep(SILENCE_CHECK_SECONDS)
+        check_silence()
@@ -0,0 +1,376 @@
+"""Columnar archive of closed months, read back through memory mapping.
+
+Each archived month of a readings table is a directory of .npy columns under
+ARCHIVE_DIR/<table>/<YYYY-MM>/: ts.npy holds ascending epoch ms, numeric
+columns are float64 with NaN for NULL, and text columns are int32 codes into
+a label list kept in meta.json. Archived rows are deleted from SQLite so the
+hot database stays small; the query layer merges both transparently.
+
+Columns stay uncompressed: a query maps only the slice it needs, straight
+from the page cache, where a compressed file would be inflated whole first.
+Text columns are dictionary-encoded, which is where most of the saving is.
+"""
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+import config
+import sites
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TABLES = ("readings", "govee_readings", "weather_readings", "solar_readings")
+SKIP_COLUMNS = ("id", "timestamp")
+# With the timestamp, these identify a reading when a month is re-archived
+KEY_COLUMNS = ("device_id", "room_name", "mac", "station_id")
+
+_loaded = {}
+
+
+def archive_dir():
+    return sites.setting("ARCHIVE_DIR", "archive")
+
+
+def enabled():
+    return np is not None and os.path.isdir(archive_dir())
+
+
+def _month_path(table, month):
+    return os.path.join(archive_dir(), table, month)
+
+
+def _month_start(month):
+    return datetime.datetime.strptime(month, "%Y-%m").replace(tzinfo=datetime.timezone.utc)
+
+
+def _next_month(month):
+    start = _month_start(month)
+    if start.month == 12:
+        return f"{start.year + 1}-01"
+    return f"{start.year}-{start.month + 1:02d}"
+
+
+def _to_ms(ts_str):
+    dt = datetime.datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def months(table):
+    """Archived months of a table, oldest first."""
+    try:
+        names = os.listdir(os.path.join(archive_dir(), table))
+    except FileNotFoundError:
+        return []
+    return sorted(n for n in names if not n.endswith(".tmp"))
+
+
+def oldest(table):
+    """Epoch ms of the oldest archived reading of a table, or None."""
+    for month in months(table):
+        ts = load_month(table, month)["ts"]
+        if len(ts):
+            return int(ts[0])
+    return None
+
+
+def load_month(table, month):
+    """Memory-mapped columns of one archived month."""
+    path = _month_path(table, month)
+    meta_path = os.path.join(path, "meta.json")
+    stamp = os.path.getmtime(meta_path)
+    cached = _loaded.get(path)
+    if cached and cached["stamp"] == stamp:
+        return cached
+    with open(meta_path) as f:
+        meta = json.load(f)
+    entry = {
+        "stamp": stamp,
+        "meta": meta,
+        "ts": np.load(os.path.join(path, "ts.npy"), mmap_mode="r"),
+        "cols": {
+            name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+            for name in meta["columns"]
+        },
+    }
+    _loaded[path] = entry
+    return entry
+
+
+def _column(data, name):
+    """An archived column; all NULL if the month was archived before it existed."""
+    values = data["cols"].get(name)
+    if values is None:
+        values = data["cols"][name] = np.full(len(data["ts"]), np.nan)
+        data["meta"]["columns"][name] = {"type": "real"}
+    return values
+
+
+def _decode(meta, name, values):
+    """Python values for an archived column slice, NULLs restored."""
+    info = meta["columns"][name]
+    if info["type"] == "text":
+        labels = info["labels"]
+        return [labels[c] if c >= 0 else None for c in values.tolist()]
+    out = values.tolist()
+    if info["type"] == "integer":
+        return [None if v != v else int(v) for v in out]
+    return [None if v != v else v for v in out]
+
+
+def _slices(table, since, until):
+    """(month data, lo, hi) for each archived month overlapping a range."""
+    since_ms = _to_ms(since) if since else None
+    until_ms = _to_ms(until) if until else None
+    for month in months(table):
+        start_ms = int(_month_start(month).timestamp() * 1000)
+        end_ms = int(_month_start(_next_month(month)).timestamp() * 1000)
+        if (until_ms is not None and start_ms >= until_ms) or (
+            since_ms is not None and end_ms <= since_ms
+        ):
+            continue
+        data = load_month(table, month)
+        ts = data["ts"]
+        lo = int(np.searchsorted(ts, since_ms, "left")) if since_ms is not None else 0
+        hi = int(np.searchsorted(ts, until_ms, "left")) if until_ms is not None else len(ts)
+        if lo < hi:
+            yield data, lo, hi
+
+
+def _rooms(source, data, lo, hi):
+    if "room_col" in source:
+        return _decode(data["meta"], source["room_col"], data["cols"][source["room_col"]][lo:hi])
+    return [source["room"]] * (hi - lo)
+
+
+def read_rows(source, columns, since=None, until=None, bucket_ms=None):
+    """Archived rows shaped like the SQLite query: (room, ts_ms, *values).
+
+    With bucket_ms, rows are averaged per room and time bucket the same way
+    as the SQL path, each bucket stamped with its earliest reading.
+    """
+    rows = []
+    for data, lo, hi in _slices(source["table"], since, until):
+        meta = data["meta"]
+        ts = data["ts"][lo:hi]
+        rooms = _rooms(source, data, lo, hi)
+        if not bucket_ms:
+            values = [_decode(meta, col, _column(data, col)[lo:hi]) for col in columns]
+            rows.extend(zip(rooms, ts.tolist(), *values))
+            continue
+        if "room_col" in source:
+            codes = np.asarray(data["cols"][source["room_col"]][lo:hi], dtype=np.int64)
+        else:
+            codes = np.zeros(hi - lo, dtype=np.int64)
+        keys = (codes << 40) + ts // int(bucket_ms)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        averages = []
+        for col in columns:
+            values = np.asarray(_column(data, col)[lo:hi], dtype=np.float64)
+            valid = ~np.isnan(values)
+            sums = np.bincount(inverse, weights=np.where(valid, values, 0.0))
+            counts = np.bincount(inverse, weights=valid)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                averages.append((sums / counts).tolist())
+        order = np.argsort(ts[first], kind="stable")
+        for g in order.tolist():
+            rows.append(
+                (rooms[first[g]], int(ts[first[g]]))
+                + tuple(None if avg[g] != avg[g] else avg[g] for avg in averages)
+            )
+    return rows
+
+
+def iter_rows(source, columns, since=None, until=None, chunk_rows=5000):
+    """Archived rows like read_rows, yielded in lists of at most chunk_rows."""
+    for data, lo, hi in _slices(source["table"], since, until):
+        for start in range(lo, hi, chunk_rows):
+            end = min(start + chunk_rows, hi)
+            values = [_decode(data["meta"], col, _column(data, col)[start:end]) for col in columns]
+            yield list(zip(
+                _rooms(source, data, start, end), data["ts"][start:end].tolist(), *values
+            ))
+
+
+def summarize(source, columns, since=None, until=None):
+    """Per-room partial aggregates over archived rows.
+
+    Returns {room: {"n", "last_ts", "latest", "sum", "cnt", "min", "max"}}
+    with one list entry per column, for merging with the SQL aggregates.
+    """
+    out = {}
+    for data, lo, hi in _slices(source["table"], since, until):
+        rooms = _rooms(source, data, lo, hi)
+        ts = data["ts"][lo:hi]
+        arrays = [np.asarray(_column(data, col)[lo:hi], dtype=np.float64) for col in columns]
+        room_index = {}
+        for i, room in enumerate(rooms):
+            room_index.setdefault(room, []).append(i)
+        for room, idx in room_index.items():
+            idx = np.asarray(idx)
+            last = int(idx[-1])
+            stats = out.setdefault(room, {
+                "n": 0, "last_ts": None, "latest": None,
+                "sum": [0.0] * len(columns), "cnt": [0] * len(columns),
+                "min": [None] * len(columns), "max": [None] * len(columns),
+            })
+            stats["n"] += len(idx)
+            if stats["last_ts"] is None or int(ts[last]) >= stats["last_ts"]:
+                stats["last_ts"] = int(ts[last])
+                stats["latest"] = [
+                    _decode(data["meta"], col, _column(data, col)[lo + last:lo + last + 1])[0]
+                    for col in columns
+                ]
+            for c, values in enumerate(arrays):
+                picked = values[idx]
+                picked = picked[~np.isnan(picked)]
+                if not len(picked):
+                    continue
+                stats["sum"][c] += float(picked.sum())
+                stats["cnt"][c] += len(picked)
+                lo_v, hi_v = float(picked.min()), float(picked.max())
+                stats["min"][c] = lo_v if stats["min"][c] is None else min(stats["min"][c], lo_v)
+                stats["max"][c] = hi_v if stats["max"][c] is None else max(stats["max"][c], hi_v)
+    return out
+
+
+def rooms(source):
+    """Every room label present in the archive for a source."""
+    found = set()
+    for month in months(source["table"]):
+        meta = load_month(source["table"], month)["meta"]
+        if "room_col" in source:
+            found.update(meta["columns"][source["room_col"]]["labels"])
+        elif meta["rows"]:
+            found.add(source["room"])
+    return found
+
+
+def _existing_rows(table, month, names):
+    """Rows already archived for a month, so re-archiving appends to them."""
+    if not os.path.isdir(_month_path(table, month)):
+        return []
+    data = load_month(table, month)
+    columns = [_decode(data["meta"], name, _column(data, name)[:]) for name in names]
+    return list(zip(data["ts"].tolist(), *columns))
+
+
+def export_month(conn, table, month):
+    """Move one month of a table from SQLite into the archive.
+
+    SQLite rows are deleted only once the new month files are in place and
+    read back. If that delete is lost (a crash), the next run finds the rows
+    in both and keeps one copy of each, so re-running is always safe.
+    """
+    import queries
+
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    columns = [(row[1], (row[2] or "").upper()) for row in info if row[1] not in SKIP_COLUMNS]
+    names = [name for name, _ in columns]
+    start, end = f"{month}-01", f"{_next_month(month)}-01"
+    rows = conn.execute(
+        f"""SELECT {queries.epoch_ms_sql()}, {', '.join(names)} FROM {table}
+            WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp""",
+        (start, end),
+    ).fetchall()
+    if not rows:
+        return 0
+    key_index = [i for i, name in enumerate(names, 1) if name in KEY_COLUMNS]
+    merged = {}
+    for row in _existing_rows(table, month, names) + [tuple(r) for r in rows]:
+        # SQLite rows come last, so they win over an interrupted run's copy
+        merged[(row[0], *(row[i] for i in key_index))] = row
+    rows = sorted(merged.values(), key=lambda r: r[0])
+
+    path = _month_path(table, month)
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "ts.npy"), np.array([r[0] for r in rows], dtype=np.int64))
+    meta = {"rows": len(rows), "columns": {}}
+    for i, (name, decl) in enumerate(columns, 1):
+        values = [r[i] for r in rows]
+        if decl == "TEXT":
+            labels = sorted({v for v in values if v is not None})
+            index = {label: n for n, label in enumerate(labels)}
+            array = np.array([index.get(v, -1) for v in values], dtype=np.int32)
+            meta["columns"][name] = {"type": "text", "labels": labels}
+        else:
+            array = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            meta["columns"][name] = {"type": "integer" if decl == "INTEGER" else "real"}
+        np.save(os.path.join(tmp, name + ".npy"), array)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp, path)
+    _loaded.pop(path, None)
+    if len(load_month(table, month)["ts"]) != len(rows):
+        raise RuntimeError(f"archived {table} {month} did not read back; rows kept in SQLite")
+
+    conn.execute(f"DELETE FROM {table} WHERE timestamp >= ? AND timestamp < ?", (start, end))
+    conn.commit()
+    return len(rows)
+
+
+def closed_months(conn, table, keep_months):
+    """Months of a table older than the newest `keep_months` calendar months."""
+    oldest = conn.execute(f"SELECT MIN(timestamp) FROM {table}").fetchone()[0]
+    if oldest is None:
+        return []
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cutoff = f"{now.year}-{now.month:02d}"
+    for _ in range(keep_months):
+        start = _month_start(cutoff) - datetime.timedelta(days=1)
+        cutoff = f"{start.year}-{start.month:02d}"
+    found = []
+    month = oldest[:7]
+    while month < cutoff:
+        found.append(month)
+        month = _next_month(month)
+    return found
+
+
+def archive_once(vacuum=False):
+    keep = getattr(config, "ARCHIVE_KEEP_MONTHS", 3)
+    conn = sqlite3.connect(config.DB_PATH)
+    for table in TABLES:
+        try:
+            pending = closed_months(conn, table, keep)
+        except sqlite3.OperationalError:
+            continue  # table not created (e.g. Govee disabled)
+        for month in pending:
+            count = export_month(conn, table, month)
+            if count:
+                print(f"  Archived {count} rows of {table} for {month}")
+    if vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+
+
+def run_archiver():
+    if np is None:
+        print("Archiver disabled: numpy is not installed")
+        return
+    os.makedirs(archive_dir(), exist_ok=True)
+    print("Archiver started")
+    while True:
+        try:
+            archive_once()
+        except Exception as e:
+            print(f"Error archiving data: {e}")
+        time.sleep(24 * 3600)
+
+
+if __name__ == "__main__":
+    if np is None:
+        sys.exit("numpy is required for archiving: pip install numpy")
+    os.makedirs(archive_dir(), exist_ok=True)
+    archive_once(vacuum="--vacuum" in sys.argv)
@@ -0,0 +1,328 @@
+"""Fill collection gaps from upstream history, or load CSV dumps.
+
+    python backfill.py gaps [--days N]       list gaps per source
+    python backfill.py sensibo [--days N]    Sensibo historicalMeasurements
+    python backfill.py weather [--days N]    Weather Underground daily history
+    python backfill.py csv TABLE FILE        bulk-load a CSV with a header row
+
+A gap is any stretch longer than twice the source's poll interval. Only rows
+that fall inside a gap are inserted, so re-running is harmless, and progress
+is recorded in backfill_state so interrupted runs resume where they stopped.
+Upstream URLs can be pointed at local fake servers through config
+(SENSIBO_API_BASE, WU_HISTORY_URL).
+"""
+import argparse
+import csv
+import datetime
+import os
+import sqlite3
+import time
+
+import requests
+
+import config
+import hot_tier
+import migrations
+import queries
+import response_cache
+import storage
+from collector import API_BASE, get_devices
+from weather_collector import WU_API_KEY
+
+WU_HISTORY_URL = getattr(config, "WU_HISTORY_URL", "https://api.weather.com/v2/pws/history/all")
+BATCH_ROWS = 5000
+SENSIBO_MAX_DAYS = 7  # longest window historicalMeasurements returns
+
+
+def get_progress(conn, task):
+    row = conn.execute("SELECT progress FROM backfill_state WHERE task = ?", (task,)).fetchone()
+    return row[0] if row else None
+
+
+def set_progress(conn, task, progress):
+    conn.execute(
+        "INSERT OR REPLACE INTO backfill_state (task, progress) VALUES (?, ?)",
+        (task, progress),
+    )
+
+
+def now_ms():
+    return int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1000)
+
+
+def ms_to_iso(ms):
+    return datetime.datetime.fromtimestamp(ms / 1000, datetime.timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+def reading_times(table, since, key_col):
+    """SQL and params selecting (k, ts) for each stored reading since `since`.
+
+    Under the narrow engine readings live in samples, keyed by room.
+    """
+    if storage.narrow():
+        return storage.reading_times(table, since, key_col is not None)
+    key = key_col or "''"
+    return (
+        f"SELECT {key} AS k, {queries.epoch_ms_sql()} AS ts "
+        f"FROM {table} WHERE timestamp >= ?",
+        [since],
+    )
+
+
+def find_gaps(conn, table, since, max_gap_s, key_col=None):
+    """Gaps longer than max_gap_s since `since`, as {key: [(start_ms, end_ms)]}.
+
+    Every key with rows in the window is present (possibly with no gaps); a
+    key with no rows at all is simply missing.
+    """
+    times, params = reading_times(table, since, key_col)
+    max_gap = max_gap_s * 1000
+    since_ms = queries.iso_to_ms(since)
+    gaps = {}
+    rows = conn.execute(
+        f"""SELECT k, prev, ts FROM (
+                SELECT k, ts, LAG(ts) OVER (PARTITION BY k ORDER BY ts) AS prev
+                FROM ({times})
+            ) WHERE prev IS NULL OR ts - prev > ?""",
+        params + [max_gap],
+    ).fetchall()
+    for k, prev, cur in rows:
+        found = gaps.setdefault(k, [])
+        if prev is not None:
+            found.append((prev, cur))
+        elif cur - since_ms > max_gap:
+            found.append((since_ms, cur))
+    end = now_ms()
+    for k, last in conn.execute(f"SELECT k, MAX(ts) FROM ({times}) GROUP BY k", params).fetchall():
+        if end - last > max_gap:
+            gaps[k].append((last, end))
+    return gaps
+
+
+def in_gaps(ms, gaps):
+    return any(start < ms < end for start, end in gaps)
+
+
+def insert_rows(conn, table, columns, rows):
+    """Chunked executemany; the caller commits."""
+    for i in range(0, len(rows), BATCH_ROWS):
+        storage.store_many(conn, table, columns, rows[i:i + BATCH_ROWS])
+    if rows:
+        # A running server reloads its in-memory window when this changes
+        set_progress(conn, hot_tier.INSERTED_TASK, str(time.time_ns()))
+    return len(rows)
+
+
+def closed_days(start_ms, end_ms):
+    """UTC dates touched by a span, excluding today (which may still change)."""
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    day = datetime.datetime.fromtimestamp(start_ms / 1000, datetime.timezone.utc).date()
+    last = datetime.datetime.fromtimestamp(end_ms / 1000, datetime.timezone.utc).date()
+    while day <= last:
+        if day < today:
+            yield day
+        day += datetime.timedelta(days=1)
+
+
+def sensibo_history(device_id, days):
+    resp = requests.get(
+        f"{API_BASE}/pods/{device_id}/historicalMeasurements",
+        params={"apiKey": config.API_KEY, "days": days},
+        timeout=30,
+    )
+    resp.raise_for_status()
+    by_time = {}
+    for metric, points in resp.json()["result"].items():
+        for point in points:
+            by_time.setdefault(point["time"], {})[metric] = point["value"]
+    return by_time
+
+
+def backfill_sensibo(conn, days):
+    days = min(days, SENSIBO_MAX_DAYS)
+    since_ms = now_ms() - days * 86400 * 1000
+    gaps = find_gaps(
+        conn, "readings", ms_to_iso(since_ms),
+        2 * config.POLL_INTERVAL_SECONDS, key_col="device_id",
+    )
+    total = 0
+    for device in get_devices():
+        device_id = device["id"]
+        room_name = device["room"]["name"]
+        # The narrow engine keeps rooms rather than device ids
+        key = room_name if storage.narrow() else device_id
+        device_gaps = gaps.get(key, [(since_ms, now_ms())])
+        pending = [
+            (start, end) for start, end in device_gaps
+            if any(get_progress(conn, f"sensibo:{device_id}:{d}") is None
+                   for d in closed_days(start, end)) or end > now_ms() - 86400 * 1000
+        ]
+        if not pending:
+            continue
+        rows = []
+        for time_str, values in sorted(sensibo_history(device_id, days).items()):
+            if in_gaps(queries.iso_to_ms(time_str), pending):
+                rows.append((
+                    time_str, device_id, room_name,
+                    values.get("temperature"), values.get("humidity"),
+                    values.get("co2"), values.get("tvoc"), values.get("iaq"),
+                ))
+        insert_rows(conn, "readings", (
+            "timestamp", "device_id", "room_name",
+            "temperature", "humidity", "co2", "tvoc", "iaq",
+        ), rows)
+        for start, end in pending:
+            for d in closed_days(start, end):
+                set_progress(conn, f"sensibo:{device_id}:{d}", "done")
+        conn.commit()
+        print(f"  {room_name}: {len(rows)} rows backfilled")
+        total += len(rows)
+    return total
+
+
+def wu_history(day):
+    resp = requests.get(
+        WU_HISTORY_URL,
+        params={
+            "stationId": config.WU_STATION_ID,
+            "format": "json",
+            "units": "e",
+            "date": day.strftime("%Y%m%d"),
+            "apiKey": WU_API_KEY,
+        },
+        timeout=30,
+    )
+    resp.raise_for_status()
+    if resp.status_code == 204:
+        return []  # no observations stored for that day
+    return resp.json().get("observations", [])
+
+
+def backfill_weather(conn, days):
+    since_ms = now_ms() - days * 86400 * 1000
+    gaps = find_gaps(
+        conn, "weather_readings", ms_to_iso(since_ms), 2 * config.WU_POLL_INTERVAL_SECONDS
+    ).get("", [(since_ms, now_ms())])
+    wanted = sorted({d for start, end in gaps for d in closed_days(start, end)})
+    total = 0
+    for day in wanted:
+        task = f"weather:{day}"
+        if get_progress(conn, task) is not None:
+            continue
+        rows = []
+        for obs in wu_history(day):
+            if not in_gaps(queries.iso_to_ms(obs["obsTimeUtc"]), gaps):
+                continue
+            imp = obs.get("imperial", {})
+            rows.append((
+                obs["obsTimeUtc"], obs["stationID"],
+                imp.get("tempAvg"), obs.get("humidityAvg"), imp.get("dewptAvg"),
+                imp.get("windspeedAvg"), imp.get("windgustHigh"), obs.get("winddirAvg"),
+                imp.get("pressureMax"), imp.get("precipRate"), imp.get("precipTotal"),
+                obs.get("solarRadiationHigh"), obs.get("uvHigh"),
+            ))
+        insert_rows(conn, "weather_readings", (
+            "timestamp", "station_id", "temperature", "humidity", "dewpoint",
+            "wind_speed", "wind_gust", "wind_dir", "pressure",
+            "precip_rate", "precip_total", "solar_radiation", "uv",
+        ), rows)
+        set_progress(conn, task, "done")
+        conn.commit()
+        print(f"  {day}: {len(rows)} weather rows backfilled")
+        total += len(rows)
+    return total
+
+
+def csv_parser(declared):
+    """Parser for CSV text in a column of the declared type, by SQLite's affinity rules."""
+    declared = declared.upper()
+    if "INT" in declared:
+        return storage.number
+    if any(t in declared for t in ("CHAR", "CLOB", "TEXT", "BLOB")) or not declared:
+        return None
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB")):
+        return float
+    return storage.number
+
+
+def import_csv(conn, table, path):
+    """Load a CSV whose header names table columns; resumes after a crash.
+
+    Values are converted to the columns' declared types first, so derived
+    metrics and the narrow engine see numbers rather than CSV text.
+    """
+    known = {row[1]: csv_parser(row[2]) for row in conn.execute(f"PRAGMA table_info({table})")}
+    if not known:
+        raise SystemExit(f"Unknown table {table}")
+    task = f"csv:{table}:{os.path.abspath(path)}"
+    done = int(get_progress(conn, task) or 0)
+    total = 0
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        unknown = [c for c in header if c not in known or c == "id"]
+        if unknown:
+            raise SystemExit(f"Columns not in {table}: {', '.join(unknown)}")
+        parsers = [known[c] for c in header]
+        batch = []
+        for n, record in enumerate(reader, 1):
+            if n <= done:
+                continue
+            try:
+                batch.append([
+                    None if value == "" else parse(value) if parse else value
+                    for parse, value in zip(parsers, record)
+                ])
+            except ValueError as e:
+                raise SystemExit(f"{path} line {n + 1}: {e}")
+            if len(batch) == BATCH_ROWS * 10:
+                total += insert_rows(conn, table, header, batch)
+                set_progress(conn, task, str(n))
+                conn.commit()
+                batch = []
+        total += insert_rows(conn, table, header, batch)
+        set_progress(conn, task, str(done + total))
+        conn.commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("gaps", "sensibo", "weather", "csv"))
+    parser.add_argument("args", nargs="*")
+    parser.add_argument("--days", type=int, default=7)
+    opts = parser.parse_args()
+
+    migrations.migrate()
+    conn = sqlite3.connect(config.DB_PATH)
+    since = ms_to_iso(now_ms() - opts.days * 86400 * 1000)
+    inserted = 0
+    if opts.command == "gaps":
+        for table, interval, key_col in (
+            ("readings", config.POLL_INTERVAL_SECONDS, "room_name"),
+            ("weather_readings", config.WU_POLL_INTERVAL_SECONDS, None),
+            ("solar_readings", config.ENPHASE_POLL_INTERVAL_SECONDS, None),
+        ):
+            for key, found in find_gaps(conn, table, since, 2 * interval, key_col).items():
+                for start, end in found:
+                    print(f"{table} {key}: {ms_to_iso(start)} -> {ms_to_iso(end)}"
+                          f" ({(end - start) / 60000:.0f} min)")
+    elif opts.command == "sensibo":
+        inserted = backfill_sensibo(conn, opts.days)
+    elif opts.command == "weather":
+        inserted = backfill_weather(conn, opts.days)
+    else:
+        if len(opts.args) != 2:
+            parser.error("csv needs TABLE FILE")
+        inserted = import_csv(conn, *opts.args)
+    conn.close()
+    if inserted:
+        # Cached closed ranges may now be missing the new rows
+        response_cache.clear()
+        print(f"Inserted {inserted} rows")
+
+
+if __name__ == "__main__":
+    main()
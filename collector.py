@@ -2,31 +2,16 @@ import sqlite3
 import time
 import requests
 import config
+import migrations
+import profiler
+import scheduler
+import storage
 
-API_BASE = "https://home.sensibo.com/api/v2"
+API_BASE = getattr(config, "SENSIBO_API_BASE", "https://home.sensibo.com/api/v2")
 
 
 def init_db():
-    conn = sqlite3.connect(config.DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            device_id TEXT NOT NULL,
-            room_name TEXT NOT NULL,
-            temperature REAL,
-            humidity REAL,
-            co2 INTEGER,
-            tvoc INTEGER,
-            iaq INTEGER
-        )
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_readings_timestamp
-        ON readings (timestamp)
-    """)
-    conn.commit()
-    conn.close()
+    migrations.migrate()
 
 
 def get_devices():
@@ -60,21 +45,16 @@ def collect_once():
         if measurement is None:
             print(f"  No data for {room_name}")
             continue
-        conn.execute(
-            """INSERT INTO readings
-               (timestamp, device_id, room_name, temperature, humidity, co2, tvoc, iaq)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                measurement["time"]["time"],
-                device_id,
-                room_name,
-                measurement.get("temperature"),
-                measurement.get("humidity"),
-                measurement.get("co2"),
-                measurement.get("tvoc"),
-                measurement.get("iaq"),
-            ),
-        )
+        storage.store(conn, "readings", {
+            "timestamp": measurement["time"]["time"],
+            "device_id": device_id,
+            "room_name": room_name,
+            "temperature": measurement.get("temperature"),
+            "humidity": measurement.get("humidity"),
+            "co2": measurement.get("co2"),
+            "tvoc": measurement.get("tvoc"),
+            "iaq": measurement.get("iaq"),
+        })
         temp_f = measurement.get('temperature')
         if temp_f is not None:
             temp_f = round(temp_f * 9 / 5 + 32, 1)
@@ -82,7 +62,7 @@ def collect_once():
             f"  {room_name}: {temp_f}°F, "
             f"CO2={measurement.get('co2')}, TVOC={measurement.get('tvoc')}"
         )
-    conn.commit()
+    storage.commit(conn)
     conn.close()
 
 
@@ -93,10 +73,11 @@ def run_collector():
     while True:
         try:
             print(f"\nCollecting at {time.strftime('%Y-%m-%d %H:%M:%S')}...")
-            collect_once()
+            with profiler.track("sensibo cycle", "cycle"):
+                collect_once()
         except Exception as e:
             print(f"Error collecting data: {e}")
-        time.sleep(config.POLL_INTERVAL_SECONDS)
+        time.sleep(scheduler.next_interval("Sensibo", config.POLL_INTERVAL_SECONDS))
 
 
 if __name__ == "__main__":
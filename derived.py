@@ -0,0 +1,154 @@
+"""Derived metrics, computed as readings are stored.
+
+Each source table has extra columns filled from the other columns of the
+same row (heat index, dew point, absolute humidity, self-consumption) or from
+a little running state (the day's peak production so far). storage.store_many
+adds them to every batch, so they are stored, charted, bucketed, archived and
+exported exactly like the measured columns. Rows stored before the columns
+existed are filled in by the derived_metrics online migration.
+"""
+import datetime
+import math
+import threading
+
+import config
+import queries
+import storage
+
+# table -> derived columns, in the order compute() returns them
+COLUMNS = {
+    "readings": ("heat_index", "dew_point", "abs_humidity"),
+    "govee_readings": ("heat_index", "dew_point", "abs_humidity"),
+    "weather_readings": ("heat_index", "abs_humidity"),
+    "solar_readings": ("self_consumption", "production_peak_today_w"),
+}
+# Columns compute() reads, per table
+INPUTS = {
+    "readings": ("timestamp", "temperature", "humidity"),
+    "govee_readings": ("timestamp", "temperature", "humidity"),
+    "weather_readings": ("timestamp", "temperature", "humidity"),
+    "solar_readings": ("timestamp", "production_w", "net_consumption_w"),
+}
+
+_lock = threading.Lock()
+_peak = {"day": None, "value": None}  # running production peak for one local day
+
+
+def c_to_f(c):
+    return c * 9 / 5 + 32
+
+
+def f_to_c(f):
+    return (f - 32) * 5 / 9
+
+
+def heat_index_f(t_f, rh):
+    """NWS heat index (Rothfusz regression with its adjustments), °F."""
+    simple = 0.5 * (t_f + 61.0 + (t_f - 68.0) * 1.2 + rh * 0.094)
+    if (simple + t_f) / 2 < 80:
+        return simple
+    hi = (
+        -42.379 + 2.04901523 * t_f + 10.14333127 * rh
+        - 0.22475541 * t_f * rh - 0.00683783 * t_f * t_f
+        - 0.05481717 * rh * rh + 0.00122874 * t_f * t_f * rh
+        + 0.00085282 * t_f * rh * rh - 0.00000199 * t_f * t_f * rh * rh
+    )
+    if rh < 13 and 80 <= t_f <= 112:
+        hi -= (13 - rh) / 4 * math.sqrt((17 - abs(t_f - 95)) / 17)
+    elif rh > 85 and 80 <= t_f <= 87:
+        hi += (rh - 85) / 10 * (87 - t_f) / 5
+    return hi
+
+
+def dew_point_c(t_c, rh):
+    """Magnus-formula dew point, °C."""
+    gamma = math.log(rh / 100) + 17.625 * t_c / (243.04 + t_c)
+    return 243.04 * gamma / (17.625 - gamma)
+
+
+def absolute_humidity(t_c, rh):
+    """Water vapour density, g/m³."""
+    return 6.112 * math.exp(17.67 * t_c / (t_c + 243.5)) * rh * 2.1674 / (273.15 + t_c)
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _indoor(conn, ts, t_c, rh):
+    if t_c is None or not rh:
+        return None, None, None
+    return (
+        _round(f_to_c(heat_index_f(c_to_f(t_c), rh))),
+        _round(dew_point_c(t_c, rh)),
+        _round(absolute_humidity(t_c, rh)),
+    )
+
+
+def _outdoor(conn, ts, t_f, rh):
+    if t_f is None or not rh:
+        return None, None
+    return _round(heat_index_f(t_f, rh)), _round(absolute_humidity(f_to_c(t_f), rh))
+
+
+def day_start(ts):
+    """UTC ISO timestamp of the DISPLAY_TIMEZONE midnight starting ts's day."""
+    from zoneinfo import ZoneInfo
+
+    tz = ZoneInfo(getattr(config, "DISPLAY_TIMEZONE", "America/Los_Angeles"))
+    when = datetime.datetime.fromtimestamp(queries.iso_to_ms(ts) / 1000, tz)
+    midnight = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.astimezone(datetime.timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+
+def _seed_peak(conn, since, ts):
+    """Peak production already stored between the day's start and ts.
+
+    Read on the writer's own connection: a long backfill transaction locks
+    out other readers, and its uncommitted rows belong to the day too.
+    """
+    if storage.narrow():
+        return storage.max_value(conn, "Enphase", "production_w", since, ts)
+    where, params = queries.range_where(since, ts)
+    return conn.execute(f"SELECT MAX(production_w) FROM solar_readings {where}", params).fetchone()[0]
+
+
+def _solar(conn, ts, production, net):
+    self_consumption = None
+    if production and production > 0 and net is not None:
+        exported = max(0.0, -net)
+        self_consumption = _round(max(0.0, production - exported) / production * 100)
+    with _lock:
+        day = day_start(ts)
+        if _peak["day"] != day:
+            _peak["day"] = day
+            _peak["value"] = _seed_peak(conn, day, ts)
+        if production is not None and (_peak["value"] is None or production > _peak["value"]):
+            _peak["value"] = production
+        peak = _peak["value"]
+    return self_consumption, peak
+
+
+COMPUTE = {
+    "readings": _indoor,
+    "govee_readings": _indoor,
+    "weather_readings": _outdoor,
+    "solar_readings": _solar,
+}
+
+
+def compute(conn, table, values):
+    """Derived column values for one row, given {column: value}."""
+    return COMPUTE[table](conn, *(values.get(col) for col in INPUTS[table]))
+
+
+def extend(conn, table, columns, rows):
+    """columns and rows with the table's derived columns appended.
+
+    Batches that already carry them (copies between engines) pass through.
+    """
+    derived = COLUMNS.get(table)
+    if not derived or derived[0] in columns:
+        return columns, rows
+    rows = [tuple(row) + compute(conn, table, dict(zip(columns, row))) for row in rows]
+    return list(columns) + list(derived), rows
@@ -0,0 +1,149 @@
+"""Streaming bulk export of readings as CSV, NDJSON or Parquet.
+
+Rows are read and encoded in fixed-size chunks, so memory stays constant no
+matter how much history is exported. Values are the stored ones (°C, W, Wh),
+with timestamps as epoch milliseconds UTC.
+"""
+import csv
+import io
+import json
+import sqlite3
+import zlib
+
+import archive
+import queries
+import storage
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+CHUNK_ROWS = 5000
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def iter_chunks(source, columns, since=None, until=None, chunk_rows=CHUNK_ROWS):
+    """Lists of (room, ts_ms, *values) rows in time order.
+
+    Archived months come first. SQLite rows are then paged by (timestamp, id)
+    with each page a complete statement, so no read lock is held while the
+    client is still downloading and the collectors can keep committing.
+    """
+    if storage.narrow():
+        yield from storage.iter_rows(source, columns, since, until, chunk_rows)
+        return
+    if archive.enabled():
+        yield from archive.iter_rows(source, columns, since, until, chunk_rows)
+    where, params = queries.range_where(since, until)
+    select = (
+        f"SELECT timestamp, id, {queries.room_sql(source)}, {queries.epoch_ms_sql()}, "
+        f"{', '.join(columns)} FROM {source['table']}"
+    )
+    conn = sqlite3.connect(f"file:{queries.db_path()}?mode=ro", uri=True)
+    try:
+        last = None
+        while True:
+            if last is None:
+                sql, args = f"{select} {where}", list(params)
+            else:
+                joiner = " AND " if where else "WHERE "
+                sql = f"{select} {where}{joiner}(timestamp, id) > (?, ?)"
+                args = list(params) + list(last)
+            rows = conn.execute(
+                f"{sql} ORDER BY timestamp, id LIMIT ?", args + [chunk_rows]
+            ).fetchall()
+            if not rows:
+                break
+            last = rows[-1][:2]
+            yield [row[2:] for row in rows]
+            if len(rows) < chunk_rows:
+                break
+    finally:
+        conn.close()
+
+
+def encode_csv(header, chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    yield buf.getvalue().encode()
+    for chunk in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(chunk)
+        yield buf.getvalue().encode()
+
+
+def encode_ndjson(header, chunks):
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(dict(zip(header, row)), separators=(",", ":")) + "\n" for row in chunk
+        ).encode()
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def encode_parquet(header, chunks):
+    schema = pa.schema(
+        [("room", pa.string()), ("timestamp_ms", pa.int64())]
+        + [(name, pa.float64()) for name in header[2:]]
+    )
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for chunk in chunks:
+        columns = list(zip(*chunk))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def gzip_stream(parts):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip framing
+    for part in parts:
+        out = compressor.compress(part)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def stream(source, fields, since=None, until=None, fmt="csv", gzip=False):
+    """Encoded byte chunks for one source's fields over a time range."""
+    columns = [source["fields"][f][0] for f in fields]
+    header = ["room", "timestamp_ms"] + list(fields)
+    chunks = iter_chunks(source, columns, since, until)
+    encoder = {"csv": encode_csv, "ndjson": encode_ndjson, "parquet": encode_parquet}[fmt]
+    parts = encoder(header, chunks)
+    return gzip_stream(parts) if gzip else parts
@@ -0,0 +1,267 @@
+"""Local stand-ins for the Sensibo, Weather.com, Open-Meteo and Enphase APIs.
+
+    python fake_upstream.py --pods 20 --latency 50 --error-rate 0.01 --rate-limit 600
+
+Readings are smooth synthetic signals on a simulated clock that can run
+faster than real time (--speed). Point config.py at the server with the
+values printed at startup (see config_overrides).
+"""
+import argparse
+import collections
+import datetime
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def config_overrides(base):
+    """config.py settings that send every collector to a fake server at base."""
+    return {
+        "SENSIBO_API_BASE": f"{base}/api/v2",
+        "WU_API_URL": f"{base}/v2/pws/observations/current",
+        "WU_HISTORY_URL": f"{base}/v2/pws/history/all",
+        "AQI_API_URL": f"{base}/v1/air-quality",
+        "ENPHASE_URL": f"{base}/production.json?details=1",
+    }
+
+
+def iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def wave(t, period, phase=0.0):
+    return math.sin(2 * math.pi * (t / period + phase))
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, pods=5, latency_ms=0, error_rate=0.0, rate_limit=0, speed=1.0):
+        super().__init__(address, Handler)
+        self.pods = pods
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # requests per minute per API, 0 = unlimited
+        self.speed = speed
+        self.started = time.time()
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.lock = threading.Lock()
+        self.recent = collections.defaultdict(collections.deque)
+        self.stats = collections.Counter()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def now(self):
+        """Simulated wall clock, running `speed` times faster than real time."""
+        elapsed = (time.time() - self.started) * self.speed
+        return self.started_at + datetime.timedelta(seconds=elapsed)
+
+    def admit(self, api):
+        """None to serve the request, else the HTTP status to fail it with."""
+        with self.lock:
+            self.stats[api] += 1
+            if self.rate_limit:
+                window = self.recent[api]
+                now = time.time()
+                while window and window[0] < now - 60:
+                    window.popleft()
+                if len(window) >= self.rate_limit:
+                    self.stats[api + " 429"] += 1
+                    return 429
+                window.append(now)
+            if random.random() < self.error_rate:
+                self.stats[api + " 500"] += 1
+                return 500
+        return None
+
+    # Payloads
+
+    def pod_ids(self):
+        return [f"pod{i:04d}" for i in range(self.pods)]
+
+    def sensibo_values(self, pod_id, dt):
+        i = int(pod_id[3:])
+        t = dt.timestamp()
+        return {
+            "temperature": round(21 + 2 * wave(t, 86400, i / 7) + random.gauss(0, 0.05), 2),
+            "humidity": round(45 + 5 * wave(t, 86400, i / 5), 1),
+            "co2": int(450 + 300 * max(0.0, wave(t, 4 * 3600, i / 3))),
+            "tvoc": int(80 + 40 * max(0.0, wave(t, 3 * 3600, i / 3))),
+            "iaq": int(50 + 30 * max(0.0, wave(t, 4 * 3600, i / 3))),
+        }
+
+    def weather_observation(self, dt):
+        t = dt.timestamp()
+        daylight = max(0.0, wave(t, 86400, -0.25))
+        temp = round(60 + 12 * wave(t, 86400, -0.375), 1)
+        return {
+            "stationID": "KFAKE1",
+            "obsTimeUtc": iso(dt),
+            "lat": 37.0,
+            "lon": -122.0,
+            "humidity": round(60 - 20 * daylight),
+            "winddir": int(180 + 90 * wave(t, 7200)),
+            "solarRadiation": round(900 * daylight, 1),
+            "uv": round(8 * daylight, 1),
+            "imperial": {
+                "temp": temp,
+                "dewpt": round(temp - 10, 1),
+                "windSpeed": round(5 + 4 * max(0.0, wave(t, 5400)), 1),
+                "windGust": round(9 + 6 * max(0.0, wave(t, 5400)), 1),
+                "pressure": round(30 + 0.2 * wave(t, 3 * 86400), 2),
+                "precipRate": 0.0,
+                "precipTotal": 0.0,
+            },
+        }
+
+    def history_observation(self, dt):
+        obs = self.weather_observation(dt)
+        imp = obs.pop("imperial")
+        obs["humidityAvg"] = obs.pop("humidity")
+        obs["winddirAvg"] = obs.pop("winddir")
+        obs["solarRadiationHigh"] = obs.pop("solarRadiation")
+        obs["uvHigh"] = obs.pop("uv")
+        obs["imperial"] = {
+            "tempAvg": imp["temp"], "dewptAvg": imp["dewpt"],
+            "windspeedAvg": imp["windSpeed"], "windgustHigh": imp["windGust"],
+            "pressureMax": imp["pressure"], "precipRate": imp["precipRate"],
+            "precipTotal": imp["precipTotal"],
+        }
+        return obs
+
+    def production(self, dt):
+        t = dt.timestamp()
+        local_hour = (t / 3600) % 24
+        production = max(0.0, 5000 * math.sin(math.pi * (local_hour - 6) / 12))
+        consumption = 800 + 400 * max(0.0, wave(t, 86400, 0.3)) + random.gauss(0, 20)
+        midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        hours_today = (dt - midnight).total_seconds() / 3600
+        return {
+            "production": [
+                {"type": "inverters", "wNow": round(production)},
+                {
+                    "type": "eim", "measurementType": "production", "wNow": round(production, 1),
+                    "whToday": round(2000 * hours_today, 1), "whLifetime": 12_000_000 + t / 100,
+                },
+            ],
+            "consumption": [
+                {
+                    "type": "eim", "measurementType": "total-consumption",
+                    "wNow": round(consumption, 1),
+                    "lines": [{"whToday": round(500 * hours_today, 1)} for _ in range(2)],
+                },
+                {
+                    "type": "eim", "measurementType": "net-consumption",
+                    "wNow": round(consumption - production, 1),
+                },
+            ],
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        fake = self.server
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        if url.path == "/api/v2/users/me/pods":
+            api, build = "sensibo", lambda: {
+                "status": "success",
+                "result": [{"id": p, "room": {"name": f"Room {p[3:]}"}} for p in fake.pod_ids()],
+            }
+        elif url.path.startswith("/api/v2/pods/") and parts[-1] == "measurements":
+            pod = parts[3]
+            api, build = "sensibo", lambda: self.sensibo_measurement(pod)
+        elif url.path.startswith("/api/v2/pods/") and parts[-1] == "historicalMeasurements":
+            pod, days = parts[3], int(query.get("days", ["1"])[0])
+            api, build = "sensibo", lambda: self.sensibo_history(pod, days)
+        elif url.path == "/v2/pws/observations/current":
+            api, build = "weather", lambda: {"observations": [fake.weather_observation(fake.now())]}
+        elif url.path == "/v2/pws/history/all":
+            day = datetime.datetime.strptime(query["date"][0], "%Y%m%d").replace(
+                tzinfo=datetime.timezone.utc
+            )
+            api, build = "weather", lambda: {"observations": [
+                fake.history_observation(day + datetime.timedelta(minutes=5 * i))
+                for i in range(288)
+                if day + datetime.timedelta(minutes=5 * i) < fake.now()
+            ]}
+        elif url.path == "/v1/air-quality":
+            api, build = "aqi", lambda: {"current": {
+                "us_aqi": 40 + random.randint(0, 20), "pm2_5": 8.5, "pm10": 14.0,
+            }}
+        elif url.path == "/production.json":
+            api, build = "enphase", lambda: fake.production(fake.now())
+        else:
+            self.send_json(404, {"error": "not found"})
+            return
+        if fake.latency_ms:
+            time.sleep(random.uniform(0.5, 1.5) * fake.latency_ms / 1000)
+        status = fake.admit(api)
+        if status is not None:
+            self.send_json(status, {"error": "injected" if status == 500 else "rate limited"})
+            return
+        self.send_json(200, build())
+
+    def sensibo_measurement(self, pod):
+        now = self.server.now()
+        return {"status": "success", "result": [
+            {"time": {"time": iso(now), "secondsAgo": 0}, **self.server.sensibo_values(pod, now)}
+        ]}
+
+    def sensibo_history(self, pod, days):
+        end = self.server.now().replace(second=0, microsecond=0)
+        times = [end - datetime.timedelta(minutes=5 * i) for i in range(days * 288)]
+        values = [(iso(t), self.server.sensibo_values(pod, t)) for t in reversed(times)]
+        return {"status": "success", "result": {
+            metric: [{"time": stamp, "value": v[metric]} for stamp, v in values]
+            for metric in ("temperature", "humidity", "co2", "tvoc")
+        }}
+
+
+def start(host="127.0.0.1", port=0, **options):
+    """Start a FakeUpstream on a daemon thread and return it."""
+    fake = FakeUpstream((host, port), **options)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+    return fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pods", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0, help="mean latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests/minute per API")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulated clock multiplier")
+    opts = parser.parse_args()
+    fake = FakeUpstream(
+        (opts.host, opts.port), pods=opts.pods, latency_ms=opts.latency,
+        error_rate=opts.error_rate, rate_limit=opts.rate_limit, speed=opts.speed,
+    )
+    print(f"Fake upstream APIs on {fake.base_url}; add to config.py:")
+    for name, value in config_overrides(fake.base_url).items():
+        print(f'    {name} = "{value}"')
+    fake.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
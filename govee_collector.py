@@ -4,57 +4,96 @@ import struct
 import time
 from datetime import datetime, timezone
 
-from bleak import BleakScanner
-
 import config
+import migrations
+import profiler
+import scheduler
+import storage
 
 GOVEE_MFR_KEY = 60552  # 0xEC88
+GOVEE_H510X_MFR_KEY = 1  # 0x0001, used by the H5100 family
+GOVEE_H5179_MFR_KEY = 34817  # 0x8801
+
+_H5074 = struct.Struct("<xhH")  # flag, temp_c*100, humidity*100
+_H5179 = struct.Struct("<4xhH")  # 4 header bytes, temp_c*100, humidity*100
+_U32 = struct.Struct(">I")  # 24-bit packed readings, read with the byte before
+
+
+def _packed(raw, offset):
+    """Temperature and humidity packed as one 24-bit decimal, e.g. 215450 = 21.5°C 45.0%.
+
+    The top bit marks a negative temperature.
+    """
+    value = _U32.unpack_from(raw, offset)[0] & 0xFFFFFF
+    negative = value & 0x800000
+    value &= 0x7FFFFF
+    temp_c = value // 1000 / 10
+    return -temp_c if negative else temp_c, value % 1000 / 10
+
+
+def _h5074(raw):
+    temp, humidity = _H5074.unpack_from(raw)
+    return temp / 100, humidity / 100
+
 
+def _h5179(raw):
+    temp, humidity = _H5179.unpack_from(raw)
+    return temp / 100, humidity / 100
 
-def decode_h5074(mfr_data):
-    """Decode Govee H5074 manufacturer data into temp_c and humidity."""
-    raw = mfr_data.get(GOVEE_MFR_KEY)
-    if raw is None or len(raw) < 5:
-        return None, None
-    temp_c = struct.unpack_from("<h", raw, 1)[0] / 100
-    humidity = struct.unpack_from("<H", raw, 3)[0] / 100
-    return temp_c, humidity
+
+# (manufacturer id, payload length) -> (models, decoder returning (temp_c, humidity))
+DECODERS = {
+    (GOVEE_MFR_KEY, 7): ("H5074", _h5074),
+    (GOVEE_MFR_KEY, 6): ("H5072/H5075", lambda raw: _packed(raw, 0)),
+    (GOVEE_H5179_MFR_KEY, 9): ("H5179", _h5179),
+    (GOVEE_H510X_MFR_KEY, 6): ("H5100/H5101/H5102/H5104/H5174/H5177", lambda raw: _packed(raw, 1)),
+}
+
+
+def decode_govee(mfr_data):
+    """(model, temp_c, humidity) from an advert's manufacturer data, or None."""
+    for mfr_id, raw in mfr_data.items():
+        entry = DECODERS.get((mfr_id, len(raw)))
+        if entry is not None:
+            model, decode = entry
+            return (model, *decode(raw))
+    return None
 
 
 def init_govee_db():
-    conn = sqlite3.connect(config.DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS govee_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            mac TEXT NOT NULL,
-            room_name TEXT NOT NULL,
-            temperature REAL,
-            humidity REAL
-        )
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_govee_timestamp
-        ON govee_readings (timestamp)
-    """)
-    conn.commit()
-    conn.close()
+    migrations.migrate()
 
 
 async def scan_govee():
-    """Scan for Govee H5074 devices and return decoded readings."""
-    devices = await BleakScanner.discover(timeout=config.GOVEE_SCAN_SECONDS, return_adv=True)
+    """Listen for configured Govee sensors and return decoded readings.
+
+    Stops as soon as every sensor in GOVEE_DEVICES has been heard, or after
+    GOVEE_SCAN_SECONDS.
+    """
+    # Imported here so the decoders work without a Bluetooth stack (MQTT ingest)
+    from bleak import BleakScanner
+
     readings = {}
-    for addr, (device, adv) in devices.items():
-        addr_upper = addr.upper()
-        if addr_upper in config.GOVEE_DEVICES:
-            temp_c, humidity = decode_h5074(adv.manufacturer_data)
-            if temp_c is not None:
-                readings[addr_upper] = {
-                    "room_name": config.GOVEE_DEVICES[addr_upper],
-                    "temperature": temp_c,
-                    "humidity": humidity,
-                }
+    all_heard = asyncio.Event()
+
+    def on_advert(device, adv):
+        mac = device.address.upper()
+        room = config.GOVEE_DEVICES.get(mac)
+        if room is None:
+            return
+        decoded = decode_govee(adv.manufacturer_data)
+        if decoded is None:
+            return
+        _, temp_c, humidity = decoded
+        readings[mac] = {"room_name": room, "temperature": temp_c, "humidity": humidity}
+        if len(readings) == len(config.GOVEE_DEVICES):
+            all_heard.set()
+
+    async with BleakScanner(detection_callback=on_advert):
+        try:
+            await asyncio.wait_for(all_heard.wait(), config.GOVEE_SCAN_SECONDS)
+        except asyncio.TimeoutError:
+            pass
     return readings
 
 
@@ -67,15 +106,16 @@ def collect_govee_once():
     conn = sqlite3.connect(config.DB_PATH)
     now = datetime.now(timezone.utc).isoformat()
     for mac, data in readings.items():
-        conn.execute(
-            """INSERT INTO govee_readings
-               (timestamp, mac, room_name, temperature, humidity)
-               VALUES (?, ?, ?, ?, ?)""",
-            (now, mac, data["room_name"], data["temperature"], data["humidity"]),
-        )
+        storage.store(conn, "govee_readings", {
+            "timestamp": now,
+            "mac": mac,
+            "room_name": data["room_name"],
+            "temperature": data["temperature"],
+            "humidity": data["humidity"],
+        })
         temp_f = round(data["temperature"] * 9 / 5 + 32, 1)
         print(f"  {data['room_name']}: {temp_f}°F, {data['humidity']:.1f}%")
-    conn.commit()
+    storage.commit(conn)
     conn.close()
 
 
@@ -86,10 +126,11 @@ def run_govee_collector():
     while True:
         try:
             print(f"\nCollecting Govee at {time.strftime('%Y-%m-%d %H:%M:%S')}...")
-            collect_govee_once()
+            with profiler.track("govee cycle", "cycle"):
+                collect_govee_once()
         except Exception as e:
             print(f"Error collecting Govee data: {e}")
-        time.sleep(config.GOVEE_POLL_INTERVAL_SECONDS)
+        time.sleep(scheduler.next_interval("Govee", config.GOVEE_POLL_INTERVAL_SECONDS))
 
 
 if __name__ == "__main__":
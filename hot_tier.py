@@ -0,0 +1,257 @@
+"""In-memory copy of the most recent readings.
+
+Every reading committed through storage.commit is also added to a
+per-series set of arrays (held per thread until then), so
+fetch_series can answer ranges inside the last HOT_TIER_HOURS without
+touching SQLite. The buffers are rebuilt from the database when the server
+starts; processes that never call rebuild() always go to the database.
+Rows written by another process (backfill.py) never pass through on_store,
+so backfill bumps INSERTED_TASK in backfill_state and sync() reloads the
+window when that mark moves.
+Only the primary site is held; other sites' shards are always read from
+SQLite.
+"""
+import bisect
+import datetime
+import threading
+import time
+from array import array
+
+import config
+import queries
+import sites
+import storage
+
+NAN = float("nan")
+TRIM_SLACK = 256  # expired samples tolerated before the front is cut
+INSERTED_TASK = "inserted"  # backfill_state row backfill.py updates with every batch
+
+_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+_series = {}
+_covered_since = None  # epoch ms from which memory is complete
+_inserted = None  # INSERTED_TASK progress when the window was last loaded
+_following = False
+_pending = threading.local()  # rows stored on this thread, applied on commit
+
+
+class Series:
+    """Samples of one room|source, oldest first, one array per column."""
+
+    __slots__ = ("source", "room", "ts", "columns", "ints")
+
+    def __init__(self, source, room):
+        self.source = source
+        self.room = room
+        self.ts = array("d")
+        self.columns = {col: array("d") for col, _ in source["fields"].values()}
+        self.ints = set()
+
+    def add(self, ts, values):
+        i = bisect.bisect_left(self.ts, ts)
+        replace = i < len(self.ts) and self.ts[i] == ts
+        if not replace:
+            self.ts.insert(i, ts)
+        for col, arr in self.columns.items():
+            value = values.get(col)
+            if isinstance(value, int):
+                self.ints.add(col)
+            value = NAN if value is None else float(value)
+            if replace:
+                arr[i] = value
+            else:
+                arr.insert(i, value)
+
+    def trim(self, cutoff):
+        n = bisect.bisect_left(self.ts, cutoff)
+        if n <= TRIM_SLACK:
+            return False
+        del self.ts[:n]
+        for arr in self.columns.values():
+            del arr[:n]
+        return True
+
+
+def window_ms():
+    return int(getattr(config, "HOT_TIER_HOURS", 24) * 3600 * 1000)
+
+
+def now_ms():
+    return time.time() * 1000
+
+
+def covers(since):
+    """True when every reading from `since` onward is held in memory."""
+    if _covered_since is None or since is None or sites.active() is not None:
+        return False
+    try:
+        return queries.iso_to_ms(since) >= _covered_since
+    except ValueError:
+        return False
+
+
+def _add(source, room, ts, values):
+    key = room + "|" + source["name"]
+    series = _series.get(key)
+    if series is None:
+        series = _series[key] = Series(source, room)
+    series.add(ts, values)
+
+
+def on_store(table, columns, rows):
+    """Hold this thread's stored rows until their transaction commits."""
+    if _covered_since is None:
+        return
+    conn = storage.connection()
+    if getattr(_pending, "conn", None) is not conn:
+        _pending.conn = conn  # anything held for another connection was rolled back
+        _pending.batches = []
+    _pending.batches.append((table, columns, rows))
+
+
+def _apply(table, columns, rows):
+    global _covered_since
+    source = storage.source_for(table)
+    ts_index = columns.index("timestamp")
+    room_index = columns.index(source["room_col"]) if "room_col" in source else None
+    cutoff = now_ms() - window_ms()
+    with _lock:
+        for row in rows:
+            ts = queries.iso_to_ms(row[ts_index])
+            if ts < _covered_since:
+                continue  # backfill of older data; the database has it
+            room = row[room_index] if room_index is not None else source["room"]
+            _add(source, room, ts, dict(zip(columns, row)))
+        trimmed = [series.trim(cutoff) for series in _series.values()]
+        if any(trimmed):
+            _covered_since = max(_covered_since, cutoff)
+
+
+def inserted_mark(conn):
+    row = conn.execute(
+        "SELECT progress FROM backfill_state WHERE task = ?", (INSERTED_TASK,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def rebuild():
+    """Load the window from the database and start following new readings.
+
+    Called again, it merges in whatever the database has gained since.
+    """
+    global _covered_since, _inserted, _following
+    if window_ms() <= 0:
+        return
+    with _rebuild_lock:
+        if not _following:
+            storage.add_listener(on_store)
+            storage.add_commit_listener(on_commit)
+            _following = True
+        since_ms = _covered_since if _covered_since is not None else now_ms() - window_ms()
+        since = datetime.datetime.fromtimestamp(
+            since_ms / 1000, datetime.timezone.utc
+        ).replace(tzinfo=None).isoformat() + "Z"
+        wanted = {s["name"]: list(s["fields"]) for s in queries.enabled_sources()}
+        conn = queries.connect()
+        try:
+            # Read first, so a batch landing during the load triggers another
+            inserted = inserted_mark(conn)
+            loaded = queries.fetch_series(conn, since, None, wanted, raw=True, memory=False)
+        finally:
+            conn.close()
+        sources = {s["name"]: s for s in queries.enabled_sources()}
+        with _lock:
+            for key, points in loaded.items():
+                room, _, name = key.rpartition("|")
+                source = sources[name]
+                for point in points:
+                    values = {col: point[f] for f, (col, _) in source["fields"].items()}
+                    _add(source, room, point["timestamp"], values)
+            if _covered_since is None:
+                _covered_since = since_ms
+            _inserted = inserted
+    print(f"Hot tier: {sum(len(p) for p in loaded.values())} readings in memory")
+
+
+def sync(conn):
+    """Reload if backfill.py has inserted rows since the window was loaded."""
+    if _covered_since is None or sites.active() is not None:
+        return
+    if inserted_mark(conn) != _inserted:
+        rebuild()
+
+
+def on_commit():
+    batches = getattr(_pending, "batches", None)
+    if batches and _pending.conn is storage.connection():
+        for batch in batches:
+            _apply(*batch)
+    _pending.conn = _pending.batches = None
+    sync(queries.read_only_connection())  # kept open per thread
+
+
+def _value(value, convert, is_int):
+    if value != value:
+        value = None
+    elif is_int:
+        value = int(value)
+    return convert(value) if convert else value
+
+
+def fetch_series(since, until, wanted, bucket_ms=None, raw=False):
+    """queries.fetch_series answered from memory."""
+    since_ms = queries.iso_to_ms(since)
+    until_ms = queries.iso_to_ms(until) if until else float("inf")
+    snapshots = []
+    with _lock:
+        for key, series in _series.items():
+            fields = wanted.get(series.source["name"])
+            if not fields:
+                continue
+            lo = bisect.bisect_left(series.ts, since_ms)
+            hi = bisect.bisect_left(series.ts, until_ms)
+            if lo == hi:
+                continue
+            columns = []
+            for field in fields:
+                col, convert = series.source["fields"][field]
+                columns.append((
+                    field,
+                    series.columns[col][lo:hi],
+                    None if raw else convert,
+                    col in series.ints and not bucket_ms,
+                ))
+            snapshots.append((key, series.ts[lo:hi], columns))
+    result = {}
+    for key, ts, columns in snapshots:
+        if bucket_ms:
+            result[key] = _buckets(ts, columns, int(bucket_ms))
+        else:
+            result[key] = [
+                {
+                    "timestamp": int(t),
+                    **{f: _value(arr[i], convert, is_int) for f, arr, convert, is_int in columns},
+                }
+                for i, t in enumerate(ts)
+            ]
+    return result
+
+
+def _buckets(ts, columns, bucket_ms):
+    """Average into ts // bucket_ms buckets, as the SQL GROUP BY does."""
+    points = []
+    start = 0
+    n = len(ts)
+    while start < n:
+        k = int(ts[start]) // bucket_ms
+        end = start
+        while end < n and int(ts[end]) // bucket_ms == k:
+            end += 1
+        point = {"timestamp": int(ts[start])}
+        for field, arr, convert, _ in columns:
+            values = [v for v in arr[start:end] if v == v]
+            avg = sum(values) / len(values) if values else None
+            point[field] = convert(avg) if convert else avg
+        points.append(point)
+        start = end
+    return points
@@ -0,0 +1,131 @@
+"""Cross-source series aligned onto one time grid.
+
+Each series is "Room|Source:field" (the keys /api/data returns, plus the
+field). All requested fields of a source are read in one bucketed query,
+so the whole join is a single pass per source over the timestamp index.
+Every grid cell takes the series' own bucket if it has one, else the most
+recent earlier bucket no more than `asof_ms` old (an as-of join), so a
+30-minute Govee poll still lines up with 5-minute weather readings.
+
+Derived columns combine two series by index: "0-1" is series 0 minus series
+1 (indoor minus outdoor), "2/3" is series 2 per unit of series 3 (panel
+output per W/m² of irradiance).
+"""
+import queries
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 10000
+DEFAULT_ASOF_MS = 30 * 60 * 1000  # the slowest collector, Govee, polls every 30 min
+OPERATORS = {
+    "-": lambda a, b: a - b,
+    "/": lambda a, b: a / b if b else None,
+}
+
+
+def parse_series(param):
+    """[(key, source name, field)] for "Room|Source:field,..."; ValueError if bad."""
+    sources = {s["name"]: s for s in queries.enabled_sources()}
+    series = []
+    for spec in (param or "").split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        key, _, field = spec.rpartition(":")
+        room, _, name = key.rpartition("|")
+        if not room or name not in sources or field not in sources[name]["fields"]:
+            raise ValueError(f"unknown series {spec!r}")
+        series.append((key, name, field))
+    if not series:
+        raise ValueError("series must name at least one Room|Source:field")
+    return series
+
+
+def parse_derived(param, count):
+    """[(spec, op, i, j)] for "0-1,2/3"; ValueError if bad."""
+    derived = []
+    for spec in (param or "").split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        op = next((op for op in OPERATORS if op in spec), None)
+        left, _, right = spec.partition(op or " ")
+        if op is None or not left.isdigit() or not right.isdigit():
+            raise ValueError(f"derived columns look like 0-1 or 2/3, not {spec!r}")
+        i, j = int(left), int(right)
+        if i >= count or j >= count:
+            raise ValueError(f"{spec!r} refers to a series that was not requested")
+        derived.append((spec, op, i, j))
+    return derived
+
+
+def _align(points, field, grid, bucket_ms, asof_ms):
+    """Values of one bucketed series on the grid, carrying forward up to asof_ms."""
+    values = []
+    i = 0
+    last_start = last_value = None
+    for cell in grid:
+        while i < len(points) and points[i]["timestamp"] // bucket_ms * bucket_ms <= cell:
+            value = points[i][field]
+            if value is not None:
+                last_start = points[i]["timestamp"] // bucket_ms * bucket_ms
+                last_value = value
+            i += 1
+        if last_start is not None and cell - last_start <= asof_ms:
+            values.append(last_value)
+        else:
+            values.append(None)
+    return values
+
+
+def join(conn, series, since, until, bucket_ms, asof_ms=DEFAULT_ASOF_MS, derived=()):
+    """Columnar result: grid timestamps, then series and derived columns in order."""
+    wanted = {}
+    for _, name, field in series:
+        fields = wanted.setdefault(name, [])
+        if field not in fields:
+            fields.append(field)
+    fetched = queries.fetch_series(conn, since, until, wanted, bucket_ms)
+
+    starts = [
+        points[0]["timestamp"] // bucket_ms * bucket_ms
+        for points in (fetched.get(key) for key, _, _ in series) if points
+    ]
+    ends = [
+        points[-1]["timestamp"] // bucket_ms * bucket_ms
+        for points in (fetched.get(key) for key, _, _ in series) if points
+    ]
+    grid = list(range(min(starts), max(ends) + 1, bucket_ms)) if starts else []
+
+    aligned = [
+        _align(fetched.get(key, []), field, grid, bucket_ms, asof_ms)
+        for key, _, field in series
+    ]
+    names = [f"{key}:{field}" for key, _, field in series]
+    return {
+        "timestamps": grid,
+        "bucket_ms": bucket_ms,
+        "series": [{"name": n, "values": v} for n, v in zip(names, aligned)],
+        "derived": [
+            {
+                "name": f"{names[i]} {op} {names[j]}",
+                "values": [_combine(OPERATORS[op], a, b) for a, b in zip(aligned[i], aligned[j])],
+            }
+            for _, op, i, j in derived
+        ],
+    }
+
+
+def _combine(fn, a, b):
+    if a is None or b is None:
+        return None
+    value = fn(a, b)
+    return round(value, 4) if value is not None else None
+
+
+def grid_bucket(conn, since, until, bucket_ms=None, points=None, min_bucket_ms=1):
+    """Bucket width for a join: as asked, or from `points`, but never so
+    fine that the grid exceeds MAX_POINTS cells."""
+    widest = queries.bucket_for_points(conn, since, until, MAX_POINTS) or 0
+    if bucket_ms is None:
+        bucket_ms = queries.bucket_for_points(conn, since, until, points or DEFAULT_POINTS)
+    return max(bucket_ms or 0, widest, min_bucket_ms)
@@ -0,0 +1,141 @@
+"""Scale test: run the collectors against fake_upstream at accelerated time.
+
+    python loadtest.py --pods 10,50,200 --speed 60 --duration 20 --latency 30
+
+Each trial starts with the given pod count and runs the Sensibo, weather and
+solar collect_*_once loops side by side, polling `speed` times faster than
+configured, into a scratch database. A source keeps up while its p95 cycle
+fits inside its accelerated poll interval.
+"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+import config
+import fake_upstream
+
+# Enough for the collectors to import when config.py is minimal
+CONFIG_DEFAULTS = {
+    "API_KEY": "fake",
+    "POLL_INTERVAL_SECONDS": 300,
+    "WU_STATION_ID": "KFAKE1",
+    "WU_POLL_INTERVAL_SECONDS": 300,
+    "ENPHASE_HOST": "127.0.0.1",
+    "ENPHASE_TOKEN": "fake",
+    "ENPHASE_POLL_INTERVAL_SECONDS": 300,
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_loop(collect, interval, deadline, cycles, errors):
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            collect()
+        except Exception as e:
+            errors.append(repr(e))
+        elapsed = time.perf_counter() - start
+        cycles.append(elapsed)
+        time.sleep(max(0.0, interval - elapsed))
+
+
+def row_counts(tables):
+    conn = sqlite3.connect(config.DB_PATH)
+    counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables}
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pods", default="5,25,100", help="comma-separated pod counts")
+    parser.add_argument("--speed", type=float, default=60)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per trial")
+    parser.add_argument("--latency", type=float, default=20, help="mean upstream latency, ms")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests/minute per API")
+    parser.add_argument("--db", default="loadtest.db")
+    opts = parser.parse_args()
+
+    fake = fake_upstream.start(
+        latency_ms=opts.latency, error_rate=opts.error_rate,
+        rate_limit=opts.rate_limit, speed=opts.speed,
+    )
+    for name, value in CONFIG_DEFAULTS.items():
+        if not hasattr(config, name):
+            setattr(config, name, value)
+    for name, value in fake_upstream.config_overrides(fake.base_url).items():
+        setattr(config, name, value)
+    config.DB_PATH = opts.db
+    if os.path.exists(opts.db):
+        os.remove(opts.db)
+
+    # The collectors read their URLs from config at import time
+    import collector
+    import migrations
+    import solar_collector
+    import weather_collector
+
+    migrations.migrate()
+    sources = [
+        ("Sensibo", "readings", collector.collect_once, config.POLL_INTERVAL_SECONDS),
+        ("Weather", "weather_readings", weather_collector.collect_weather_once,
+         config.WU_POLL_INTERVAL_SECONDS),
+        ("Enphase", "solar_readings", solar_collector.collect_solar_once,
+         config.ENPHASE_POLL_INTERVAL_SECONDS),
+    ]
+    tables = [table for _, table, _, _ in sources]
+
+    print(f"Fake upstream at {fake.base_url}, {opts.speed:g}x time, "
+          f"{opts.latency:g} ms latency, {opts.duration:g} s per trial\n")
+    print(f"{'pods':>5} {'source':<8} {'cycles':>6} {'mean ms':>8} {'p95 ms':>8} "
+          f"{'max ms':>8} {'budget ms':>9} {'rows':>6} {'errors':>6}  status")
+    for pods in [int(p) for p in opts.pods.split(",")]:
+        fake.pods = pods
+        fake.stats.clear()
+        before = row_counts(tables)
+        deadline = time.time() + opts.duration
+        results = []
+        threads = []
+        with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+            for name, table, collect, interval in sources:
+                budget = interval / opts.speed
+                cycles, errors = [], []
+                results.append((name, table, budget, cycles, errors))
+                thread = threading.Thread(
+                    target=run_loop, args=(collect, budget, deadline, cycles, errors)
+                )
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        after = row_counts(tables)
+        for name, table, budget, cycles, errors in results:
+            p95 = percentile(cycles, 95)
+            status = "ok" if p95 <= budget else "FALLING BEHIND"
+            if name == "Sensibo":
+                per_pod = statistics.mean(cycles) / max(pods, 1)
+                status += f" (~{int(budget / per_pod)} pods max)"
+            print(
+                f"{pods:>5} {name:<8} {len(cycles):>6} {statistics.mean(cycles) * 1000:>8.1f} "
+                f"{p95 * 1000:>8.1f} {max(cycles) * 1000:>8.1f} {budget * 1000:>9.0f} "
+                f"{after[table] - before[table]:>6} {len(errors):>6}  {status}"
+            )
+        for name, _, _, _, errors in results:
+            for error in sorted(set(errors)):
+                print(f"      {name} error: {error[:100]}")
+        rejected = {k: v for k, v in fake.stats.items() if " " in k}
+        if rejected:
+            print(f"      upstream rejections: {dict(rejected)}")
+
+
+if __name__ == "__main__":
+    main()
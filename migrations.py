@@ -0,0 +1,287 @@
+"""Numbered schema migrations keyed on PRAGMA user_version.
+
+migrate() applies every pending migration in one transaction and is a single
+PRAGMA read once the schema is current, so startup does no DDL. Work too big
+for that transaction (index builds, table copies) is an online migration:
+run_online_migrations() does it in small batches on a background thread,
+recording progress in schema_jobs so a restart picks up where it stopped.
+
+    python migrations.py             apply pending migrations
+    python migrations.py --online    ...and run online migrations to completion
+"""
+import json
+import sqlite3
+import sys
+import time
+
+import config
+import derived
+import queries
+import storage
+
+BATCH_PAUSE_SECONDS = 0.1  # lets collectors commit between online batches
+
+
+def _v1_source_tables(conn):
+    """Per-source reading tables"""
+    # IF NOT EXISTS: databases from before versioning already have them
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            device_id TEXT NOT NULL,
+            room_name TEXT NOT NULL,
+            temperature REAL,
+            humidity REAL,
+            co2 INTEGER,
+            tvoc INTEGER,
+            iaq INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS govee_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            mac TEXT NOT NULL,
+            room_name TEXT NOT NULL,
+            temperature REAL,
+            humidity REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS weather_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            station_id TEXT NOT NULL,
+            temperature REAL,
+            humidity REAL,
+            dewpoint REAL,
+            wind_speed REAL,
+            wind_gust REAL,
+            wind_dir INTEGER,
+            pressure REAL,
+            precip_rate REAL,
+            precip_total REAL,
+            solar_radiation REAL,
+            uv REAL,
+            aqi INTEGER,
+            pm25 REAL,
+            pm10 REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS solar_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            production_w REAL,
+            consumption_w REAL,
+            net_consumption_w REAL,
+            production_wh_today REAL,
+            consumption_wh_today REAL,
+            production_wh_lifetime REAL
+        )
+    """)
+    for name, table in (
+        ("idx_readings_timestamp", "readings"),
+        ("idx_govee_timestamp", "govee_readings"),
+        ("idx_weather_timestamp", "weather_readings"),
+        ("idx_solar_timestamp", "solar_readings"),
+    ):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} (timestamp)")
+
+
+def _v2_solar_grid_columns(conn):
+    """Solar import/export energy columns"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(solar_readings)")}
+    for col in ("imported_wh_today", "exported_wh_today"):
+        if col not in existing:
+            conn.execute(f"ALTER TABLE solar_readings ADD COLUMN {col} REAL")
+
+
+def _v3_narrow_storage(conn):
+    """Series and samples tables for the narrow storage engine"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS series (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            room TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            UNIQUE (source, room, metric)
+        )
+    """)
+    # No declared type on value, so integers and reals keep their storage class
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS samples (
+            series_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            value,
+            PRIMARY KEY (series_id, ts)
+        ) WITHOUT ROWID
+    """)
+
+
+def _v4_backfill_state(conn):
+    """Backfill progress"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_state (
+            task TEXT PRIMARY KEY,
+            progress TEXT NOT NULL
+        )
+    """)
+
+
+def _v5_schema_jobs(conn):
+    """Online migration progress"""
+    conn.execute("""
+        CREATE TABLE schema_jobs (
+            name TEXT PRIMARY KEY,
+            state TEXT,
+            finished INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def _v6_derived_columns(conn):
+    """Derived metric columns"""
+    for table, columns in derived.COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for col in columns:
+            if col not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} REAL")
+
+
+# Append only: position + 1 is the version a migration brings the schema to
+MIGRATIONS = [
+    _v1_source_tables,
+    _v2_solar_grid_columns,
+    _v3_narrow_storage,
+    _v4_backfill_state,
+    _v5_schema_jobs,
+    _v6_derived_columns,
+]
+
+
+def migrate():
+    """Bring the database to the latest version; a no-op when it is current."""
+    conn = sqlite3.connect(config.DB_PATH, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock in case another process got here first
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, step in enumerate(MIGRATIONS[version:], version + 1):
+                print(f"Schema migration {number}: {step.__doc__}")
+                step(conn)
+            conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def _room_indexes(conn, state):
+    """(room_name, timestamp) indexes for room lookups and latest-row joins"""
+    # An index build cannot be split, so each one is its own short step
+    pending = [("idx_readings_room", "readings"), ("idx_govee_room", "govee_readings")]
+    i = state or 0
+    name, table = pending[i]
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} (room_name, timestamp)")
+    return i + 1 if i + 1 < len(pending) else None
+
+
+def _derived_metrics(conn, state):
+    """Fill derived metric columns for rows stored before they existed"""
+    state = state or {"table": 0, "after_id": 0}
+    tables = list(derived.COLUMNS)
+    table = tables[state["table"]]
+    inputs = derived.INPUTS[table]
+    columns = derived.COLUMNS[table]
+    rows = conn.execute(
+        f"SELECT id, {', '.join(inputs)} FROM {table} "
+        f"WHERE id > ? AND {columns[0]} IS NULL ORDER BY id LIMIT ?",
+        (state["after_id"], storage.COPY_BATCH_ROWS),
+    ).fetchall()
+    if rows:
+        conn.executemany(
+            f"UPDATE {table} SET {', '.join(c + ' = ?' for c in columns)} WHERE id = ?",
+            [
+                derived.compute(conn, table, dict(zip(inputs, row[1:]))) + (row[0],)
+                for row in rows
+            ],
+        )
+        return {"table": state["table"], "after_id": rows[-1][0]}
+    if state["table"] + 1 < len(tables):
+        return {"table": state["table"] + 1, "after_id": 0}
+    return None
+
+
+def _copy_to_samples(conn, state):
+    """Copy the per-source tables into the narrow samples table"""
+    state = state or {"table": 0, "after_id": 0}
+    tables = [source["table"] for source in queries.SOURCES]
+    last_id = storage.copy_batch(conn, tables[state["table"]], state["after_id"])
+    if last_id is not None:
+        return {"table": state["table"], "after_id": last_id}
+    if state["table"] + 1 < len(tables):
+        return {"table": state["table"] + 1, "after_id": 0}
+    return None
+
+
+# name -> (step, applies). step(conn, state) does one batch and returns the
+# next state, or None when finished.
+ONLINE_MIGRATIONS = {
+    "room_indexes": (_room_indexes, lambda: True),
+    # Before copy_to_samples, so a narrow migration carries the derived values
+    "derived_metrics": (_derived_metrics, lambda: True),
+    "copy_to_samples": (_copy_to_samples, lambda: storage.narrow()),
+}
+
+
+def run_online(name, pause=BATCH_PAUSE_SECONDS):
+    """Run one online migration to completion, committing after every batch."""
+    step, _ = ONLINE_MIGRATIONS[name]
+    conn = sqlite3.connect(config.DB_PATH)
+    try:
+        row = conn.execute(
+            "SELECT state, finished FROM schema_jobs WHERE name = ?", (name,)
+        ).fetchone()
+        if row and row[1]:
+            return
+        state = json.loads(row[0]) if row and row[0] else None
+        if row is None:
+            print(f"Online migration {name}: {step.__doc__}")
+        while True:
+            state = step(conn, state)
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_jobs (name, state, finished) VALUES (?, ?, ?)",
+                (name, json.dumps(state), int(state is None)),
+            )
+            conn.commit()
+            if state is None:
+                break
+            time.sleep(pause)
+        print(f"Online migration {name} finished")
+    finally:
+        conn.close()
+
+
+def run_online_migrations():
+    for name, (_, applies) in ONLINE_MIGRATIONS.items():
+        if not applies():
+            continue
+        try:
+            run_online(name)
+        except Exception as e:
+            print(f"Error in online migration {name}: {e}")
+
+
+if __name__ == "__main__":
+    migrate()
+    if "--online" in sys.argv:
+        for job, (_, applies) in ONLINE_MIGRATIONS.items():
+            if applies():
+                run_online(job, pause=0)
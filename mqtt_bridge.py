@@ -0,0 +1,200 @@
+"""MQTT ingest from remote BLE proxies, and fan-out of new readings.
+
+Proxies (ESP32s, other Pis) publish the Govee advertisements they hear to
+MQTT_ADVERT_TOPIC, one JSON message per advert, in either form:
+
+    {"mac": "A4:C1:38:00:00:00", "manufacturer_data": {"60552": "00660894116402"}}
+    {"id": "A4:C1:38:00:00:00", "manufacturerdata": "88ec00660894116402"}
+
+The second is OpenMQTTGateway's, with the company id as the first two bytes.
+Adverts from MACs in GOVEE_DEVICES are decoded with decode_govee, the newest
+per sensor is kept, and every MQTT_FLUSH_SECONDS they are stored in one
+transaction. Several proxies hearing the same sensor collapse to one row.
+
+Every reading stored by any collector is also published, once committed, to
+MQTT_PUBLISH_TOPIC/<source>/<room> as {"key", "timestamp", field: value...},
+the point shape /api/data returns.
+
+    python mqtt_bridge.py fake-advert A4:C1:38:00:00:00 21.5 45   test advert
+
+Needs paho-mqtt (pip install paho-mqtt).
+"""
+import json
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+import config
+import queries
+import storage
+from govee_collector import GOVEE_MFR_KEY, decode_govee
+
+_lock = threading.Lock()
+_latest = {}  # mac -> (timestamp, temperature, humidity), waiting to be stored
+_pending = threading.local()  # rows stored on this thread, published on commit
+_client = None
+
+
+def advert_topic():
+    return getattr(config, "MQTT_ADVERT_TOPIC", "guthome/ble")
+
+
+def publish_topic():
+    return getattr(config, "MQTT_PUBLISH_TOPIC", "guthome/readings")
+
+
+def connect(subscribe=None, on_message=None):
+    """Connected paho client with the loop running on its own thread.
+
+    `subscribe` is (re)subscribed on every connect, so a broker restart
+    does not silently end the ingest.
+    """
+    if mqtt is None:
+        raise RuntimeError("MQTT needs paho-mqtt installed")
+    if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    else:
+        client = mqtt.Client()
+    if subscribe:
+        # The callback's other arguments differ between paho 1.x and 2.x
+        client.on_connect = lambda c, *args: c.subscribe(subscribe)
+        client.on_message = on_message
+    if getattr(config, "MQTT_USERNAME", None):
+        client.username_pw_set(config.MQTT_USERNAME, getattr(config, "MQTT_PASSWORD", None))
+    client.connect(config.MQTT_HOST, getattr(config, "MQTT_PORT", 1883))
+    client.loop_start()
+    return client
+
+
+def parse_advert(payload):
+    """(MAC, {company id: bytes}) from an advert message; ValueError if malformed."""
+    msg = json.loads(payload)
+    mac = (msg.get("mac") or msg.get("id") or "").upper()
+    if "manufacturer_data" in msg:
+        mfr_data = {int(k): bytes.fromhex(v) for k, v in msg["manufacturer_data"].items()}
+    elif "manufacturerdata" in msg:
+        raw = bytes.fromhex(msg["manufacturerdata"])
+        mfr_data = {struct.unpack_from("<H", raw)[0]: raw[2:]}
+    else:
+        raise ValueError("no manufacturer data")
+    return mac, mfr_data
+
+
+def on_advert(client, userdata, message):
+    try:
+        mac, mfr_data = parse_advert(message.payload)
+    except (ValueError, KeyError, AttributeError, struct.error) as e:
+        print(f"Ignoring MQTT advert on {message.topic}: {e}")
+        return
+    if mac not in config.GOVEE_DEVICES:
+        return
+    decoded = decode_govee(mfr_data)
+    if decoded is None:
+        return
+    _, temp_c, humidity = decoded
+    with _lock:
+        _latest[mac] = (datetime.now(timezone.utc).isoformat(), temp_c, humidity)
+
+
+def flush():
+    """Store the newest advert of each sensor heard since the last flush."""
+    with _lock:
+        batch = list(_latest.items())
+        _latest.clear()
+    if not batch:
+        return
+    rows = [
+        (ts, mac, config.GOVEE_DEVICES[mac], temp_c, humidity)
+        for mac, (ts, temp_c, humidity) in batch
+    ]
+    conn = sqlite3.connect(config.DB_PATH)
+    try:
+        storage.store_many(
+            conn, "govee_readings",
+            ("timestamp", "mac", "room_name", "temperature", "humidity"), rows,
+        )
+        storage.commit(conn)
+    finally:
+        conn.close()
+    print(f"MQTT: stored {len(rows)} Govee readings")
+
+
+def on_store(table, columns, rows):
+    if not hasattr(_pending, "rows"):
+        _pending.rows = []
+    _pending.rows.append((table, columns, rows))
+
+
+def on_commit():
+    """Publish what this thread stored, now that it is committed."""
+    stored = getattr(_pending, "rows", None)
+    if not stored or _client is None:
+        return
+    _pending.rows = []
+    for table, columns, rows in stored:
+        source = storage.source_for(table)
+        index = {col: i for i, col in enumerate(columns)}
+        room_index = index.get(source.get("room_col"))
+        for row in rows:
+            room = row[room_index] if room_index is not None else source["room"]
+            point = {
+                "key": f"{room}|{source['name']}",
+                "timestamp": queries.iso_to_ms(row[index["timestamp"]]),
+            }
+            for field, (col, convert) in source["fields"].items():
+                value = row[index[col]] if col in index else None
+                point[field] = convert(value) if convert else value
+            _client.publish(
+                f"{publish_topic()}/{source['name']}/{room}", json.dumps(point), qos=0
+            )
+
+
+def run_mqtt_bridge():
+    global _client
+    try:
+        # topic/# also matches the bare topic
+        _client = connect(advert_topic() + "/#", on_advert)
+    except Exception as e:
+        print(f"MQTT bridge not started: {e}")
+        return
+    storage.add_listener(on_store)
+    storage.add_commit_listener(on_commit)
+    flush_seconds = getattr(config, "MQTT_FLUSH_SECONDS", 60)
+    print(f"MQTT bridge on {config.MQTT_HOST}: adverts from {advert_topic()}, "
+          f"readings to {publish_topic()}")
+    while True:
+        time.sleep(flush_seconds)
+        try:
+            flush()
+        except Exception as e:
+            print(f"Error storing MQTT readings: {e}")
+
+
+def encode_h5074(temp_c, humidity):
+    """H5074 manufacturer data for a reading, as a proxy would hear it."""
+    return struct.pack("<BhHBB", 0, round(temp_c * 100), round(humidity * 100), 100, 2)
+
+
+def fake_advert(mac, temp_c, humidity):
+    client = connect()
+    payload = {"mac": mac, "manufacturer_data": {
+        str(GOVEE_MFR_KEY): encode_h5074(temp_c, humidity).hex(),
+    }}
+    client.publish(f"{advert_topic()}/test", json.dumps(payload)).wait_for_publish()
+    client.loop_stop()
+    client.disconnect()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "fake-advert":
+        fake_advert(sys.argv[2].upper(), float(sys.argv[3]), float(sys.argv[4]))
+    else:
+        print(__doc__)
@@ -0,0 +1,156 @@
+"""Sampling profiler and slow-operation recorder for the running server.
+
+capture() samples the stack of every thread with sys._current_frames() and
+returns them in collapsed form ("thread;outer;...;inner count" per line),
+which flamegraph.pl, speedscope and similar tools read directly.
+
+Requests and collector cycles run inside track(). When SLOW_REQUEST_MS or
+SLOW_CYCLE_MS is set, a watchdog thread samples any tracked operation that
+runs past its threshold, and the stacks of the slow ones are kept in a short
+ring buffer. Untracked code pays nothing; tracked code pays a dict insert.
+"""
+import collections
+import contextlib
+import sys
+import threading
+import time
+
+import config
+
+DEFAULT_INTERVAL_MS = 10
+MAX_CAPTURE_SECONDS = 60
+SLOW_KEEP = 50  # slow operations kept for /admin/slow
+WATCH_INTERVAL_MS = 20
+
+_capture_lock = threading.Lock()
+_lock = threading.Lock()
+_active = {}  # thread id -> {"name", "start", "threshold", "stacks"}
+_slow = collections.deque(maxlen=SLOW_KEEP)
+_watchdog = None
+
+
+def _thread_names():
+    return {t.ident: t.name for t in threading.enumerate()}
+
+
+def _stack(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "?")
+        parts.append(f"{module}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+def collapse(counts):
+    """Collapsed-stack text, heaviest stacks first."""
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def capture(seconds, interval_ms=DEFAULT_INTERVAL_MS):
+    """Sample every thread for `seconds`; a Counter of collapsed stacks.
+
+    Only one capture runs at a time; returns None if one is in progress.
+    """
+    if not _capture_lock.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        counts = collections.Counter()
+        interval = max(interval_ms, 1) / 1000
+        deadline = time.perf_counter() + min(seconds, MAX_CAPTURE_SECONDS)
+        while time.perf_counter() < deadline:
+            names = _thread_names()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                counts[names.get(ident, str(ident)) + ";" + _stack(frame)] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        _capture_lock.release()
+
+
+def slow_threshold_ms(kind):
+    """Configured threshold for "request" or "cycle" operations, or None."""
+    name = "SLOW_REQUEST_MS" if kind == "request" else "SLOW_CYCLE_MS"
+    return getattr(config, name, None)
+
+
+def start(name, kind):
+    """Begin tracking the calling thread's operation if recording is on."""
+    threshold = slow_threshold_ms(kind)
+    if not threshold:
+        return
+    _ensure_watchdog()
+    _active[threading.get_ident()] = {
+        "name": name,
+        "start": time.perf_counter(),
+        "threshold": threshold / 1000,
+        "stacks": None,
+    }
+
+
+def finish():
+    """End tracking; keep the operation if it ran past its threshold."""
+    op = _active.pop(threading.get_ident(), None)
+    if op is None:
+        return
+    elapsed = time.perf_counter() - op["start"]
+    if elapsed < op["threshold"]:
+        return
+    with _lock:
+        stacks = op["stacks"] or collections.Counter()
+    _slow.append({
+        "name": op["name"],
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "ms": round(elapsed * 1000, 1),
+        "stacks": collapse(stacks),
+    })
+
+
+@contextlib.contextmanager
+def track(name, kind):
+    start(name, kind)
+    try:
+        yield
+    finally:
+        finish()
+
+
+def slow_operations():
+    """Recorded slow operations, newest first."""
+    return list(reversed(_slow))
+
+
+def _watch():
+    while True:
+        time.sleep(WATCH_INTERVAL_MS / 1000)
+        now = time.perf_counter()
+        overdue = [
+            (ident, op) for ident, op in list(_active.items())
+            if now - op["start"] >= op["threshold"]
+        ]
+        if not overdue:
+            continue
+        frames = sys._current_frames()
+        with _lock:
+            for ident, op in overdue:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                if op["stacks"] is None:
+                    op["stacks"] = collections.Counter()
+                op["stacks"][_stack(frame)] += 1
+
+
+def _ensure_watchdog():
+    global _watchdog
+    if _watchdog is not None:
+        return
+    with _lock:
+        if _watchdog is None:
+            _watchdog = threading.Thread(target=_watch, name="slow-watchdog", daemon=True)
+            _watchdog.start()
@@ -0,0 +1,449 @@
+import datetime
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import archive
+import hot_tier
+import sites
+import storage
+
+
+def c_to_f(value):
+    return round(value * 9 / 5 + 32, 1) if value is not None else None
+
+
+def w_to_kw(value):
+    return round(value / 1000, 2) if value else None
+
+
+RANGE_MAP = {
+    "1h": datetime.timedelta(hours=1),
+    "6h": datetime.timedelta(hours=6),
+    "24h": datetime.timedelta(hours=24),
+    "7d": datetime.timedelta(days=7),
+    "30d": datetime.timedelta(days=30),
+    "1y": datetime.timedelta(days=365),
+}
+
+# Dashboard sources. Per-room sources name their room column; single-station
+# sources have a fixed room label. "fields" maps each dashboard field to its
+# column and display conversion; see derived.py for the computed columns.
+SOURCES = [
+    {
+        "name": "Sensibo",
+        "table": "readings",
+        "room_col": "room_name",
+        "fields": {
+            "temperature": ("temperature", c_to_f),
+            "humidity": ("humidity", None),
+            "co2": ("co2", None),
+            "tvoc": ("tvoc", None),
+            "iaq": ("iaq", None),
+            "heat_index": ("heat_index", c_to_f),
+            "dew_point": ("dew_point", c_to_f),
+            "abs_humidity": ("abs_humidity", None),
+        },
+    },
+    {
+        "name": "Govee",
+        "table": "govee_readings",
+        "room_col": "room_name",
+        "fields": {
+            "temperature": ("temperature", c_to_f),
+            "humidity": ("humidity", None),
+            "heat_index": ("heat_index", c_to_f),
+            "dew_point": ("dew_point", c_to_f),
+            "abs_humidity": ("abs_humidity", None),
+        },
+    },
+    {
+        "name": "Weather",
+        "table": "weather_readings",
+        "room": "Outside",
+        "fields": {
+            "temperature": ("temperature", None),
+            "humidity": ("humidity", None),
+            "iaq": ("aqi", None),
+            "wind_speed": ("wind_speed", None),
+            "wind_gust": ("wind_gust", None),
+            "pressure": ("pressure", None),
+            "precip_rate": ("precip_rate", None),
+            "precip_total": ("precip_total", None),
+            "uv": ("uv", None),
+            "solar_radiation": ("solar_radiation", None),
+            "heat_index": ("heat_index", None),
+            "dew_point": ("dewpoint", None),
+            "abs_humidity": ("abs_humidity", None),
+        },
+    },
+    {
+        "name": "Enphase",
+        "table": "solar_readings",
+        "room": "Solar",
+        "fields": {
+            "production_w": ("production_w", w_to_kw),
+            "consumption_w": ("consumption_w", w_to_kw),
+            "net_consumption_w": ("net_consumption_w", w_to_kw),
+            "production_wh_today": ("production_wh_today", w_to_kw),
+            "consumption_wh_today": ("consumption_wh_today", w_to_kw),
+            "self_consumption": ("self_consumption", None),
+            "production_peak_w": ("production_peak_today_w", w_to_kw),
+        },
+    },
+]
+
+_pools = {}  # site (None for the primary) -> its query pool
+_pools_lock = threading.Lock()
+_local = threading.local()
+
+
+def epoch_ms_sql(col="timestamp"):
+    """SQL expression converting a stored UTC ISO timestamp to epoch ms."""
+    return f"CAST(ROUND((julianday({col}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def room_sql(source):
+    if "room_col" in source:
+        return source["room_col"]
+    return "'" + source["room"] + "'"
+
+
+def enabled_sources():
+    if sites.setting("GOVEE_ENABLED", False):
+        return SOURCES
+    return [s for s in SOURCES if s["name"] != "Govee"]
+
+
+def time_bounds(range_param, start_param=None, end_param=None, now=None):
+    """Return (since, until) timestamp strings for a range request.
+
+    Either bound is None when the range is open on that side. Custom bounds
+    that are not ISO timestamps raise ValueError.
+    """
+    if range_param == "custom" and start_param and end_param:
+        return check_bound(start_param), check_bound(end_param)
+    if range_param in RANGE_MAP:
+        now = now or datetime.datetime.utcnow()
+        return (now - RANGE_MAP[range_param]).isoformat() + "Z", None
+    return None, None
+
+
+def check_bound(value):
+    """value, if None or an ISO timestamp; ValueError otherwise."""
+    if value is not None:
+        try:
+            iso_to_ms(value)
+        except (ValueError, AttributeError):
+            raise ValueError(f"{value!r} is not an ISO 8601 timestamp") from None
+    return value
+
+
+def range_where(since, until, ts_col="timestamp"):
+    clauses = []
+    params = []
+    if since is not None:
+        clauses.append(f"{ts_col} >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append(f"{ts_col} < ?")
+        params.append(until)
+    if not clauses:
+        return "", params
+    return "WHERE " + " AND ".join(clauses), params
+
+
+def parse_series(param):
+    """Map each enabled source to the fields requested by a series list.
+
+    Entries are "field" (every source that has it) or "Source:field". A
+    missing or empty list requests every field.
+    """
+    specs = [spec.strip() for spec in (param or "").split(",") if spec.strip()]
+    wanted = {}
+    for source in enabled_sources():
+        fields = source["fields"]
+        if not specs:
+            wanted[source["name"]] = list(fields)
+            continue
+        picked = []
+        for spec in specs:
+            src, _, field = spec.rpartition(":")
+            if src in ("", source["name"]) and field in fields and field not in picked:
+                picked.append(field)
+        if picked:
+            wanted[source["name"]] = picked
+    return wanted
+
+
+def iso_to_ms(ts_str):
+    dt = datetime.datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return round(dt.timestamp() * 1000)
+
+
+def bucket_for_points(conn, since, until, points):
+    """Bucket width (ms) that yields about `points` samples across a range."""
+    if since is None and storage.narrow():
+        start = storage.oldest(conn)
+        if start is None:
+            return None
+    elif since is None:
+        oldest = conn.execute(
+            "SELECT MIN(ts) FROM ("
+            + " UNION ALL ".join(
+                f"SELECT MIN(timestamp) AS ts FROM {s['table']}" for s in enabled_sources()
+            )
+            + ")"
+        ).fetchone()[0]
+        candidates = [iso_to_ms(oldest)] if oldest else []
+        if archive.enabled():
+            candidates.extend(
+                ms for ms in (archive.oldest(s["table"]) for s in enabled_sources())
+                if ms is not None
+            )
+        if not candidates:
+            return None
+        start = min(candidates)
+    else:
+        start = iso_to_ms(since)
+    end = iso_to_ms(until) if until else int(
+        datetime.datetime.now(datetime.timezone.utc).timestamp() * 1000
+    )
+    return max(end - start, 0) // max(points, 1)
+
+
+def fetch_series(conn, since, until, wanted, bucket_ms=None, raw=False, memory=True):
+    """Rows for the requested fields only, grouped by room|source key.
+
+    With bucket_ms, rows are averaged into fixed-width time buckets, each
+    stamped with its earliest reading. raw skips the display conversions.
+    Ranges inside the in-memory window never reach SQLite unless memory is
+    false.
+    """
+    if memory and hot_tier.covers(since):
+        return hot_tier.fetch_series(since, until, wanted, bucket_ms, raw)
+    if storage.narrow():
+        return storage.fetch_series(conn, since, until, wanted, bucket_ms, raw)
+    jobs = [(s, wanted[s["name"]]) for s in enabled_sources() if wanted.get(s["name"])]
+    result = {}
+    for part in for_each_source(
+        lambda c, job: _fetch_source(c, job[0], job[1], since, until, bucket_ms, raw), jobs
+    ):
+        result.update(part)
+    return result
+
+
+def _fetch_source(conn, source, fields, since, until, bucket_ms, raw):
+    where, params = range_where(since, until)
+    columns = [source["fields"][f] for f in fields]
+    select = ", ".join(col for col, _ in columns)
+    if bucket_ms:
+        aggs = ", ".join(f"AVG({col})" for col, _ in columns)
+        sql = f"""SELECT room, MIN(ts), {aggs} FROM (
+                      SELECT {room_sql(source)} AS room, {epoch_ms_sql()} AS ts, {select}
+                      FROM {source['table']} {where}
+                  ) GROUP BY room, ts / {int(bucket_ms)} ORDER BY 2"""
+    else:
+        sql = f"""SELECT {room_sql(source)}, {epoch_ms_sql()}, {select}
+                  FROM {source['table']} {where} ORDER BY timestamp"""
+    rows = conn.execute(sql, params).fetchall()
+    if archive.enabled():
+        cols = [col for col, _ in columns]
+        rows = archive.read_rows(source, cols, since, until, bucket_ms) + rows
+    suffix = "|" + source["name"]
+    result = {}
+    for row in rows:
+        point = {"timestamp": row[1]}
+        for i, (field, (_, convert)) in enumerate(zip(fields, columns), 2):
+            value = row[i]
+            point[field] = convert(value) if convert and not raw else value
+        key = row[0] + suffix
+        if key not in result:
+            result[key] = []
+        result[key].append(point)
+    return result
+
+
+def data_version(conn):
+    """Latest row id of every enabled source table; changes on each ingest."""
+    if storage.narrow():
+        return storage.data_version(conn)
+    subqueries = ", ".join(
+        f"(SELECT MAX(id) FROM {source['table']})" for source in enabled_sources()
+    )
+    return tuple(conn.execute(f"SELECT {subqueries}").fetchone())
+
+
+def summarize(conn, since=None, until=None):
+    """Latest value plus avg/min/max for every room/source/field in a range.
+
+    One grouped aggregate pass per table over the timestamp index, then an
+    index lookup for each group's newest row. Archived months contribute
+    partial aggregates that are merged in.
+    """
+    if storage.narrow():
+        return storage.summarize(conn, since, until)
+    result = {}
+    for part in for_each_source(
+        lambda c, source: _summarize_source(c, source, since, until), enabled_sources()
+    ):
+        result.update(part)
+    return result
+
+
+def _summarize_source(conn, source, since, until):
+    where, params = range_where(since, until)
+    table = source["table"]
+    room = room_sql(source)
+    fields = source["fields"]
+    columns = [col for col, _ in fields.values()]
+    aggs = ", ".join(
+        f"SUM({col}) AS sum_{f}, COUNT({col}) AS cnt_{f}, "
+        f"MIN({col}) AS min_{f}, MAX({col}) AS max_{f}"
+        for f, (col, _) in fields.items()
+    )
+    latest = ", ".join(f"t.{col} AS latest_{f}" for f, (col, _) in fields.items())
+    rows = conn.execute(
+        f"""WITH agg AS (
+                SELECT {room} AS room, COUNT(*) AS n, MAX(timestamp) AS last_ts, {aggs}
+                FROM {table} {where} GROUP BY 1
+            )
+            SELECT agg.*, {epoch_ms_sql('agg.last_ts')} AS ts, {latest}
+            FROM agg JOIN {table} t
+              ON t.timestamp = agg.last_ts AND {room} = agg.room""",
+        params,
+    ).fetchall()
+    partials = {}
+    for row in rows:
+        partials[row["room"]] = {
+            "n": row["n"],
+            "last_ts": row["ts"],
+            "latest": [row[f"latest_{f}"] for f in fields],
+            "sum": [row[f"sum_{f}"] or 0 for f in fields],
+            "cnt": [row[f"cnt_{f}"] for f in fields],
+            "min": [row[f"min_{f}"] for f in fields],
+            "max": [row[f"max_{f}"] for f in fields],
+        }
+    if archive.enabled():
+        for room_name, old in archive.summarize(source, columns, since, until).items():
+            partials[room_name] = _merge_partials(old, partials.get(room_name))
+    result = {}
+    for room_name, stats in partials.items():
+        entry = {"timestamp": stats["last_ts"], "count": stats["n"]}
+        avgs = [
+            total / count if count else None
+            for total, count in zip(stats["sum"], stats["cnt"])
+        ]
+        for stat, values in (
+            ("latest", stats["latest"]), ("avg", avgs),
+            ("min", stats["min"]), ("max", stats["max"]),
+        ):
+            entry[stat] = {
+                f: convert(v) if convert else v
+                for (f, (_, convert)), v in zip(fields.items(), values)
+            }
+        result[room_name + "|" + source["name"]] = entry
+    return result
+
+
+def _merge_partials(older, newer):
+    if newer is None:
+        return older
+    return {
+        "n": older["n"] + newer["n"],
+        "last_ts": newer["last_ts"],
+        "latest": newer["latest"],
+        "sum": [a + b for a, b in zip(older["sum"], newer["sum"])],
+        "cnt": [a + b for a, b in zip(older["cnt"], newer["cnt"])],
+        "min": [_pick(min, a, b) for a, b in zip(older["min"], newer["min"])],
+        "max": [_pick(max, a, b) for a, b in zip(older["max"], newer["max"])],
+    }
+
+
+def _pick(fn, a, b):
+    if a is None or b is None:
+        return b if a is None else a
+    return fn(a, b)
+
+
+def known_keys(conn):
+    """Every room|source key that has ever reported, so cards always show."""
+    if storage.narrow():
+        return storage.known_keys(conn)
+    keys = []
+    for part in for_each_source(_source_keys, enabled_sources()):
+        keys.extend(part)
+    return keys
+
+
+def _source_keys(conn, source):
+    table = source["table"]
+    if "room_col" in source:
+        rooms = conn.execute(f"SELECT DISTINCT {source['room_col']} FROM {table}").fetchall()
+        names = {row[0] for row in rooms}
+        if archive.enabled():
+            names |= archive.rooms(source)
+        return [name + "|" + source["name"] for name in sorted(names)]
+    if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() or (
+        archive.enabled() and archive.rooms(source)
+    ):
+        return [source["room"] + "|" + source["name"]]
+    return []
+
+
+def db_path():
+    """Database of the site this thread is reading (see sites.py)."""
+    return sites.setting("DB_PATH")
+
+
+def connect():
+    conn = sqlite3.connect(db_path())
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def read_only_connection():
+    """This thread's read-only connection to the active site, opened on first use."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    path = db_path()
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        conns[path] = conn
+    return conn
+
+
+def _site_pool(site):
+    with _pools_lock:
+        pool = _pools.get(site)
+        if pool is None:
+            prefix = "query" if site is None else f"query-{site}"
+            pool = _pools[site] = ThreadPoolExecutor(
+                max_workers=len(SOURCES), thread_name_prefix=prefix
+            )
+    return pool
+
+
+def for_each_source(fn, jobs):
+    """[fn(conn, job) for job in jobs], run concurrently.
+
+    Each worker queries through its own read-only connection; sqlite3 drops
+    the GIL while stepping, so the scans of different tables overlap and a
+    request costs about as much as its slowest source. Every site has its own
+    pool, so one shard's long scans never queue another's. Results keep job
+    order.
+    """
+    jobs = list(jobs)
+    if len(jobs) <= 1:
+        return [fn(read_only_connection(), job) for job in jobs]
+    site = sites.active()
+
+    def run(job):
+        with sites.use(site):
+            return fn(read_only_connection(), job)
+    return list(_site_pool(site).map(run, jobs))
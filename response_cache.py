@@ -0,0 +1,42 @@
+import hashlib
+import os
+import threading
+
+import config
+
+
+def _cache_dir():
+    return getattr(config, "RESPONSE_CACHE_DIR", "response_cache")
+
+
+def _path(key):
+    return os.path.join(_cache_dir(), hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+def get(key):
+    """Cached response body for a closed range, or None."""
+    try:
+        with open(_path(key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def put(key, body):
+    os.makedirs(_cache_dir(), exist_ok=True)
+    path = _path(key)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+def clear():
+    """Drop every cached response, e.g. after history is rewritten."""
+    try:
+        names = os.listdir(_cache_dir())
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith(".json"):
+            os.remove(os.path.join(_cache_dir(), name))
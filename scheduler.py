@@ -0,0 +1,139 @@
+"""Adaptive poll intervals driven by how fast readings are changing.
+
+With ADAPTIVE_POLLING on, every stored reading is compared with the previous
+one of its series. After each cycle a collector asks next_interval() how long
+to sleep: the interval halves while some series is moving faster than its
+SIGNIFICANT_CHANGE per five minutes and grows by half while everything is
+flat, always within the source's POLL_BOUNDS and never faster than its
+API_HOURLY_LIMITS allows. With it off, the fixed interval is returned.
+"""
+import threading
+
+import config
+import queries
+import storage
+
+# (min, max) seconds; POLL_BOUNDS in config.py overrides per source
+DEFAULT_BOUNDS = {
+    "Sensibo": (60, 900),
+    "Weather": (60, 900),
+    "Enphase": (60, 900),
+    "Govee": (300, 3600),
+}
+# Requests per hour; the Weather.com PWS key allows 1500 a day
+DEFAULT_HOURLY_LIMITS = {"Weather": 60}
+# Change over five minutes that counts as "moving", per column
+SIGNIFICANT_CHANGE = {
+    "temperature": 0.3,
+    "humidity": 2.0,
+    "co2": 50,
+    "tvoc": 50,
+    "iaq": 20,
+    "solar_radiation": 75,
+    "production_w": 250,
+    "consumption_w": 250,
+}
+REFERENCE_MS = 5 * 60 * 1000
+TIGHTEN_ABOVE = 1.0  # activity at which the interval halves
+RELAX_BELOW = 0.25  # activity under which it grows
+RELAX_FACTOR = 1.5
+
+_lock = threading.Lock()
+_state = {}  # source name -> {"interval", "activity", "rooms", "room_count", "last"}
+_following = False
+
+
+def enabled():
+    return getattr(config, "ADAPTIVE_POLLING", False)
+
+
+def bounds(name, fixed):
+    lo, hi = {**DEFAULT_BOUNDS, **getattr(config, "POLL_BOUNDS", {})}.get(name, (fixed, fixed))
+    return min(lo, hi), max(lo, hi)
+
+
+def min_interval_for_limit(name, rooms):
+    """Shortest interval the source's hourly request limit allows."""
+    limit = {**DEFAULT_HOURLY_LIMITS, **getattr(config, "API_HOURLY_LIMITS", {})}.get(name)
+    if not limit:
+        return 0
+    # Sensibo lists the pods and then asks for each one
+    requests = 1 + rooms if name == "Sensibo" else 1
+    return requests * 3600 / limit
+
+
+def _source_state(name):
+    state = _state.get(name)
+    if state is None:
+        state = _state[name] = {
+            "interval": None, "activity": None, "rooms": set(), "room_count": 0, "last": {},
+        }
+    return state
+
+
+def start():
+    """Follow stored readings to adapt poll intervals; a no-op unless enabled."""
+    global _following
+    if not enabled():
+        return
+    with _lock:
+        if _following:
+            return
+        storage.add_listener(on_store)
+        _following = True
+
+
+def on_store(table, columns, rows):
+    if not enabled():
+        return
+    source = storage.source_for(table)
+    watched = [(i, col) for i, col in enumerate(columns) if col in SIGNIFICANT_CHANGE]
+    ts_index = columns.index("timestamp")
+    room_index = columns.index(source["room_col"]) if "room_col" in source else None
+    with _lock:
+        state = _source_state(source["name"])
+        last = state["last"]
+        for row in rows:
+            ts = queries.iso_to_ms(row[ts_index])
+            room = row[room_index] if room_index is not None else source["room"]
+            state["rooms"].add(room)
+            for i, col in watched:
+                value = row[i]
+                if value is None:
+                    continue
+                prev = last.get((room, col))
+                if prev is not None and ts <= prev[0]:
+                    continue  # late or repeated reading
+                last[(room, col)] = (ts, value)
+                if prev is None:
+                    continue
+                change = abs(value - prev[1]) / SIGNIFICANT_CHANGE[col]
+                activity = change * REFERENCE_MS / (ts - prev[0])
+                state["activity"] = max(state["activity"] or 0.0, activity)
+
+
+def next_interval(name, fixed):
+    """Seconds until `name` should poll again; call once after each cycle."""
+    if not enabled():
+        return fixed
+    lo, hi = bounds(name, fixed)
+    with _lock:
+        state = _source_state(name)
+        interval = state["interval"] or min(max(fixed, lo), hi)
+        activity = state["activity"]
+        if activity is not None and activity >= TIGHTEN_ABOVE:
+            interval /= 2
+        elif activity is not None and activity < RELAX_BELOW:
+            interval *= RELAX_FACTOR
+        interval = min(max(interval, lo), hi)
+        if state["rooms"]:  # a failed cycle keeps the previous count
+            state["room_count"] = len(state["rooms"])
+        interval = max(interval, min_interval_for_limit(name, state["room_count"]))
+        changed = interval != state["interval"]
+        state["interval"] = interval
+        state["activity"] = None
+        state["rooms"] = set()
+    if changed:
+        print(f"{name}: next poll in {interval:.0f}s")
+    return interval
+
@@ -1,910 +1,538 @@
-import sqlite3
+import gzip
+import hashlib
+import hmac
+import os
 import threading
-from flask import Flask, render_template_string
+import time
+from urllib.parse import urlencode
+from flask import Flask, Response, abort, render_template, request, send_from_directory
+from werkzeug.security import safe_join
 import config
-from collector import init_db, run_collector
+import export
+import hot_tier
+import join
+import profiler
+import queries
+import response_cache
+import scheduler
+import sites
+import warmer
+from collector import run_collector
 if getattr(config, "GOVEE_ENABLED", False):
-    from govee_collector import init_govee_db, run_govee_collector
-from weather_collector import init_weather_db, run_weather_collector
-from solar_collector import init_solar_db, run_solar_collector
+    from govee_collector import run_govee_collector
+from weather_collector import run_weather_collector
+from solar_collector import run_solar_collector
+from alerts import run_alerts
+from archive import run_archiver
+from migrations import migrate, run_online_migrations
+from mqtt_bridge import run_mqtt_bridge
+from warmer import run_warmer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Sensibo Dashboard</title>
-    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
-    <style>
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
-            margin: 0;
-            padding: 20px;
-            background: #1a1a2e;
-            color: #e0e0e0;
-        }
-        h1 {
-            text-align: center;
-            color: #e0e0e0;
-            margin-bottom: 5px;
-        }
-        .subtitle {
-            text-align: center;
-            color: #888;
-            margin-bottom: 20px;
-            font-size: 14px;
-        }
-        .chart {
-            background: #16213e;
-            border-radius: 12px;
-            padding: 10px;
-            margin-bottom: 20px;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.3);
-        }
-        .current-values {
-            display: flex;
-            justify-content: center;
-            gap: 30px;
-            margin-bottom: 25px;
-            flex-wrap: wrap;
-        }
-        .device-card {
-            background: #16213e;
-            border-radius: 12px;
-            padding: 15px 25px;
-            min-width: 200px;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.3);
-        }
-        .device-card h3 {
-            margin: 0 0 10px 0;
-            font-size: 16px;
-        }
-        .device-card .metric {
-            display: flex;
-            justify-content: space-between;
-            padding: 3px 0;
-            font-size: 14px;
-        }
-        .device-card .value {
-            font-weight: bold;
-        }
-        .controls {
-            text-align: center;
-            margin-bottom: 20px;
-        }
-        .controls button {
-            background: #0f3460;
-            color: #e0e0e0;
-            border: 1px solid #1a5276;
-            padding: 8px 16px;
-            border-radius: 6px;
-            cursor: pointer;
-            margin: 0 5px;
-            font-size: 14px;
-        }
-        .controls button:hover {
-            background: #1a5276;
-        }
-        .controls button.active {
-            background: #e94560;
-            border-color: #e94560;
-        }
-        .controls input[type="date"],
-        .controls select {
-            background: #0f3460;
-            color: #e0e0e0;
-            border: 1px solid #1a5276;
-            padding: 8px 12px;
-            border-radius: 6px;
-            font-size: 14px;
-        }
-        .source-label {
-            font-size: 11px;
-            color: #888;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-            margin-top: 8px;
-            padding-bottom: 2px;
-            border-bottom: 1px solid #2a2a4a;
-        }
-        .source-label:first-child {
-            margin-top: 0;
-        }
-        .cb-group {
-            margin: 0 10px;
-            color: #888;
-            font-size: 13px;
-        }
-        .cb-group label {
-            color: #e0e0e0;
-        }
-        .chart-section {
-            margin-bottom: 25px;
-        }
-        .checkboxes {
-            text-align: center;
-            margin-bottom: 8px;
-        }
-        .checkboxes label {
-            margin: 0 12px;
-            cursor: pointer;
-            font-size: 14px;
-        }
-        .checkboxes input[type="checkbox"] {
-            accent-color: #e94560;
-            margin-right: 4px;
-            cursor: pointer;
-        }
-    </style>
-</head>
-<body>
-    <h1>Sensor Dashboard</h1>
-    <div class="subtitle" id="lastUpdate"></div>
-
-    <div class="current-values" id="currentValues"></div>
-
-    <div class="controls">
-        <button onclick="goToToday()">Today</button>
-        <button onclick="setRange('1h')">1 Hour</button>
-        <button onclick="setRange('6h')">6 Hours</button>
-        <button onclick="setRange('24h')" class="active">24 Hours</button>
-        <button onclick="setRange('7d')">7 Days</button>
-        <button onclick="setRange('30d')">30 Days</button>
-        <button onclick="setRange('1y')">1 Year</button>
-        <button onclick="setRange('all')">All</button>
-    </div>
-    <div class="controls">
-        <button onclick="navDate(-1)">&larr;</button>
-        <input type="date" id="datePicker" onchange="goToDate()" />
-        <button onclick="navDate(1)">&rarr;</button>
-        <select id="dateSpan" onchange="goToDate()">
-            <option value="1">1 Day</option>
-            <option value="7">1 Week</option>
-            <option value="30">1 Month</option>
-            <option value="365">1 Year</option>
-        </select>
-        <button onclick="clearDatePicker()">Clear</button>
-    </div>
-
-    <div class="chart-section">
-        <div class="checkboxes" id="chart1Checks">
-            <span class="cb-group">Sensibo: <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="temperature" data-source="Sensibo"> Temp</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="humidity" data-source="Sensibo"> Humidity</label></span>
-            <span class="cb-group">Govee: <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="temperature" data-source="Govee"> Temp</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="humidity" data-source="Govee"> Humidity</label></span>
-            <span class="cb-group">Outside: <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="temperature" data-source="Weather"> Temp</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="humidity" data-source="Weather"> Humidity</label></span>
-        </div>
-        <div class="chart" id="chart1" style="height:450px"></div>
-    </div>
-
-    <div class="chart-section">
-        <div class="checkboxes" id="chart2Checks">
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="co2"> CO₂</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="tvoc"> TVOC</label>
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="iaq"> AQI/IAQ</label>
-        </div>
-        <div class="chart" id="chart2" style="height:450px"></div>
-    </div>
-
-    <div class="chart-section">
-        <div class="checkboxes" id="chart3Checks">
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="wind_speed"> Wind Speed</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="wind_gust"> Wind Gust</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="precip_rate"> Rain Rate</label>
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="precip_total"> Rain Total</label>
-        </div>
-        <div class="chart" id="chart3" style="height:450px"></div>
-    </div>
-
-    <div class="chart-section">
-        <div class="checkboxes" id="chart4Checks">
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="pressure"> Pressure</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="uv"> UV Index</label>
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="solar_radiation"> Solar Radiation</label>
-        </div>
-        <div class="chart" id="chart4" style="height:450px"></div>
-    </div>
-
-    <div class="chart-section">
-        <div class="checkboxes" id="chart5Checks">
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="production_w"> Production (kW)</label>
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="consumption_w"> Consumption (kW)</label>
-            <label><input type="checkbox" onchange="fetchAndPlot()" data-field="net_consumption_w"> Net (kW)</label>
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="production_wh_today"> Produced (kWh)</label>
-            <label><input type="checkbox" checked onchange="fetchAndPlot()" data-field="consumption_wh_today"> Consumed (kWh)</label>
-        </div>
-        <div class="chart" id="chart5" style="height:450px"></div>
-    </div>
-
-    <script>
-        const ROOM_COLORS = {
-            'Outside': '#ffd93d',
-            'Living Room': '#e94560',
-            'Den': '#0f9b58',
-            'Bedroom': '#4285f4',
-            'Solar': '#fdcb6e'
-        };
-
-        const SOURCE_STYLES = {
-            'Sensibo': 'solid',
-            'Govee': 'dash',
-            'Weather': 'solid',
-            'Enphase': 'solid'
-        };
-
-        let currentRange = '24h';
-        let customStart = null;
-        let customEnd = null;
-
-        function goToToday() {
-            let today = new Date();
-            let dateStr = today.getFullYear() + '-' +
-                String(today.getMonth() + 1).padStart(2, '0') + '-' +
-                String(today.getDate()).padStart(2, '0');
-            document.getElementById('datePicker').value = dateStr;
-            document.getElementById('dateSpan').value = '1';
-            goToDate();
-        }
-
-        function setRange(range) {
-            currentRange = range;
-            customStart = null;
-            customEnd = null;
-            document.getElementById('datePicker').value = '';
-            document.querySelectorAll('.controls button').forEach(b => b.classList.remove('active'));
-            event.target.classList.add('active');
-            fetchAndPlot();
-        }
-
-        function goToDate() {
-            let dateVal = document.getElementById('datePicker').value;
-            if (!dateVal) return;
-            let spanDays = parseInt(document.getElementById('dateSpan').value);
-            let start = new Date(dateVal + 'T00:00:00');
-            let end = new Date(start);
-            end.setDate(end.getDate() + spanDays);
-            customStart = start.toISOString();
-            customEnd = end.toISOString();
-            currentRange = 'custom';
-            document.querySelectorAll('.controls button').forEach(b => b.classList.remove('active'));
-            fetchAndPlot();
-        }
-
-        function navDate(direction) {
-            let picker = document.getElementById('datePicker');
-            let spanDays = parseInt(document.getElementById('dateSpan').value);
-            let current = picker.value ? new Date(picker.value) : new Date();
-            current.setDate(current.getDate() + (direction * spanDays));
-            picker.value = current.toISOString().split('T')[0];
-            goToDate();
-        }
-
-        function clearDatePicker() {
-            document.getElementById('datePicker').value = '';
-            customStart = null;
-            customEnd = null;
-            currentRange = '24h';
-            document.querySelectorAll('.controls button').forEach(b => b.classList.remove('active'));
-            document.querySelector('.controls button:nth-child(3)').classList.add('active');
-            fetchAndPlot();
-        }
-
-        function parseKey(key) {
-            let parts = key.split('|');
-            return { room: parts[0], source: parts[1] };
-        }
-
-        const FIELD_CONFIG = {
-            temperature: { label: 'Temp', unit: '°F', color: '#e94560' },
-            humidity:    { label: 'Humidity', unit: '%', color: '#f5a623' },
-            co2:         { label: 'CO₂', unit: 'ppm', color: '#e94560' },
-            tvoc:        { label: 'TVOC', unit: 'ppb', color: '#0f9b58' },
-            iaq:         { label: 'AQI/IAQ', unit: '', color: '#4285f4' },
-            wind_speed:  { label: 'Wind', unit: 'mph', color: '#00cec9' },
-            wind_gust:   { label: 'Gust', unit: 'mph', color: '#d63031' },
-            precip_rate: { label: 'Rain Rate', unit: 'in/hr', color: '#74b9ff' },
-            precip_total:{ label: 'Rain Total', unit: 'in', color: '#0984e3' },
-            pressure:    { label: 'Pressure', unit: 'inHg', color: '#a29bfe' },
-            uv:          { label: 'UV Index', unit: '', color: '#fdcb6e' },
-            solar_radiation: { label: 'Solar', unit: 'W/m²', color: '#e17055' },
-            production_w:    { label: 'Production', unit: 'kW', color: '#f9ca24' },
-            consumption_w:   { label: 'Consumption', unit: 'kW', color: '#eb4d4b' },
-            net_consumption_w: { label: 'Net', unit: 'kW', color: '#888888' },
-            production_wh_today: { label: 'Produced', unit: 'kWh', color: '#f9ca24' },
-            consumption_wh_today: { label: 'Consumed', unit: 'kWh', color: '#eb4d4b' }
-        };
-
-        function getCheckedFields(containerId) {
-            let checks = document.querySelectorAll('#' + containerId + ' input[type=checkbox]');
-            let fields = [];
-            checks.forEach(cb => {
-                if (cb.checked) {
-                    fields.push({ field: cb.dataset.field, source: cb.dataset.source || null });
-                }
-            });
-            return fields;
-        }
-
-        function fetchAndPlot() {
-            let url = '/api/data?range=' + currentRange;
-            if (customStart && customEnd) {
-                url += '&start=' + encodeURIComponent(customStart) + '&end=' + encodeURIComponent(customEnd);
-            }
-            fetch(url)
-                .then(r => r.json())
-                .then(data => {
-                    plotFiltered('chart1', data, getCheckedFields('chart1Checks'));
-                    plotGeneric('chart2', data, getCheckedFields('chart2Checks'));
-                    plotGeneric('chart3', data, getCheckedFields('chart3Checks'));
-                    plotGeneric('chart4', data, getCheckedFields('chart4Checks'));
-                    plotSolar('chart5', data, getCheckedFields('chart5Checks'));
-                    updateCurrentValues(data);
-                });
-        }
-
-        const BASE_LAYOUT = {
-            paper_bgcolor: '#16213e',
-            plot_bgcolor: '#16213e',
-            font: { color: '#e0e0e0' },
-            margin: { t: 40, r: 80, b: 40, l: 80 },
-            xaxis: { gridcolor: '#2a2a4a', type: 'date' },
-            legend: {
-                orientation: 'h',
-                y: 1.15,
-                x: 0.5,
-                xanchor: 'center',
-                bgcolor: 'rgba(0,0,0,0)',
-                font: { color: '#e0e0e0' }
-            },
-            hovermode: 'x unified'
-        };
-
-        // Source-aware chart: each checkbox specifies field + source
-        function plotFiltered(divId, data, checks) {
-            if (checks.length === 0) {
-                Plotly.newPlot(divId, [], BASE_LAYOUT, { responsive: true });
-                return;
-            }
-            let traces = [];
-            let keys = Object.keys(data);
-            let uniqueFields = [...new Set(checks.map(c => c.field))];
-            let useSecondAxis = uniqueFields.length > 1;
-
-            for (let key of keys) {
-                let { room, source } = parseKey(key);
-                let readings = data[key];
-                let roomDash = SOURCE_STYLES[source] || 'solid';
-                checks.forEach((check, i) => {
-                    if (check.source && check.source !== source) return;
-                    let field = check.field;
-                    let hasData = readings.some(r => r[field] != null);
-                    if (!hasData) return;
-                    let cfg = FIELD_CONFIG[field];
-                    let fieldIdx = uniqueFields.indexOf(field);
-                    traces.push({
-                        x: readings.map(r => r.timestamp),
-                        y: readings.map(r => r[field]),
-                        name: room + ' ' + source + ' ' + cfg.label,
-                        type: 'scatter',
-                        mode: 'lines',
-                        line: { color: ROOM_COLORS[room] || '#fff', width: 2, dash: roomDash },
-                        yaxis: (useSecondAxis && fieldIdx > 0) ? 'y2' : 'y'
-                    });
-                });
-            }
-
-            let firstCfg = FIELD_CONFIG[uniqueFields[0]];
-            let yTitle = firstCfg.label + (firstCfg.unit ? ' (' + firstCfg.unit + ')' : '');
-            let layout = Object.assign({}, BASE_LAYOUT, {
-                yaxis: { title: yTitle, gridcolor: '#2a2a4a', side: 'left' }
-            });
-
-            if (useSecondAxis) {
-                let otherLabels = uniqueFields.slice(1).map(f => {
-                    let c = FIELD_CONFIG[f];
-                    return c.label + (c.unit ? ' (' + c.unit + ')' : '');
-                });
-                layout.yaxis2 = {
-                    title: otherLabels.join(' / '),
-                    gridcolor: '#2a2a4a',
-                    side: 'right',
-                    overlaying: 'y'
-                };
-            }
-
-            Plotly.newPlot(divId, traces, layout, { responsive: true });
-        }
-
-        // Simple chart: checkboxes only specify field, all sources included
-        function plotBar(divId, data, checks) {
-            let fields = checks.map(c => c.field);
-            if (fields.length === 0) {
-                Plotly.newPlot(divId, [], BASE_LAYOUT, { responsive: true });
-                return;
-            }
-            let traces = [];
-            let keys = Object.keys(data);
-
-            // Group fields by unit for axis assignment
-            let units = [...new Set(fields.map(f => FIELD_CONFIG[f].unit))];
-            let useSecondAxis = units.length > 1;
-
-            for (let key of keys) {
-                let { room, source } = parseKey(key);
-                let readings = data[key];
-                fields.forEach((field, i) => {
-                    let hasData = readings.some(r => r[field] != null);
-                    if (!hasData) return;
-                    let cfg = FIELD_CONFIG[field];
-                    let negFields = ['consumption_w', 'net_consumption_w'];
-                    let negate = negFields.includes(field);
-                    let fieldUnit = cfg.unit;
-                    let axisIdx = units.indexOf(fieldUnit);
-                    // Calculate per-bar widths from consecutive timestamps (ms)
-                    let times = readings.map(r => new Date(r.timestamp).getTime());
-                    let widths = times.map((t, idx) => {
-                        if (idx < times.length - 1) return times[idx + 1] - t;
-                        if (idx > 0) return t - times[idx - 1];
-                        return 300 * 1000;  // default 5 min
-                    });
-                    traces.push({
-                        x: readings.map(r => r.timestamp),
-                        y: readings.map(r => r[field] != null ? (negate ? -r[field] : r[field]) : null),
-                        name: cfg.label,
-                        type: 'bar',
-                        width: widths,
-                        offset: 0,
-                        marker: { color: cfg.color, opacity: 0.7 },
-                        yaxis: (useSecondAxis && axisIdx > 0) ? 'y2' : 'y'
-                    });
-                });
-            }
-
-            let firstUnit = units[0];
-            let layout = Object.assign({}, BASE_LAYOUT, {
-                barmode: 'overlay',
-                yaxis: { title: firstUnit, gridcolor: '#2a2a4a', side: 'left' }
-            });
-
-            if (useSecondAxis) {
-                layout.yaxis2 = {
-                    title: units[1],
-                    gridcolor: '#2a2a4a',
-                    side: 'right',
-                    overlaying: 'y'
-                };
-            }
-
-            Plotly.newPlot(divId, traces, layout, { responsive: true });
-        }
-
-        function plotSolar(divId, data, checks) {
-            let fields = checks.map(c => c.field);
-            if (fields.length === 0) {
-                Plotly.newPlot(divId, [], BASE_LAYOUT, { responsive: true });
-                return;
-            }
-            let traces = [];
-            let keys = Object.keys(data);
-            let negFields = ['consumption_w', 'net_consumption_w', 'consumption_wh_today'];
-            let lineFields = ['production_w', 'consumption_w', 'net_consumption_w'];
-            let hasW = fields.some(f => FIELD_CONFIG[f].unit === 'kW');
-            let hasKwh = fields.some(f => FIELD_CONFIG[f].unit === 'kWh');
-
-            for (let key of keys) {
-                let { room, source } = parseKey(key);
-                let readings = data[key];
-
-                // Calculate bar widths from timestamps
-                let times = readings.map(r => new Date(r.timestamp).getTime());
-                let widths = times.map((t, idx) => {
-                    if (idx < times.length - 1) return times[idx + 1] - t;
-                    if (idx > 0) return t - times[idx - 1];
-                    return 300 * 1000;
-                });
-
-                fields.forEach((field) => {
-                    let hasData = readings.some(r => r[field] != null);
-                    if (!hasData) return;
-                    let cfg = FIELD_CONFIG[field];
-                    let negate = negFields.includes(field);
-                    let isLine = lineFields.includes(field);
-                    let isW = cfg.unit === 'W';
-
-                    if (isLine) {
-                        traces.push({
-                            x: readings.map(r => r.timestamp),
-                            y: readings.map(r => r[field] != null ? (negate ? -r[field] : r[field]) : null),
-                            name: cfg.label,
-                            type: 'scatter',
-                            mode: 'lines',
-                            line: { color: cfg.color, width: 2 },
-                            yaxis: 'y'
-                        });
-                    } else {
-                        traces.push({
-                            x: readings.map(r => r.timestamp),
-                            y: readings.map(r => r[field] != null ? (negate ? -r[field] : r[field]) : null),
-                            name: cfg.label,
-                            type: 'bar',
-                            width: widths,
-                            offset: 0,
-                            marker: { color: cfg.color, opacity: 0.7 },
-                            yaxis: hasW ? 'y2' : 'y'
-                        });
-                    }
-                });
-            }
-
-            let layout = Object.assign({}, BASE_LAYOUT, {
-                barmode: 'overlay',
-            });
-
-            if (hasW && hasKwh) {
-                layout.yaxis = { title: 'kW', gridcolor: '#2a2a4a', side: 'left' };
-                layout.yaxis2 = { title: 'kWh', gridcolor: '#2a2a4a', side: 'right', overlaying: 'y' };
-            } else if (hasW) {
-                layout.yaxis = { title: 'kW', gridcolor: '#2a2a4a' };
-            } else {
-                layout.yaxis = { title: 'kWh', gridcolor: '#2a2a4a' };
-            }
-
-            Plotly.newPlot(divId, traces, layout, { responsive: true });
-        }
-
-        function plotGeneric(divId, data, checks) {
-            let fields = checks.map(c => c.field);
-            if (fields.length === 0) {
-                Plotly.newPlot(divId, [], BASE_LAYOUT, { responsive: true });
-                return;
-            }
-            let traces = [];
-            let keys = Object.keys(data);
-            let useSecondAxis = fields.length > 1;
-
-            // Check how many distinct rooms have data for these fields
-            let roomsWithData = new Set();
-            for (let key of keys) {
-                let { room } = parseKey(key);
-                let readings = data[key];
-                if (fields.some(f => readings.some(r => r[f] != null))) {
-                    roomsWithData.add(room);
-                }
-            }
-            let singleRoom = roomsWithData.size === 1;
-
-            for (let key of keys) {
-                let { room, source } = parseKey(key);
-                let readings = data[key];
-                let roomDash = SOURCE_STYLES[source] || 'solid';
-                fields.forEach((field, i) => {
-                    let hasData = readings.some(r => r[field] != null);
-                    if (!hasData) return;
-                    let cfg = FIELD_CONFIG[field];
-                    let color = singleRoom ? cfg.color : (ROOM_COLORS[room] || '#fff');
-                    let name = singleRoom ? cfg.label : (room + ' ' + source + ' ' + cfg.label);
-                    traces.push({
-                        x: readings.map(r => r.timestamp),
-                        y: readings.map(r => r[field]),
-                        name: name,
-                        type: 'scatter',
-                        mode: 'lines',
-                        line: { color: color, width: 2, dash: roomDash },
-                        yaxis: (useSecondAxis && i > 0) ? 'y2' : 'y'
-                    });
-                });
-            }
-
-            let firstCfg = FIELD_CONFIG[fields[0]];
-            let yTitle = firstCfg.label + (firstCfg.unit ? ' (' + firstCfg.unit + ')' : '');
-            let layout = Object.assign({}, BASE_LAYOUT, {
-                yaxis: { title: yTitle, gridcolor: '#2a2a4a', side: 'left' }
-            });
-
-            if (useSecondAxis) {
-                let otherLabels = fields.slice(1).map(f => {
-                    let c = FIELD_CONFIG[f];
-                    return c.label + (c.unit ? ' (' + c.unit + ')' : '');
-                });
-                layout.yaxis2 = {
-                    title: otherLabels.join(' / '),
-                    gridcolor: '#2a2a4a',
-                    side: 'right',
-                    overlaying: 'y'
-                };
-            }
-
-            Plotly.newPlot(divId, traces, layout, { responsive: true });
-        }
-
-        function avg(arr, field) {
-            let vals = arr.map(r => r[field]).filter(v => v != null);
-            if (vals.length === 0) return null;
-            return vals.reduce((a, b) => a + b, 0) / vals.length;
-        }
-
-        function fmtVal(v, decimals) {
-            if (v == null) return '—';
-            return v.toFixed(decimals);
-        }
-
-        function updateCurrentValues(data) {
-            let isLatest = !customStart;
-            let label = isLatest ? 'Latest' : 'Average';
-
-            // Group by room, merge sources
-            let rooms = {};
-            let allFields = ['temperature','humidity','co2','tvoc','iaq',
-                'wind_speed','wind_gust','precip_rate','precip_total','pressure','uv','solar_radiation'];
-            let emptyVals = { timestamp: null };
-            allFields.forEach(f => emptyVals[f] = null);
-
-            for (let key of Object.keys(data)) {
-                let { room, source } = parseKey(key);
-                if (!rooms[room]) rooms[room] = {};
-                let readings = data[key];
-                if (readings.length === 0) {
-                    rooms[room][source] = Object.assign({}, emptyVals);
-                } else if (isLatest) {
-                    rooms[room][source] = readings[readings.length - 1];
-                } else {
-                    let avgVals = { timestamp: readings[readings.length - 1].timestamp };
-                    allFields.forEach(f => avgVals[f] = avg(readings, f));
-                    rooms[room][source] = avgVals;
-                }
-            }
-
-            // Sort: Outside first, then alphabetical
-            let roomOrder = Object.keys(rooms).sort((a, b) => {
-                let order = ['Outside', 'Solar'];
-                let ai = order.indexOf(a), bi = order.indexOf(b);
-                if (ai !== -1 && bi !== -1) return ai - bi;
-                if (ai !== -1) return -1;
-                if (bi !== -1) return -1;
-                return a.localeCompare(b);
-            });
-
-            let html = '';
-            let latestTime = '';
-            for (let room of roomOrder) {
-                let sources = rooms[room];
-                let color = ROOM_COLORS[room] || '#fff';
-                let metrics = '';
-                for (let [source, vals] of Object.entries(sources)) {
-                    if (vals.timestamp) latestTime = new Date(vals.timestamp).toLocaleString('en-US', { timeZone: 'America/Los_Angeles' });
-                    let sourceLabel = vals.timestamp ? `${source} (${label})` : `${source} (No data)`;
-                    metrics += `<div class="source-label">${sourceLabel}</div>`;
-                    if (source !== 'Enphase') {
-                        metrics += `<div class="metric"><span>Temp</span><span class="value">${fmtVal(vals.temperature, 1)}°F</span></div>`;
-                        metrics += `<div class="metric"><span>Humidity</span><span class="value">${fmtVal(vals.humidity, 0)}%</span></div>`;
-                    }
-                    if (source === 'Sensibo') {
-                        metrics += `<div class="metric"><span>CO₂</span><span class="value">${fmtVal(vals.co2, 0)} ppm</span></div>`;
-                        metrics += `<div class="metric"><span>TVOC</span><span class="value">${fmtVal(vals.tvoc, 0)} ppb</span></div>`;
-                        metrics += `<div class="metric"><span>AQI/IAQ</span><span class="value">${fmtVal(vals.iaq, 0)}</span></div>`;
-                    }
-                    if (source === 'Enphase') {
-                        metrics += `<div class="metric"><span>Production</span><span class="value">${fmtVal(vals.production_w, 2)} kW</span></div>`;
-                        metrics += `<div class="metric"><span>Consumption</span><span class="value">${fmtVal(vals.consumption_w, 2)} kW</span></div>`;
-                        metrics += `<div class="metric"><span>Net</span><span class="value">${fmtVal(vals.net_consumption_w, 2)} kW</span></div>`;
-                        metrics += `<div class="metric"><span>Prod Today</span><span class="value">${fmtVal(vals.production_wh_today, 2)} kWh</span></div>`;
-                        metrics += `<div class="metric"><span>Cons Today</span><span class="value">${fmtVal(vals.consumption_wh_today, 2)} kWh</span></div>`;
-                    }
-                    if (source === 'Weather') {
-                        metrics += `<div class="metric"><span>AQI</span><span class="value">${fmtVal(vals.iaq, 0)}</span></div>`;
-                        metrics += `<div class="metric"><span>Wind</span><span class="value">${fmtVal(vals.wind_speed, 1)} mph</span></div>`;
-                        metrics += `<div class="metric"><span>Gust</span><span class="value">${fmtVal(vals.wind_gust, 1)} mph</span></div>`;
-                        metrics += `<div class="metric"><span>Rain Rate</span><span class="value">${fmtVal(vals.precip_rate, 2)} in/hr</span></div>`;
-                        metrics += `<div class="metric"><span>Rain Total</span><span class="value">${fmtVal(vals.precip_total, 2)} in</span></div>`;
-                        metrics += `<div class="metric"><span>Pressure</span><span class="value">${fmtVal(vals.pressure, 2)} inHg</span></div>`;
-                        metrics += `<div class="metric"><span>UV</span><span class="value">${fmtVal(vals.uv, 1)}</span></div>`;
-                        metrics += `<div class="metric"><span>Solar</span><span class="value">${fmtVal(vals.solar_radiation, 0)} W/m²</span></div>`;
-                    }
-                }
-                html += `
-                    <div class="device-card" style="border-top: 3px solid ${color}">
-                        <h3>${room}</h3>
-                        ${metrics}
-                    </div>
-                `;
-            }
-            document.getElementById('currentValues').innerHTML = html;
-            let timeLabel = isLatest ? 'Last reading: ' + latestTime : 'Showing average for selected range';
-            document.getElementById('lastUpdate').textContent = timeLabel;
-        }
-
-        fetchAndPlot();
-        setInterval(fetchAndPlot, 60000);  // refresh every 60s
-    </script>
-</body>
-</html>
-"""
+PLOTLY_CDN_URL = "https://cdn.plot.ly/plotly-2.27.0.min.js"
+PLOTLY_VENDOR_PATH = "vendor/plotly.min.js"
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIN_BYTES = 1024
+MIN_BUCKET_MS = 60 * 1000
+# Custom ranges ending this long ago are treated as closed and never change
+CLOSED_RANGE_GRACE_MS = 15 * 60 * 1000
+
+_asset_digests = {}
+_index_pages = {}
+
+
+def asset_url(name):
+    """Content-hashed URL for a file under static/, so it can be cached forever."""
+    digest = _asset_digests.get(name)
+    if digest is None:
+        path = safe_join(app.static_folder, name)
+        if path is None:
+            raise FileNotFoundError(name)
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        _asset_digests[name] = digest
+    stem, ext = os.path.splitext(name)
+    return f"/assets/{stem}.{digest}{ext}"
+
+
+def plotly_url():
+    # The vendored bundle keeps offline displays working; the CDN is a fallback
+    if os.path.isfile(os.path.join(app.static_folder, PLOTLY_VENDOR_PATH)):
+        return asset_url(PLOTLY_VENDOR_PATH)
+    return PLOTLY_CDN_URL
+
+
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    stem, ext = os.path.splitext(filename)
+    name = stem.rpartition(".")[0] + ext
+    try:
+        current = asset_url(name)
+    except OSError:
+        abort(404)
+    if current != "/assets/" + filename:
+        abort(404)
+    response = send_from_directory(app.static_folder, name, max_age=ASSET_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route("/")
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+    display_tz = getattr(config, "DISPLAY_TIMEZONE", "America/Los_Angeles")
+    tz_param = request.args.get("tz")
+    if tz_param:
+        try:
+            ZoneInfo(tz_param)
+            display_tz = tz_param
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    # The page only changes with the timezone, so render it once per zone
+    page = _index_pages.get(display_tz)
+    if page is None:
+        page = render_template(
+            "index.html",
+            display_tz=display_tz,
+            asset_url=asset_url,
+            plotly_url=plotly_url(),
+        )
+        _index_pages[display_tz] = page
+    response = app.make_response(page)
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def choose_encoding(size):
+    accept = request.headers.get("Accept-Encoding", "")
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    if brotli is not None and "br" in accept:
+        return "br"
+    if "gzip" in accept:
+        return "gzip"
+    return None
+
+
+def encode(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+@app.after_request
+def compress_json(response):
+    """Tag JSON responses with an ETag and gzip/brotli them when accepted."""
+    if (
+        response.mimetype != "application/json"
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    data = response.get_data()
+    encoding = choose_encoding(len(data))
+    if response.get_etag()[0] is None:
+        digest = hashlib.sha1(data).hexdigest()
+        response.set_etag(f"{digest}-{encoding}" if encoding else digest)
+    response.vary.add("Accept-Encoding")
+    response.make_conditional(request)
+    if response.status_code == 304 or encoding is None:
+        return response
+    response.set_data(encode(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def version_etag(conn, args):
+    """Weak ETag from the newest row ids plus the query string.
+
+    Lets idle refreshes between collector polls short-circuit to a 304
+    before any range scan.
+    """
+    key = repr((queries.data_version(conn), sorted(args.items(multi=True))))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def sites_etag(names, args):
+    """version_etag across several sites' shards."""
+    def version():
+        conn = queries.connect()
+        try:
+            return queries.data_version(conn)
+        finally:
+            conn.close()
+    key = repr((sites.for_each_site(version, names), sorted(args.items(multi=True))))
+    return hashlib.sha1(key.encode()).hexdigest()
 
-@app.route("/api/data")
-def api_data():
-    from flask import request
-    import datetime
-    from zoneinfo import ZoneInfo
-
-    pacific = ZoneInfo("America/Los_Angeles")
 
-    def to_pacific(ts_str):
-        """Convert a UTC timestamp string to Pacific time ISO string."""
-        if not ts_str:
-            return ts_str
-        ts_str = ts_str.replace("Z", "+00:00")
+def render_sites(render, names, args):
+    """render() on each site's shard concurrently, keys prefixed "Site/"."""
+    def render_one():
+        conn = queries.connect()
         try:
-            dt = datetime.datetime.fromisoformat(ts_str)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=datetime.timezone.utc)
-            return dt.astimezone(pacific).isoformat()
-        except Exception:
-            return ts_str
-
-    range_param = request.args.get("range", "24h")
-    start_param = request.args.get("start")
-    end_param = request.args.get("end")
-    now = datetime.datetime.utcnow()
-
-    range_map = {
-        "1h": datetime.timedelta(hours=1),
-        "6h": datetime.timedelta(hours=6),
-        "24h": datetime.timedelta(hours=24),
-        "7d": datetime.timedelta(days=7),
-        "30d": datetime.timedelta(days=30),
-        "1y": datetime.timedelta(days=365),
-    }
-
-    conn = sqlite3.connect(config.DB_PATH)
-    conn.row_factory = sqlite3.Row
-
-    def query_range(table, ts_col="timestamp"):
-        if range_param == "custom" and start_param and end_param:
-            return conn.execute(
-                f"SELECT * FROM {table} WHERE {ts_col} >= ? AND {ts_col} < ? ORDER BY {ts_col}",
-                (start_param, end_param),
-            ).fetchall()
-        elif range_param in range_map:
-            since = (now - range_map[range_param]).isoformat() + "Z"
-            return conn.execute(
-                f"SELECT * FROM {table} WHERE {ts_col} >= ? ORDER BY {ts_col}",
-                (since,),
-            ).fetchall()
-        else:
-            return conn.execute(
-                f"SELECT * FROM {table} ORDER BY {ts_col}"
-            ).fetchall()
-
-    rows = query_range("readings")
-    govee_rows = query_range("govee_readings") if getattr(config, "GOVEE_ENABLED", False) else []
-    weather_rows = query_range("weather_readings")
-    solar_rows = query_range("solar_readings")
-
-    # Pre-populate all known keys so cards always show
-    all_rooms = conn.execute(
-        "SELECT DISTINCT room_name FROM readings"
-    ).fetchall()
-    all_govee_rooms = conn.execute(
-        "SELECT DISTINCT room_name FROM govee_readings"
-    ).fetchall() if getattr(config, "GOVEE_ENABLED", False) else []
-    has_weather = conn.execute(
-        "SELECT 1 FROM weather_readings LIMIT 1"
-    ).fetchone()
-    has_solar = conn.execute(
-        "SELECT 1 FROM solar_readings LIMIT 1"
-    ).fetchone()
-
+            return render(conn, args)
+        finally:
+            conn.close()
+    merged = {}
+    for name, result in zip(names, sites.for_each_site(render_one, names)):
+        for key, value in result.items():
+            merged[f"{name}/{key}"] = value
+    return merged
+
+
+def request_sites(multi_site):
+    """Sites named by ?site=; 400 if unknown, or several where one is allowed."""
+    try:
+        names = sites.parse(request.args.get("site"))
+    except ValueError as e:
+        abort(400, str(e))
+    if len(names) > 1 and not multi_site:
+        abort(400, "this endpoint reads one site at a time")
+    return names
+
+
+def not_modified(etag):
+    response = app.make_response(("", 304))
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+
+def versioned_json(result, etag):
+    response = app.make_response(result)
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+
+def closed_range_key():
+    """Disk cache key for a custom range that lies fully in the past, else None."""
+    # The same condition as time_bounds; anything else reads open-ended
+    if (
+        request.args.get("range") != "custom"
+        or not request.args.get("start")
+        or not request.args.get("end")
+    ):
+        return None
+    try:
+        queries.iso_to_ms(request.args["start"])
+        end_ms = queries.iso_to_ms(request.args["end"])
+    except ValueError:
+        return None  # the view rejects it; never cache the error
+    now_ms = time.time() * 1000
+    if end_ms > now_ms - CLOSED_RANGE_GRACE_MS:
+        return None
+    return request.path + "?" + repr(sorted(request.args.items(multi=True)))
+
+
+def immutable_json(body):
+    response = app.response_class(body, mimetype="application/json")
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def closed_range_response(cache_key, result):
+    body = app.json.dumps(result).encode()
+    response_cache.put(cache_key, body)
+    return immutable_json(body)
+
+
+def preset_key():
+    """Warm-cache key for a request on one of the preset ranges, else None."""
+    if (
+        not getattr(config, "WARM_PRESETS", True)
+        or request.args.get("range", "24h") not in queries.RANGE_MAP
+        or "start" in request.args
+        or "end" in request.args
+        or "site" in request.args  # other shards' commits happen in other processes
+    ):
+        return None
+    return request.path + "?" + urlencode(sorted(request.args.items(multi=True)))
+
+
+def warm_builder(render, args):
+    """Builder for warmer.track: the response body for args in every encoding."""
+    def build():
+        conn = queries.connect()
+        try:
+            etag = version_etag(conn, args)
+            body = app.json.dumps(render(conn, args)).encode()
+        finally:
+            conn.close()
+        bodies = {None: body}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            bodies["gzip"] = encode(body, "gzip")
+            if brotli is not None:
+                bodies["br"] = encode(body, "br")
+        return etag, bodies
+    return build
+
+
+def warm_response(built):
+    etag, bodies = built
+    encoding = choose_encoding(len(bodies[None]))
+    response = app.response_class(bodies[encoding], mimetype="application/json")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def json_endpoint(render, multi_site=False):
+    """Run an API view behind the response caches.
+
+    Closed ranges come from the disk cache and presets from the warmer;
+    anything else short-circuits on the data-version ETag before rendering.
+    With multi_site, ?site=all or ?site=A,B merges every named site.
+    """
+    names = request_sites(multi_site)
+    if len(names) > 1:
+        return multi_site_endpoint(render, names)
+    with sites.use(names[0]):
+        return site_endpoint(render)
+
+
+def multi_site_endpoint(render, names):
+    cache_key = closed_range_key()
+    if cache_key:
+        body = response_cache.get(cache_key)
+        if body is not None:
+            return immutable_json(body)
+    etag = sites_etag(names, request.args)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    result = render_sites(render, names, request.args)
+    if cache_key:
+        return closed_range_response(cache_key, result)
+    return versioned_json(result, etag)
+
+
+def site_endpoint(render):
+    cache_key = closed_range_key()
+    if cache_key:
+        body = response_cache.get(cache_key)
+        if body is not None:
+            return immutable_json(body)
+    warm_key = preset_key()
+    if warm_key:
+        built = warmer.get(warm_key)
+        if built is not None:
+            return warm_response(built)
+    conn = queries.connect()
+    hot_tier.sync(conn)  # pick up rows backfill.py wrote from its own process
+    etag = version_etag(conn, request.args)
+    if request.if_none_match.contains_weak(etag):
+        conn.close()
+        return not_modified(etag)
+    result = render(conn, request.args)
     conn.close()
-
+    if cache_key:
+        return closed_range_response(cache_key, result)
+    if warm_key:
+        warmer.track(warm_key, warm_builder(render, request.args.copy()))
+    return versioned_json(result, etag)
+
+
+def range_bounds(args):
+    """(since, until) for a request's range; 400 if a custom bound is not a timestamp."""
+    try:
+        return queries.time_bounds(args.get("range", "24h"), args.get("start"), args.get("end"))
+    except ValueError as e:
+        abort(400, str(e))
+
+
+def render_data(conn, args):
+    since, until = range_bounds(args)
+    bucket_ms = args.get("bucket", type=int)
+    points = args.get("points", type=int)
+    if bucket_ms is None and points:
+        bucket_ms = queries.bucket_for_points(conn, since, until, points)
+    if bucket_ms is not None and bucket_ms < MIN_BUCKET_MS:
+        bucket_ms = None  # finer than the collectors poll; send raw rows
+    return queries.fetch_series(
+        conn, since, until, queries.parse_series(args.get("series")), bucket_ms
+    )
+
+
+def render_summary(conn, args):
+    since, until = range_bounds(args)
+    summary = queries.summarize(conn, since, until)
     result = {}
-    for row in all_rooms:
-        result[row["room_name"] + "|Sensibo"] = []
-    for row in all_govee_rooms:
-        result[row["room_name"] + "|Govee"] = []
-    if has_weather:
-        result["Outside|Weather"] = []
-    if has_solar:
-        result["Solar|Enphase"] = []
-
-    for row in rows:
-        key = row["room_name"] + "|Sensibo"
-        if key not in result:
-            result[key] = []
-        temp_c = row["temperature"]
-        temp_f = round(temp_c * 9 / 5 + 32, 1) if temp_c is not None else None
-        result[key].append(
-            {
-                "timestamp": to_pacific(row["timestamp"]),
-                "temperature": temp_f,
-                "humidity": row["humidity"],
-                "co2": row["co2"],
-                "tvoc": row["tvoc"],
-                "iaq": row["iaq"],
-            }
-        )
-
-    for row in govee_rows:
-        key = row["room_name"] + "|Govee"
-        if key not in result:
-            result[key] = []
-        temp_c = row["temperature"]
-        temp_f = round(temp_c * 9 / 5 + 32, 1) if temp_c is not None else None
-        result[key].append(
-            {
-                "timestamp": to_pacific(row["timestamp"]),
-                "temperature": temp_f,
-                "humidity": row["humidity"],
-                "co2": None,
-                "tvoc": None,
-                "iaq": None,
-            }
-        )
+    for key in queries.known_keys(conn):
+        result[key] = summary.get(key, {"timestamp": None, "count": 0})
+    return result
 
-    for row in weather_rows:
-        key = "Outside|Weather"
-        if key not in result:
-            result[key] = []
-        result[key].append(
-            {
-                "timestamp": to_pacific(row["timestamp"]),
-                "temperature": row["temperature"],
-                "humidity": row["humidity"],
-                "co2": None,
-                "tvoc": None,
-                "iaq": row["aqi"],
-                "wind_speed": row["wind_speed"],
-                "wind_gust": row["wind_gust"],
-                "pressure": row["pressure"],
-                "precip_rate": row["precip_rate"],
-                "precip_total": row["precip_total"],
-                "uv": row["uv"],
-                "solar_radiation": row["solar_radiation"],
-            }
-        )
 
-    for row in solar_rows:
-        key = "Solar|Enphase"
-        if key not in result:
-            result[key] = []
-        prod_kwh = row["production_wh_today"]
-        cons_kwh = row["consumption_wh_today"]
-
-        result[key].append(
-            {
-                "timestamp": to_pacific(row["timestamp"]),
-                "production_w": round(row["production_w"] / 1000, 2) if row["production_w"] else None,
-                "consumption_w": round(row["consumption_w"] / 1000, 2) if row["consumption_w"] else None,
-                "net_consumption_w": round(row["net_consumption_w"] / 1000, 2) if row["net_consumption_w"] else None,
-                "production_wh_today": round(prod_kwh / 1000, 2) if prod_kwh else None,
-                "consumption_wh_today": round(cons_kwh / 1000, 2) if cons_kwh else None,
-            }
+def render_join(conn, args):
+    since, until = range_bounds(args)
+    try:
+        series = join.parse_series(args.get("series"))
+        derived = join.parse_derived(args.get("derive"), len(series))
+        bucket_ms = join.grid_bucket(
+            conn, since, until, args.get("bucket", type=int), args.get("points", type=int),
+            MIN_BUCKET_MS,
         )
-
-    return result
+    except ValueError as e:
+        abort(400, str(e))
+    asof_ms = args.get("asof", join.DEFAULT_ASOF_MS, type=int)
+    return join.join(conn, series, since, until, bucket_ms, asof_ms, derived)
 
 
-def main():
-    init_db()
+@app.route("/api/data")
+def api_data():
+    return json_endpoint(render_data, multi_site=True)
+
+
+@app.route("/api/summary")
+def api_summary():
+    return json_endpoint(render_summary, multi_site=True)
+
+
+@app.route("/api/join")
+def api_join():
+    return json_endpoint(render_join)
+
+
+@app.route("/api/export")
+def api_export():
+    site = request_sites(multi_site=False)[0]
+    with sites.use(site):
+        return site_export(site)
+
+
+def site_export(site):
+    fmt = request.args.get("format", "csv")
+    if fmt not in export.FORMATS:
+        abort(400, "format must be one of: " + ", ".join(export.FORMATS))
+    if fmt == "parquet" and export.pa is None:
+        abort(400, "parquet export needs pyarrow installed")
+    name = request.args.get("source")
+    source = next((s for s in queries.enabled_sources() if s["name"] == name), None)
+    if source is None:
+        abort(400, "unknown source")
+    fields = queries.parse_series(request.args.get("series")).get(source["name"])
+    if not fields:
+        abort(400, "no matching series")
+    if "range" in request.args:
+        since, until = range_bounds(request.args)
+    else:
+        try:
+            since = queries.check_bound(request.args.get("start"))
+            until = queries.check_bound(request.args.get("end"))
+        except ValueError as e:
+            abort(400, str(e))
+    gzip_body = request.args.get("gzip") in ("1", "true")
+    filename = f"{source['name'].lower()}.{fmt}" + (".gz" if gzip_body else "")
+    return Response(
+        # Streamed after the view returns, so the stream carries its site along
+        sites.within(site, export.stream(source, fields, since, until, fmt, gzip_body)),
+        mimetype="application/gzip" if gzip_body else export.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@app.route("/api/sites")
+def api_sites():
+    return {"sites": sites.names(), "primary": sites.primary()}
+
+
+@app.before_request
+def track_request():
+    if request.path.startswith("/admin/"):
+        return  # a profile capture is slow by design
+    profiler.start(f"{request.method} {request.full_path.rstrip('?')}", "request")
+
+
+@app.teardown_request
+def finish_request(exc):
+    profiler.finish()
+
+
+def require_admin():
+    """404 unless ADMIN_TOKEN is set and sent as a Bearer token or ?token=."""
+    token = getattr(config, "ADMIN_TOKEN", None)
+    if not token:
+        abort(404)
+    auth = request.headers.get("Authorization", "")
+    sent = auth[7:] if auth.startswith("Bearer ") else request.args.get("token", "")
+    if not hmac.compare_digest(sent.encode(), token.encode()):
+        abort(403)
+
+
+@app.route("/admin/profile")
+def admin_profile():
+    require_admin()
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval_ms = float(request.args.get("interval_ms", profiler.DEFAULT_INTERVAL_MS))
+    except ValueError:
+        abort(400, "seconds and interval_ms must be numbers")
+    counts = profiler.capture(seconds, interval_ms)
+    if counts is None:
+        abort(409, "a profile is already being captured")
+    return Response(profiler.collapse(counts), mimetype="text/plain")
+
+
+@app.route("/admin/slow")
+def admin_slow():
+    require_admin()
+    return app.response_class(app.json.dumps(profiler.slow_operations()), mimetype="application/json")
+
+
+def start_background():
+    """Start the collectors and the jobs that maintain this site's database."""
+    if getattr(config, "ALERT_RULES", None):
+        # Before the collectors start, so their first readings are evaluated
+        alerts_thread = threading.Thread(target=run_alerts, name="alerts", daemon=True)
+        alerts_thread.start()
+    if getattr(config, "MQTT_HOST", None):
+        mqtt_thread = threading.Thread(target=run_mqtt_bridge, name="mqtt-bridge", daemon=True)
+        mqtt_thread.start()
+    scheduler.start()
     if getattr(config, "GOVEE_ENABLED", False):
-        init_govee_db()
-        govee_thread = threading.Thread(target=run_govee_collector, daemon=True)
+        govee_thread = threading.Thread(
+            target=run_govee_collector, name="govee-collector", daemon=True
+        )
         govee_thread.start()
-    init_weather_db()
-    init_solar_db()
-    collector_thread = threading.Thread(target=run_collector, daemon=True)
+    collector_thread = threading.Thread(target=run_collector, name="sensibo-collector", daemon=True)
     collector_thread.start()
-    weather_thread = threading.Thread(target=run_weather_collector, daemon=True)
+    weather_thread = threading.Thread(
+        target=run_weather_collector, name="weather-collector", daemon=True
+    )
     weather_thread.start()
-    solar_thread = threading.Thread(target=run_solar_collector, daemon=True)
+    solar_thread = threading.Thread(target=run_solar_collector, name="solar-collector", daemon=True)
     solar_thread.start()
+    migration_thread = threading.Thread(
+        target=run_online_migrations, name="online-migrations", daemon=True
+    )
+    migration_thread.start()
+    if getattr(config, "ARCHIVE_ENABLED", False):
+        archive_thread = threading.Thread(target=run_archiver, name="archiver", daemon=True)
+        archive_thread.start()
+
+
+def main():
+    migrate()
+    hot_tier.rebuild()
+    start_background()
+    sites.run_sites()
+    if getattr(config, "WARM_PRESETS", True):
+        warmer_thread = threading.Thread(target=run_warmer, name="warmer", daemon=True)
+        warmer_thread.start()
     print(f"\nDashboard running at http://localhost:{config.WEB_PORT}")
     app.run(host=config.WEB_HOST, port=config.WEB_PORT)
 
@@ -0,0 +1,183 @@
+"""Several sites (houses) on one server, each with its own SQLite shard.
+
+This config.py is the primary site, named SITE_NAME. SITES maps every other
+site to its own config file, written like this one with its own DB_PATH
+(ARCHIVE_DIR defaults to a directory beside it):
+
+    SITES = {"Cabin": "/home/pi/cabin/config.py"}
+
+Each extra site's collectors run in a child process with that file as their
+config module, so every shard has exactly one writer and a slow site never
+holds another's write lock. The server reads all shards: the read path asks
+setting() for DB_PATH and friends, which answers for the site active on the
+current thread (the primary unless use() says otherwise).
+
+    python sites.py collect Cabin     run one site's collectors by hand
+"""
+import contextlib
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+RESTART_DELAY_SECONDS = 30
+
+_local = threading.local()
+_configs = {}
+_lock = threading.Lock()
+_pool = None
+
+
+def primary():
+    return getattr(config, "SITE_NAME", "Home")
+
+
+def names():
+    return [primary()] + list(getattr(config, "SITES", {}))
+
+
+def site_config(name):
+    """Config module of a site; this config for the primary (or None)."""
+    if name is None or name == primary():
+        return config
+    with _lock:
+        module = _configs.get(name)
+        if module is None:
+            path = getattr(config, "SITES", {}).get(name)
+            if path is None:
+                raise ValueError(f"unknown site {name!r}")
+            spec = importlib.util.spec_from_file_location(f"site_config_{len(_configs)}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            if not hasattr(module, "ARCHIVE_DIR") and hasattr(module, "DB_PATH"):
+                # Next to the site's database, never the primary's "archive"
+                module.ARCHIVE_DIR = os.path.splitext(module.DB_PATH)[0] + "-archive"
+            others = [config, *_configs.values()]
+            for setting, default in (("DB_PATH", None), ("ARCHIVE_DIR", "archive")):
+                value = getattr(module, setting, None)
+                taken = {_path(getattr(other, setting, default)) for other in others}
+                if value is None or _path(value) in taken:
+                    raise ValueError(f"site {name!r} needs a {setting} of its own")
+            _configs[name] = module
+    return module
+
+
+def _path(value):
+    return os.path.abspath(value) if value else None
+
+
+def active():
+    """Site whose shard this thread reads, or None for the primary."""
+    return getattr(_local, "site", None)
+
+
+@contextlib.contextmanager
+def use(name):
+    """Read `name`'s shard on this thread for the duration of the block."""
+    site_config(name)  # unknown sites fail here, not halfway through a query
+    previous = active()
+    _local.site = None if name == primary() else name
+    try:
+        yield
+    finally:
+        _local.site = previous
+
+
+def within(name, iterable):
+    """Iterate with `name` active; for streams consumed after the view returns."""
+    with use(name):
+        yield from iterable
+
+
+def setting(name, default=None):
+    """A config value of the active site."""
+    return getattr(site_config(active()), name, default)
+
+
+def parse(param):
+    """Site names for a ?site= value: one, "A,B", or "all"; ValueError if unknown."""
+    if not param:
+        return [primary()]
+    if param == "all":
+        return names()
+    picked = []
+    for name in param.split(","):
+        name = name.strip()
+        if name not in names():
+            raise ValueError(f"unknown site {name!r}")
+        if name not in picked:
+            picked.append(name)
+    return picked
+
+
+def for_each_site(fn, sites):
+    """[fn() for each site] with that site active, run concurrently.
+
+    Sites get separate query pools (see queries.for_each_source), so a long
+    range on one shard does not queue the others' scans behind it.
+    """
+    global _pool
+    sites = list(sites)
+    if len(sites) <= 1:
+        return [_call(name, fn) for name in sites]
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=len(names()), thread_name_prefix="site")
+    return list(_pool.map(lambda name: _call(name, fn), sites))
+
+
+def _call(name, fn):
+    with use(name):
+        return fn()
+
+
+def supervise(name):
+    """Keep a site's collector process running, restarting it when it exits."""
+    while True:
+        print(f"Starting collectors for site {name}")
+        proc = subprocess.Popen([sys.executable, __file__, "collect", name])
+        code = proc.wait()
+        print(f"Collectors for site {name} exited with {code}; "
+              f"restarting in {RESTART_DELAY_SECONDS}s")
+        time.sleep(RESTART_DELAY_SECONDS)
+
+
+def run_sites():
+    """Start a supervisor thread for every site other than the primary."""
+    for name in names()[1:]:
+        try:
+            site_config(name)
+        except (OSError, ValueError) as e:
+            print(f"Site {name} not started: {e}")
+            continue
+        thread = threading.Thread(
+            target=supervise, args=(name,), name=f"site-{name}", daemon=True
+        )
+        thread.start()
+
+
+def collect(name):
+    """Run one site's collectors in this process, with its file as `config`."""
+    global config
+    config = site_config(name)
+    # Every module imported from here on sees the site's settings
+    sys.modules["config"] = config
+    import server
+    from migrations import migrate
+
+    migrate()
+    server.start_background()
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "collect":
+        collect(sys.argv[2])
+    else:
+        print(__doc__)
@@ -6,39 +6,21 @@ import requests
 import urllib3
 
 import config
+import migrations
+import profiler
+import scheduler
+import storage
 
 # Suppress SSL warnings for local Envoy
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+ENPHASE_URL = getattr(
+    config, "ENPHASE_URL", f"https://{config.ENPHASE_HOST}/production.json?details=1"
+)
+
 
 def init_solar_db():
-    conn = sqlite3.connect(config.DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS solar_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            production_w REAL,
-            consumption_w REAL,
-            net_consumption_w REAL,
-            production_wh_today REAL,
-            consumption_wh_today REAL,
-            production_wh_lifetime REAL,
-            imported_wh_today REAL,
-            exported_wh_today REAL
-        )
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_solar_timestamp
-        ON solar_readings (timestamp)
-    """)
-    # Add columns if upgrading from old schema
-    for col in ("imported_wh_today", "exported_wh_today"):
-        try:
-            conn.execute(f"ALTER TABLE solar_readings ADD COLUMN {col} REAL")
-        except sqlite3.OperationalError:
-            pass  # column already exists
-    conn.commit()
-    conn.close()
+    migrations.migrate()
 
 
 def _fetch_with_retries(max_retries=3, retry_delay=10):
@@ -46,7 +28,7 @@ def _fetch_with_retries(max_retries=3, retry_delay=10):
     for attempt in range(max_retries):
         try:
             resp = requests.get(
-                f"https://{config.ENPHASE_HOST}/production.json?details=1",
+                ENPHASE_URL,
                 headers={"Authorization": f"Bearer {config.ENPHASE_TOKEN}"},
                 verify=False,
                 timeout=10,
@@ -91,14 +73,16 @@ def collect_solar_once():
 
     now = datetime.now(timezone.utc).isoformat()
     conn = sqlite3.connect(config.DB_PATH)
-    conn.execute(
-        """INSERT INTO solar_readings
-           (timestamp, production_w, consumption_w, net_consumption_w,
-            production_wh_today, consumption_wh_today, production_wh_lifetime)
-           VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (now, production, consumption, net, prod_today, cons_today, prod_lifetime),
-    )
-    conn.commit()
+    storage.store(conn, "solar_readings", {
+        "timestamp": now,
+        "production_w": production,
+        "consumption_w": consumption,
+        "net_consumption_w": net,
+        "production_wh_today": prod_today,
+        "consumption_wh_today": cons_today,
+        "production_wh_lifetime": prod_lifetime,
+    })
+    storage.commit(conn)
     conn.close()
 
     prod_kw = production / 1000 if production else 0
@@ -117,10 +101,11 @@ def run_solar_collector():
     while True:
         try:
             print(f"\nCollecting solar at {time.strftime('%Y-%m-%d %H:%M:%S')}...")
-            collect_solar_once()
+            with profiler.track("solar cycle", "cycle"):
+                collect_solar_once()
         except Exception as e:
             print(f"Error collecting solar data: {e}")
-        time.sleep(config.ENPHASE_POLL_INTERVAL_SECONDS)
+        time.sleep(scheduler.next_interval("Enphase", config.ENPHASE_POLL_INTERVAL_SECONDS))
 
 
 if __name__ == "__main__":
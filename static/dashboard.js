@@ -0,0 +1,677 @@
+const ROOM_COLORS = {
+    'Outside': '#ffd93d',
+    'Living Room': '#e94560',
+    'Den': '#0f9b58',
+    'Bedroom': '#4285f4',
+    'Solar': '#fdcb6e'
+};
+
+const SOURCE_STYLES = {
+    'Sensibo': 'solid',
+    'Govee': 'dash',
+    'Weather': 'solid',
+    'Enphase': 'solid'
+};
+
+const tzOffset = tzOffsetFn(DISPLAY_TZ);
+
+// ?site=Cabin (or all, or Home,Cabin) on the page picks the sites shown
+const SITE = new URLSearchParams(location.search).get('site');
+const siteQuery = SITE ? '&site=' + encodeURIComponent(SITE) : '';
+
+// Above this many points, line traces switch to WebGL
+const GL_POINT_THRESHOLD = 5000;
+
+// JSON parsing and reshaping happen in a worker so long ranges don't block
+// the page; it resolves to columnar series (see data_worker.js)
+const dataWorker = new Worker(WORKER_URL);
+const workerPending = {};
+let workerSeq = 0;
+dataWorker.postMessage({ init: { timezoneUrl: TIMEZONE_URL, displayTz: DISPLAY_TZ } });
+dataWorker.onmessage = (e) => {
+    let pending = workerPending[e.data.id];
+    delete workerPending[e.data.id];
+    if (e.data.error) pending.reject(new Error(e.data.error));
+    else pending.resolve(e.data.series);
+};
+
+function fetchSeries(url) {
+    return new Promise((resolve, reject) => {
+        let id = ++workerSeq;
+        workerPending[id] = { resolve: resolve, reject: reject };
+        dataWorker.postMessage({ id: id, url: url });
+    });
+}
+
+function lineTraceType(data) {
+    let points = Object.values(data).reduce((sum, s) => sum + s.n, 0);
+    return points > GL_POINT_THRESHOLD ? 'scattergl' : 'scatter';
+}
+
+function negated(col) {
+    return col.map(v => -v);
+}
+
+let currentRange = '24h';
+let customStart = null;
+let customEnd = null;
+
+function goToToday() {
+    let today = new Date();
+    let dateStr = today.getFullYear() + '-' +
+        String(today.getMonth() + 1).padStart(2, '0') + '-' +
+        String(today.getDate()).padStart(2, '0');
+    document.getElementById('datePicker').value = dateStr;
+    document.getElementById('dateSpan').value = '1';
+    goToDate();
+}
+
+function setRange(range) {
+    currentRange = range;
+    customStart = null;
+    customEnd = null;
+    document.getElementById('datePicker').value = '';
+    document.querySelectorAll('.controls button').forEach(b => b.classList.remove('active'));
+    event.target.classList.add('active');
+    resetZoom();
+    fetchAndPlot();
+}
+
+function goToDate() {
+    let dateVal = document.getElementById('datePicker').value;
+    if (!dateVal) return;
+    let spanDays = parseInt(document.getElementById('dateSpan').value);
+    // Midnight in the display timezone, not the browser's
+    let wallStart = Date.parse(dateVal + 'T00:00:00Z');
+    let wallEnd = wallStart + spanDays * 86400000;
+    customStart = new Date(wallStart - tzOffset(wallStart)).toISOString();
+    customEnd = new Date(wallEnd - tzOffset(wallEnd)).toISOString();
+    currentRange = 'custom';
+    document.querySelectorAll('.controls button').forEach(b => b.classList.remove('active'));
+    resetZoom();
+    fetchAndPlot();
+}
+
+function navDate(direction) {
+    let picker = document.getElementById('datePicker');
+    let spanDays = parseInt(document.getElementById('dateSpan').value);
+    let current = picker.value ? new Date(picker.value) : new Date();
+    current.setDate(current.getDate() + (direction * spanDays));
+    picker.value = current.toISOString().split('T')[0];
+    goToDate();
+}
+
+function clearDatePicker() {
+    document.getElementById('datePicker').value = '';
+    customStart = null;
+    customEnd = null;
+    currentRange = '24h';
+    document.querySelectorAll('.controls button').forEach(b => b.classList.remove('active'));
+    document.querySelector('.controls button:nth-child(3)').classList.add('active');
+    resetZoom();
+    fetchAndPlot();
+}
+
+function parseKey(key) {
+    let parts = key.split('|');
+    return { room: parts[0], source: parts[1] };
+}
+
+const FIELD_CONFIG = {
+    temperature: { label: 'Temp', unit: '°F', color: '#e94560' },
+    humidity:    { label: 'Humidity', unit: '%', color: '#f5a623' },
+    co2:         { label: 'CO₂', unit: 'ppm', color: '#e94560' },
+    tvoc:        { label: 'TVOC', unit: 'ppb', color: '#0f9b58' },
+    iaq:         { label: 'AQI/IAQ', unit: '', color: '#4285f4' },
+    wind_speed:  { label: 'Wind', unit: 'mph', color: '#00cec9' },
+    wind_gust:   { label: 'Gust', unit: 'mph', color: '#d63031' },
+    precip_rate: { label: 'Rain Rate', unit: 'in/hr', color: '#74b9ff' },
+    precip_total:{ label: 'Rain Total', unit: 'in', color: '#0984e3' },
+    pressure:    { label: 'Pressure', unit: 'inHg', color: '#a29bfe' },
+    uv:          { label: 'UV Index', unit: '', color: '#fdcb6e' },
+    solar_radiation: { label: 'Solar', unit: 'W/m²', color: '#e17055' },
+    production_w:    { label: 'Production', unit: 'kW', color: '#f9ca24' },
+    consumption_w:   { label: 'Consumption', unit: 'kW', color: '#eb4d4b' },
+    net_consumption_w: { label: 'Net', unit: 'kW', color: '#888888' },
+    production_wh_today: { label: 'Produced', unit: 'kWh', color: '#f9ca24' },
+    consumption_wh_today: { label: 'Consumed', unit: 'kWh', color: '#eb4d4b' },
+    heat_index:  { label: 'Heat Index', unit: '°F', color: '#ff7675' },
+    dew_point:   { label: 'Dew Point', unit: '°F', color: '#81ecec' },
+    abs_humidity: { label: 'Abs Humidity', unit: 'g/m³', color: '#55efc4' },
+    self_consumption: { label: 'Self-use', unit: '%', color: '#badc58' },
+    production_peak_w: { label: 'Peak', unit: 'kW', color: '#f0932b' }
+};
+
+function getCheckedFields(containerId) {
+    let checks = document.querySelectorAll('#' + containerId + ' input[type=checkbox]');
+    let fields = [];
+    checks.forEach(cb => {
+        if (cb.checked) {
+            fields.push({ field: cb.dataset.field, source: cb.dataset.source || null });
+        }
+    });
+    return fields;
+}
+
+function rangeQuery() {
+    let qs = 'range=' + currentRange;
+    if (customStart && customEnd) {
+        qs += '&start=' + encodeURIComponent(customStart) + '&end=' + encodeURIComponent(customEnd);
+    }
+    return qs + siteQuery;
+}
+
+// Each chart fetches only its checked series, and only while on screen
+const CHARTS = [
+    { div: 'chart1', checks: 'chart1Checks', plot: plotFiltered },
+    { div: 'chart2', checks: 'chart2Checks', plot: plotGeneric },
+    { div: 'chart3', checks: 'chart3Checks', plot: plotGeneric },
+    { div: 'chart4', checks: 'chart4Checks', plot: plotGeneric },
+    { div: 'chart5', checks: 'chart5Checks', plot: plotSolar }
+];
+CHARTS.forEach(chart => Object.assign(chart, {
+    data: {}, loaded: [], stale: true, visible: false, seq: 0, zoom: null, listening: false
+}));
+
+// Zoomed views are fetched as fixed tiles at a power-of-two bucket size that
+// matches the chart width. Tiles that end in the past never change, so they
+// are kept for panning and zooming back.
+const TILE_BUCKETS = 256;
+const TILE_CACHE_LIMIT = 400;
+const MIN_BUCKET_MS = 60000;
+const tileCache = new Map();
+
+function seriesSpec(check) {
+    return check.source ? check.source + ':' + check.field : check.field;
+}
+
+function chartWidth(chart) {
+    return document.getElementById(chart.div).clientWidth || 1000;
+}
+
+function fetchTile(series, bucket, index) {
+    let key = series + '|' + bucket + '|' + index;
+    if (tileCache.has(key)) {
+        let tile = tileCache.get(key);
+        tileCache.delete(key);  // keep the map in LRU order
+        tileCache.set(key, tile);
+        return Promise.resolve(tile);
+    }
+    let start = index * bucket * TILE_BUCKETS;
+    let end = start + bucket * TILE_BUCKETS;
+    let url = '/api/data?range=custom' +
+        '&start=' + new Date(start).toISOString() + '&end=' + new Date(end).toISOString() +
+        '&bucket=' + bucket + '&series=' + encodeURIComponent(series) + siteQuery;
+    return fetchSeries(url).then(tile => {
+        if (end < Date.now() - 15 * 60000) {
+            tileCache.set(key, tile);
+            if (tileCache.size > TILE_CACHE_LIMIT) tileCache.delete(tileCache.keys().next().value);
+        }
+        return tile;
+    });
+}
+
+function mergeTiles(tiles) {
+    let merged = {};
+    let keys = new Set();
+    tiles.forEach(tile => Object.keys(tile).forEach(k => keys.add(k)));
+    for (let key of keys) {
+        let parts = tiles.map(tile => tile[key]).filter(Boolean);
+        let n = parts.reduce((sum, p) => sum + p.n, 0);
+        let out = { n: n, t: new Float64Array(n), widths: new Float64Array(n), cols: {}, has: {} };
+        parts.forEach(p => Object.keys(p.cols).forEach(f => {
+            if (!out.cols[f]) out.cols[f] = new Float64Array(n).fill(NaN);
+        }));
+        let offset = 0;
+        for (let p of parts) {
+            out.t.set(p.t, offset);
+            out.widths.set(p.widths, offset);
+            for (let f in p.cols) out.cols[f].set(p.cols[f], offset);
+            Object.assign(out.has, p.has);
+            offset += p.n;
+        }
+        merged[key] = out;
+    }
+    return merged;
+}
+
+function loadTiles(series, start, end, width) {
+    let perPixel = Math.max((end - start) / width, MIN_BUCKET_MS);
+    let bucket = MIN_BUCKET_MS * Math.pow(2, Math.ceil(Math.log2(perPixel / MIN_BUCKET_MS)));
+    let span = bucket * TILE_BUCKETS;
+    let tiles = [];
+    for (let i = Math.floor(start / span); i <= Math.floor((end - 1) / span); i++) {
+        tiles.push(fetchTile(series.join(','), bucket, i));
+    }
+    return Promise.all(tiles).then(mergeTiles);
+}
+
+function drawChart(chart, checks) {
+    chart.plot(chart.div, chart.data, checks);
+    if (!chart.listening) {
+        document.getElementById(chart.div).on('plotly_relayout', ev => chartZoomed(chart, ev));
+        chart.listening = true;
+    }
+}
+
+function loadChart(chart) {
+    let checks = getCheckedFields(chart.checks);
+    let seq = ++chart.seq;
+    chart.stale = false;
+    if (checks.length === 0) {
+        chart.data = {};
+        chart.loaded = [];
+        drawChart(chart, checks);
+        return;
+    }
+    let series = checks.map(seriesSpec);
+    let request = chart.zoom
+        ? loadTiles(series, chart.zoom[0], chart.zoom[1], chartWidth(chart))
+        : fetchSeries('/api/data?' + rangeQuery() + '&points=' + chartWidth(chart) +
+            '&series=' + encodeURIComponent(series.join(',')));
+    request.then(data => {
+        if (seq !== chart.seq) return;  // superseded by a newer load
+        chart.data = data;
+        chart.loaded = series;
+        drawChart(chart, getCheckedFields(chart.checks));
+    });
+}
+
+// Axis ranges come back as display-timezone wall-clock strings
+function fromDisplayTime(value) {
+    let wall = typeof value === 'number' ? value :
+        Date.parse((value.length <= 10 ? value + ' 00:00' : value).replace(' ', 'T') + 'Z');
+    return wall - tzOffset(wall);
+}
+
+function chartZoomed(chart, ev) {
+    if (ev['xaxis.autorange']) {
+        chart.zoom = null;
+        loadChart(chart);
+        return;
+    }
+    let range = ev['xaxis.range'] || [ev['xaxis.range[0]'], ev['xaxis.range[1]']];
+    if (range[0] === undefined) return;
+    chart.zoom = [fromDisplayTime(range[0]), fromDisplayTime(range[1])];
+    loadChart(chart);
+}
+
+function resetZoom() {
+    BASE_LAYOUT.uirevision++;
+    CHARTS.forEach(chart => chart.zoom = null);
+}
+
+function chartChanged(input) {
+    let chart = CHARTS.find(c => c.checks === input.closest('.checkboxes').id);
+    let checks = getCheckedFields(chart.checks);
+    // Unticking only needs a replot; ticking something new loads it
+    if (!chart.stale && checks.every(c => chart.loaded.includes(seriesSpec(c)))) {
+        drawChart(chart, checks);
+    } else if (chart.visible) {
+        loadChart(chart);
+    } else {
+        chart.stale = true;
+    }
+}
+
+const chartObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        let chart = CHARTS.find(c => c.div === entry.target.id);
+        chart.visible = entry.isIntersecting;
+        if (chart.visible && chart.stale) loadChart(chart);
+    });
+}, { rootMargin: '200px' });
+CHARTS.forEach(chart => chartObserver.observe(document.getElementById(chart.div)));
+
+function fetchAndPlot() {
+    CHARTS.forEach(chart => {
+        chart.stale = true;
+        if (chart.visible) loadChart(chart);
+    });
+    fetch('/api/summary?' + rangeQuery())
+        .then(r => r.json())
+        .then(updateCurrentValues);
+}
+
+const BASE_LAYOUT = {
+    paper_bgcolor: '#16213e',
+    plot_bgcolor: '#16213e',
+    font: { color: '#e0e0e0' },
+    margin: { t: 40, r: 80, b: 40, l: 80 },
+    xaxis: { gridcolor: '#2a2a4a', type: 'date' },
+    legend: {
+        orientation: 'h',
+        y: 1.15,
+        x: 0.5,
+        xanchor: 'center',
+        bgcolor: 'rgba(0,0,0,0)',
+        font: { color: '#e0e0e0' }
+    },
+    hovermode: 'x unified',
+    uirevision: 1  // bumped on range changes so zoom resets
+};
+
+// Source-aware chart: each checkbox specifies field + source
+function plotFiltered(divId, data, checks) {
+    if (checks.length === 0) {
+        Plotly.react(divId, [], BASE_LAYOUT, { responsive: true });
+        return;
+    }
+    let traces = [];
+    let keys = Object.keys(data);
+    let uniqueFields = [...new Set(checks.map(c => c.field))];
+    let useSecondAxis = uniqueFields.length > 1;
+    let lineType = lineTraceType(data);
+
+    for (let key of keys) {
+        let { room, source } = parseKey(key);
+        let series = data[key];
+        let roomDash = SOURCE_STYLES[source] || 'solid';
+        checks.forEach((check, i) => {
+            if (check.source && check.source !== source) return;
+            let field = check.field;
+            if (!series.has[field]) return;
+            let cfg = FIELD_CONFIG[field];
+            let fieldIdx = uniqueFields.indexOf(field);
+            traces.push({
+                x: series.t,
+                y: series.cols[field],
+                name: room + ' ' + source + ' ' + cfg.label,
+                type: lineType,
+                mode: 'lines',
+                line: { color: ROOM_COLORS[room] || '#fff', width: 2, dash: roomDash },
+                yaxis: (useSecondAxis && fieldIdx > 0) ? 'y2' : 'y'
+            });
+        });
+    }
+
+    let firstCfg = FIELD_CONFIG[uniqueFields[0]];
+    let yTitle = firstCfg.label + (firstCfg.unit ? ' (' + firstCfg.unit + ')' : '');
+    let layout = Object.assign({}, BASE_LAYOUT, {
+        yaxis: { title: yTitle, gridcolor: '#2a2a4a', side: 'left' }
+    });
+
+    if (useSecondAxis) {
+        let otherLabels = uniqueFields.slice(1).map(f => {
+            let c = FIELD_CONFIG[f];
+            return c.label + (c.unit ? ' (' + c.unit + ')' : '');
+        });
+        layout.yaxis2 = {
+            title: otherLabels.join(' / '),
+            gridcolor: '#2a2a4a',
+            side: 'right',
+            overlaying: 'y'
+        };
+    }
+
+    Plotly.react(divId, traces, layout, { responsive: true });
+}
+
+// Simple chart: checkboxes only specify field, all sources included
+function plotBar(divId, data, checks) {
+    let fields = checks.map(c => c.field);
+    if (fields.length === 0) {
+        Plotly.react(divId, [], BASE_LAYOUT, { responsive: true });
+        return;
+    }
+    let traces = [];
+    let keys = Object.keys(data);
+
+    // Group fields by unit for axis assignment
+    let units = [...new Set(fields.map(f => FIELD_CONFIG[f].unit))];
+    let useSecondAxis = units.length > 1;
+
+    for (let key of keys) {
+        let { room, source } = parseKey(key);
+        let series = data[key];
+        fields.forEach((field, i) => {
+            if (!series.has[field]) return;
+            let cfg = FIELD_CONFIG[field];
+            let negFields = ['consumption_w', 'net_consumption_w'];
+            let negate = negFields.includes(field);
+            let fieldUnit = cfg.unit;
+            let axisIdx = units.indexOf(fieldUnit);
+            traces.push({
+                x: series.t,
+                y: negate ? negated(series.cols[field]) : series.cols[field],
+                name: cfg.label,
+                type: 'bar',
+                width: series.widths,
+                offset: 0,
+                marker: { color: cfg.color, opacity: 0.7 },
+                yaxis: (useSecondAxis && axisIdx > 0) ? 'y2' : 'y'
+            });
+        });
+    }
+
+    let firstUnit = units[0];
+    let layout = Object.assign({}, BASE_LAYOUT, {
+        barmode: 'overlay',
+        yaxis: { title: firstUnit, gridcolor: '#2a2a4a', side: 'left' }
+    });
+
+    if (useSecondAxis) {
+        layout.yaxis2 = {
+            title: units[1],
+            gridcolor: '#2a2a4a',
+            side: 'right',
+            overlaying: 'y'
+        };
+    }
+
+    Plotly.react(divId, traces, layout, { responsive: true });
+}
+
+function plotSolar(divId, data, checks) {
+    let fields = checks.map(c => c.field);
+    if (fields.length === 0) {
+        Plotly.react(divId, [], BASE_LAYOUT, { responsive: true });
+        return;
+    }
+    let traces = [];
+    let keys = Object.keys(data);
+    let negFields = ['consumption_w', 'net_consumption_w', 'consumption_wh_today'];
+    let lineFields = ['production_w', 'consumption_w', 'net_consumption_w', 'production_peak_w'];
+    let hasW = fields.some(f => FIELD_CONFIG[f].unit === 'kW');
+    let hasKwh = fields.some(f => FIELD_CONFIG[f].unit === 'kWh');
+    let lineType = lineTraceType(data);
+
+    for (let key of keys) {
+        let { room, source } = parseKey(key);
+        let series = data[key];
+
+        fields.forEach((field) => {
+            if (!series.has[field]) return;
+            let cfg = FIELD_CONFIG[field];
+            let negate = negFields.includes(field);
+            let isLine = lineFields.includes(field);
+            let isW = cfg.unit === 'W';
+            let y = negate ? negated(series.cols[field]) : series.cols[field];
+
+            if (isLine) {
+                traces.push({
+                    x: series.t,
+                    y: y,
+                    name: cfg.label,
+                    type: lineType,
+                    mode: 'lines',
+                    line: { color: cfg.color, width: 2 },
+                    yaxis: 'y'
+                });
+            } else {
+                traces.push({
+                    x: series.t,
+                    y: y,
+                    name: cfg.label,
+                    type: 'bar',
+                    width: series.widths,
+                    offset: 0,
+                    marker: { color: cfg.color, opacity: 0.7 },
+                    yaxis: hasW ? 'y2' : 'y'
+                });
+            }
+        });
+    }
+
+    let layout = Object.assign({}, BASE_LAYOUT, {
+        barmode: 'overlay',
+    });
+
+    if (hasW && hasKwh) {
+        layout.yaxis = { title: 'kW', gridcolor: '#2a2a4a', side: 'left' };
+        layout.yaxis2 = { title: 'kWh', gridcolor: '#2a2a4a', side: 'right', overlaying: 'y' };
+    } else if (hasW) {
+        layout.yaxis = { title: 'kW', gridcolor: '#2a2a4a' };
+    } else {
+        layout.yaxis = { title: 'kWh', gridcolor: '#2a2a4a' };
+    }
+
+    Plotly.react(divId, traces, layout, { responsive: true });
+}
+
+function plotGeneric(divId, data, checks) {
+    let fields = checks.map(c => c.field);
+    if (fields.length === 0) {
+        Plotly.react(divId, [], BASE_LAYOUT, { responsive: true });
+        return;
+    }
+    let traces = [];
+    let keys = Object.keys(data);
+    let useSecondAxis = fields.length > 1;
+    let lineType = lineTraceType(data);
+
+    // Check how many distinct rooms have data for these fields
+    let roomsWithData = new Set();
+    for (let key of keys) {
+        let { room } = parseKey(key);
+        if (fields.some(f => data[key].has[f])) {
+            roomsWithData.add(room);
+        }
+    }
+    let singleRoom = roomsWithData.size === 1;
+
+    for (let key of keys) {
+        let { room, source } = parseKey(key);
+        let series = data[key];
+        let roomDash = SOURCE_STYLES[source] || 'solid';
+        fields.forEach((field, i) => {
+            if (!series.has[field]) return;
+            let cfg = FIELD_CONFIG[field];
+            let color = singleRoom ? cfg.color : (ROOM_COLORS[room] || '#fff');
+            let name = singleRoom ? cfg.label : (room + ' ' + source + ' ' + cfg.label);
+            traces.push({
+                x: series.t,
+                y: series.cols[field],
+                name: name,
+                type: lineType,
+                mode: 'lines',
+                line: { color: color, width: 2, dash: roomDash },
+                yaxis: (useSecondAxis && i > 0) ? 'y2' : 'y'
+            });
+        });
+    }
+
+    let firstCfg = FIELD_CONFIG[fields[0]];
+    let yTitle = firstCfg.label + (firstCfg.unit ? ' (' + firstCfg.unit + ')' : '');
+    let layout = Object.assign({}, BASE_LAYOUT, {
+        yaxis: { title: yTitle, gridcolor: '#2a2a4a', side: 'left' }
+    });
+
+    if (useSecondAxis) {
+        let otherLabels = fields.slice(1).map(f => {
+            let c = FIELD_CONFIG[f];
+            return c.label + (c.unit ? ' (' + c.unit + ')' : '');
+        });
+        layout.yaxis2 = {
+            title: otherLabels.join(' / '),
+            gridcolor: '#2a2a4a',
+            side: 'right',
+            overlaying: 'y'
+        };
+    }
+
+    Plotly.react(divId, traces, layout, { responsive: true });
+}
+
+function fmtVal(v, decimals) {
+    if (v == null) return '—';
+    return v.toFixed(decimals);
+}
+
+// Cards come from /api/summary: latest values for live views,
+// server-side range averages for custom ranges
+function updateCurrentValues(summary) {
+    let isLatest = !customStart;
+    let label = isLatest ? 'Latest' : 'Average';
+
+    // Group by room, merge sources
+    let rooms = {};
+    for (let key of Object.keys(summary)) {
+        let { room, source } = parseKey(key);
+        if (!rooms[room]) rooms[room] = {};
+        let stats = summary[key];
+        let vals = (isLatest ? stats.latest : stats.avg) || {};
+        rooms[room][source] = Object.assign({ timestamp: stats.timestamp }, vals);
+    }
+
+    // Sort: Outside first, then alphabetical
+    let roomOrder = Object.keys(rooms).sort((a, b) => {
+        let order = ['Outside', 'Solar'];
+        let ai = order.indexOf(a), bi = order.indexOf(b);
+        if (ai !== -1 && bi !== -1) return ai - bi;
+        if (ai !== -1) return -1;
+        if (bi !== -1) return -1;
+        return a.localeCompare(b);
+    });
+
+    let html = '';
+    let latestTime = '';
+    for (let room of roomOrder) {
+        let sources = rooms[room];
+        let color = ROOM_COLORS[room] || '#fff';
+        let metrics = '';
+        for (let [source, vals] of Object.entries(sources)) {
+            if (vals.timestamp) latestTime = new Date(vals.timestamp).toLocaleString('en-US', { timeZone: DISPLAY_TZ });
+            let sourceLabel = vals.timestamp ? `${source} (${label})` : `${source} (No data)`;
+            metrics += `<div class="source-label">${sourceLabel}</div>`;
+            if (source !== 'Enphase') {
+                metrics += `<div class="metric"><span>Temp</span><span class="value">${fmtVal(vals.temperature, 1)}°F</span></div>`;
+                metrics += `<div class="metric"><span>Humidity</span><span class="value">${fmtVal(vals.humidity, 0)}%</span></div>`;
+            }
+            if (source === 'Sensibo') {
+                metrics += `<div class="metric"><span>CO₂</span><span class="value">${fmtVal(vals.co2, 0)} ppm</span></div>`;
+                metrics += `<div class="metric"><span>TVOC</span><span class="value">${fmtVal(vals.tvoc, 0)} ppb</span></div>`;
+                metrics += `<div class="metric"><span>AQI/IAQ</span><span class="value">${fmtVal(vals.iaq, 0)}</span></div>`;
+            }
+            if (source === 'Enphase') {
+                metrics += `<div class="metric"><span>Production</span><span class="value">${fmtVal(vals.production_w, 2)} kW</span></div>`;
+                metrics += `<div class="metric"><span>Consumption</span><span class="value">${fmtVal(vals.consumption_w, 2)} kW</span></div>`;
+                metrics += `<div class="metric"><span>Net</span><span class="value">${fmtVal(vals.net_consumption_w, 2)} kW</span></div>`;
+                metrics += `<div class="metric"><span>Prod Today</span><span class="value">${fmtVal(vals.production_wh_today, 2)} kWh</span></div>`;
+                metrics += `<div class="metric"><span>Cons Today</span><span class="value">${fmtVal(vals.consumption_wh_today, 2)} kWh</span></div>`;
+            }
+            if (source === 'Weather') {
+                metrics += `<div class="metric"><span>AQI</span><span class="value">${fmtVal(vals.iaq, 0)}</span></div>`;
+                metrics += `<div class="metric"><span>Wind</span><span class="value">${fmtVal(vals.wind_speed, 1)} mph</span></div>`;
+                metrics += `<div class="metric"><span>Gust</span><span class="value">${fmtVal(vals.wind_gust, 1)} mph</span></div>`;
+                metrics += `<div class="metric"><span>Rain Rate</span><span class="value">${fmtVal(vals.precip_rate, 2)} in/hr</span></div>`;
+                metrics += `<div class="metric"><span>Rain Total</span><span class="value">${fmtVal(vals.precip_total, 2)} in</span></div>`;
+                metrics += `<div class="metric"><span>Pressure</span><span class="value">${fmtVal(vals.pressure, 2)} inHg</span></div>`;
+                metrics += `<div class="metric"><span>UV</span><span class="value">${fmtVal(vals.uv, 1)}</span></div>`;
+                metrics += `<div class="metric"><span>Solar</span><span class="value">${fmtVal(vals.solar_radiation, 0)} W/m²</span></div>`;
+            }
+        }
+        html += `
+            <div class="device-card" style="border-top: 3px solid ${color}">
+                <h3>${room}</h3>
+                ${metrics}
+            </div>
+        `;
+    }
+    document.getElementById('currentValues').innerHTML = html;
+    let timeLabel = isLatest ? 'Last reading: ' + latestTime : 'Showing average for selected range';
+    document.getElementById('lastUpdate').textContent = timeLabel;
+}
+
+fetchAndPlot();
+setInterval(fetchAndPlot, 60000);  // refresh every 60s
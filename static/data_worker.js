@@ -0,0 +1,100 @@
+// Fetches /api/data and reshapes rows into typed columns off the main thread.
+// Each series comes back as { n, t, widths, cols, has } where t is already
+// shifted to the display timezone and missing values are NaN.
+let tzOffset = null;
+
+// Custom ranges that ended this long ago never change (matches the server's
+// CLOSED_RANGE_GRACE_MS), so their responses are kept in IndexedDB
+const CLOSED_GRACE_MS = 15 * 60 * 1000;
+let cacheDb = null;
+
+function openCache() {
+    if (!cacheDb) {
+        cacheDb = new Promise(resolve => {
+            let req = indexedDB.open('guthome-cache', 1);
+            req.onupgradeneeded = () => req.result.createObjectStore('responses');
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => resolve(null);  // caching is best-effort
+        });
+    }
+    return cacheDb;
+}
+
+function cacheGet(url) {
+    return openCache().then(db => db && new Promise(resolve => {
+        let req = db.transaction('responses').objectStore('responses').get(url);
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => resolve(undefined);
+    }));
+}
+
+function cachePut(url, data) {
+    openCache().then(db => {
+        if (db) db.transaction('responses', 'readwrite').objectStore('responses').put(data, url);
+    });
+}
+
+function isClosedRange(url) {
+    let params = new URL(url, self.location.href).searchParams;
+    let end = Date.parse(params.get('end'));
+    return params.get('range') === 'custom' && end < Date.now() - CLOSED_GRACE_MS;
+}
+
+function fetchData(url) {
+    let closed = isClosedRange(url);
+    return (closed ? cacheGet(url) : Promise.resolve(undefined)).then(cached => {
+        if (cached) return cached;
+        return fetch(url).then(r => r.json()).then(data => {
+            if (closed) cachePut(url, data);
+            return data;
+        });
+    });
+}
+
+self.onmessage = (e) => {
+    let msg = e.data;
+    if (msg.init) {
+        importScripts(msg.init.timezoneUrl);
+        tzOffset = tzOffsetFn(msg.init.displayTz);
+        return;
+    }
+    fetchData(msg.url)
+        .then(data => {
+            let buffers = [];
+            let series = {};
+            for (let key of Object.keys(data)) {
+                series[key] = toColumns(data[key], buffers);
+            }
+            self.postMessage({ id: msg.id, series: series }, buffers);
+        })
+        .catch(err => self.postMessage({ id: msg.id, error: String(err) }));
+};
+
+function toColumns(rows, buffers) {
+    let n = rows.length;
+    let t = new Float64Array(n);
+    let widths = new Float64Array(n);
+    let cols = {};
+    let has = {};
+    for (let i = 0; i < n; i++) {
+        let row = rows[i];
+        t[i] = row.timestamp + tzOffset(row.timestamp);
+        for (let field in row) {
+            if (field === 'timestamp') continue;
+            if (!cols[field]) cols[field] = new Float64Array(n).fill(NaN);
+            if (row[field] != null) {
+                cols[field][i] = row[field];
+                has[field] = true;
+            }
+        }
+    }
+    // Bar widths from consecutive timestamps (ms)
+    for (let i = 0; i < n; i++) {
+        if (i < n - 1) widths[i] = rows[i + 1].timestamp - rows[i].timestamp;
+        else if (i > 0) widths[i] = rows[i].timestamp - rows[i - 1].timestamp;
+        else widths[i] = 300 * 1000;  // default 5 min
+    }
+    buffers.push(t.buffer, widths.buffer);
+    for (let field in cols) buffers.push(cols[field].buffer);
+    return { n: n, t: t, widths: widths, cols: cols, has: has };
+}
@@ -0,0 +1,21 @@
+// Shared by the page and the data worker.
+// Plotly draws epoch ms as UTC wall-clock, so each point is shifted by the
+// display timezone's offset. Offsets are cached per hour.
+function tzOffsetFn(timeZone) {
+    const parts = new Intl.DateTimeFormat('en-US', {
+        timeZone: timeZone, hourCycle: 'h23',
+        year: 'numeric', month: '2-digit', day: '2-digit',
+        hour: '2-digit', minute: '2-digit', second: '2-digit'
+    });
+    const cache = {};
+    return function (ms) {
+        let hour = Math.floor(ms / 3600000);
+        if (!(hour in cache)) {
+            let p = {};
+            parts.formatToParts(new Date(hour * 3600000)).forEach(x => p[x.type] = x.value);
+            let wall = Date.UTC(+p.year, +p.month - 1, +p.day, +p.hour, +p.minute, +p.second);
+            cache[hour] = wall - hour * 3600000;
+        }
+        return cache[hour];
+    };
+}
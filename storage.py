@@ -0,0 +1,362 @@
+"""Optional narrow storage engine: every source in one samples table.
+
+With STORAGE_ENGINE = "narrow" readings are stored as (series_id, ts, value)
+rows in a WITHOUT ROWID table clustered on (series_id, ts). The series table
+dictionary-encodes each source/room/metric to an integer id, nulls are not
+stored at all, and identity columns (device_id, mac, station_id) are dropped
+in favour of the room. One generic query path then serves every source.
+
+    python storage.py migrate [--purge]   copy the per-source tables across,
+                                          optionally emptying them after
+"""
+import sqlite3
+import sys
+import threading
+
+import config
+import derived
+import migrations
+import queries
+import sites
+
+IDENTITY_COLUMNS = {"id", "timestamp", "room_name", "device_id", "mac", "station_id"}
+COPY_BATCH_ROWS = 5000
+
+_series_ids = {}
+_listeners = []
+_commit_listeners = []
+_local = threading.local()
+
+
+def narrow():
+    return sites.setting("STORAGE_ENGINE", "tables") == "narrow"
+
+
+def source_for(table):
+    return next(s for s in queries.SOURCES if s["table"] == table)
+
+
+def series_id(conn, source_name, room, metric):
+    key = (source_name, room, metric)
+    sid = _series_ids.get(key)
+    if sid is None:
+        conn.execute("INSERT OR IGNORE INTO series (source, room, metric) VALUES (?, ?, ?)", key)
+        sid = conn.execute(
+            "SELECT id FROM series WHERE source = ? AND room = ? AND metric = ?", key
+        ).fetchone()[0]
+        _series_ids[key] = sid
+    return sid
+
+
+def add_listener(fn):
+    """Call fn(table, columns, rows) after every batch is stored."""
+    _listeners.append(fn)
+
+
+def add_commit_listener(fn):
+    """Call fn() after every commit made through commit()."""
+    _commit_listeners.append(fn)
+
+
+def connection():
+    """Connection this thread last stored through or committed, for listeners.
+
+    Rows a store listener saw belong to the commit of the same connection; a
+    store on another one means the earlier transaction was abandoned.
+    """
+    return getattr(_local, "conn", None)
+
+
+def commit(conn):
+    conn.commit()
+    _local.conn = conn
+    for fn in _commit_listeners:
+        fn()
+
+
+def store_many(conn, table, columns, rows):
+    """Insert rows of a per-source table under the configured engine.
+
+    The caller commits, so a batch can share one transaction.
+    """
+    columns, rows = derived.extend(conn, table, list(columns), rows)
+    if narrow():
+        _store_samples(conn, table, columns, rows)
+    else:
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+    _local.conn = conn
+    for fn in _listeners:
+        fn(table, columns, rows)
+
+
+def number(value):
+    """value as int or float; text would stay text in samples.value, which has no affinity."""
+    if not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _store_samples(conn, table, columns, rows):
+    source = source_for(table)
+    ts_index = columns.index("timestamp")
+    room_index = columns.index(source["room_col"]) if "room_col" in source else None
+    metrics = [(i, col) for i, col in enumerate(columns) if col not in IDENTITY_COLUMNS]
+    samples = []
+    for row in rows:
+        ts = queries.iso_to_ms(row[ts_index])
+        room = row[room_index] if room_index is not None else source["room"]
+        for i, metric in metrics:
+            if row[i] is not None:
+                samples.append((series_id(conn, source["name"], room, metric), ts, number(row[i])))
+    conn.executemany(
+        "INSERT OR REPLACE INTO samples (series_id, ts, value) VALUES (?, ?, ?)", samples
+    )
+
+
+def store(conn, table, row):
+    """Insert one reading given as {column: value}."""
+    store_many(conn, table, row.keys(), [tuple(row.values())])
+
+
+def _ts_range(since, until):
+    clauses = ""
+    params = []
+    if since is not None:
+        clauses += " AND x.ts >= ?"
+        params.append(queries.iso_to_ms(since))
+    if until is not None:
+        clauses += " AND x.ts < ?"
+        params.append(queries.iso_to_ms(until))
+    return clauses, params
+
+
+def reading_times(table, since, by_room):
+    """SQL and params selecting (k, ts) for each stored reading of a table.
+
+    k is the room, or '' when by_room is false; ts is epoch ms.
+    """
+    key = "s.room" if by_room else "''"
+    return (
+        f"""SELECT DISTINCT {key} AS k, x.ts AS ts
+            FROM series s JOIN samples x ON x.series_id = s.id AND x.ts >= ?
+            WHERE s.source = ?""",
+        [queries.iso_to_ms(since), source_for(table)["name"]],
+    )
+
+
+def max_value(conn, source_name, metric, since, until):
+    """Largest stored value of one metric across a source's rooms."""
+    ts_clause, ts_params = _ts_range(since, until)
+    return conn.execute(
+        f"""SELECT MAX(x.value) FROM series s JOIN samples x ON x.series_id = s.id{ts_clause}
+            WHERE s.source = ? AND s.metric = ?""",
+        ts_params + [source_name, metric],
+    ).fetchone()[0]
+
+
+def _metric_fields(source, fields):
+    return {source["fields"][f][0]: (f, source["fields"][f][1]) for f in fields}
+
+
+def fetch_series(conn, since, until, wanted, bucket_ms=None, raw=False):
+    """queries.fetch_series over the samples table."""
+    ts_clause, ts_params = _ts_range(since, until)
+    result = {}
+    for source in queries.enabled_sources():
+        fields = wanted.get(source["name"])
+        if not fields:
+            continue
+        metric_fields = _metric_fields(source, fields)
+        in_list = ", ".join("?" * len(metric_fields))
+        if bucket_ms:
+            sql = f"""SELECT s.room, s.metric, x.ts / {int(bucket_ms)} AS k, MIN(x.ts), AVG(x.value)
+                      FROM series s JOIN samples x ON x.series_id = s.id{ts_clause}
+                      WHERE s.source = ? AND s.metric IN ({in_list})
+                      GROUP BY s.id, k ORDER BY k"""
+        else:
+            sql = f"""SELECT s.room, s.metric, x.ts, x.ts, x.value
+                      FROM series s JOIN samples x ON x.series_id = s.id{ts_clause}
+                      WHERE s.source = ? AND s.metric IN ({in_list})
+                      ORDER BY x.ts"""
+        params = ts_params + [source["name"], *metric_fields]
+        suffix = "|" + source["name"]
+        by_key = {}
+        for room, metric, k, ts, value in conn.execute(sql, params):
+            points = by_key.setdefault(room + suffix, {})
+            point = points.get(k)
+            if point is None:
+                point = points[k] = {"timestamp": ts, **dict.fromkeys(fields)}
+            elif ts < point["timestamp"]:
+                point["timestamp"] = ts
+            field, convert = metric_fields[metric]
+            point[field] = convert(value) if convert and not raw else value
+        for key, points in by_key.items():
+            result[key] = list(points.values())
+    return result
+
+
+def iter_rows(source, columns, since=None, until=None, chunk_rows=5000):
+    """export.iter_chunks over the samples table, keyset-paged on ts."""
+    ts_clause, ts_params = _ts_range(since, until)
+    in_list = ", ".join("?" * len(columns))
+    index = {col: i for i, col in enumerate(columns)}
+    limit = chunk_rows * len(columns)
+    conn = sqlite3.connect(f"file:{queries.db_path()}?mode=ro", uri=True)
+    try:
+        last = None
+        while True:
+            after = " AND x.ts > ?" if last is not None else ""
+            rows = conn.execute(
+                f"""SELECT s.room, x.ts, s.metric, x.value
+                    FROM series s JOIN samples x ON x.series_id = s.id{ts_clause}{after}
+                    WHERE s.source = ? AND s.metric IN ({in_list})
+                    ORDER BY x.ts, s.room LIMIT ?""",
+                ts_params + ([last] if last is not None else [])
+                + [source["name"], *columns, limit],
+            ).fetchall()
+            newest = rows[-1][1] if rows else None
+            if len(rows) == limit and rows[0][1] != newest:
+                # The newest timestamp may continue on the next page
+                rows = [r for r in rows if r[1] != newest]
+            if not rows:
+                break
+            pivoted = {}
+            for room, ts, metric, value in rows:
+                record = pivoted.get((room, ts))
+                if record is None:
+                    record = pivoted[(room, ts)] = [room, ts] + [None] * len(columns)
+                record[2 + index[metric]] = value
+            yield list(pivoted.values())
+            last = rows[-1][1]
+    finally:
+        conn.close()
+
+
+def summarize(conn, since=None, until=None):
+    """queries.summarize over the samples table.
+
+    Latest is each metric's newest stored value, and count is the largest
+    per-metric sample count for the room.
+    """
+    ts_clause, ts_params = _ts_range(since, until)
+    result = {}
+    for source in queries.enabled_sources():
+        fields = source["fields"]
+        metric_fields = _metric_fields(source, fields)
+        in_list = ", ".join("?" * len(metric_fields))
+        rows = conn.execute(
+            f"""WITH agg AS (
+                    SELECT s.id, s.room, s.metric, SUM(x.value) AS total,
+                           COUNT(x.value) AS cnt, MIN(x.value) AS lo,
+                           MAX(x.value) AS hi, MAX(x.ts) AS last_ts
+                    FROM series s JOIN samples x ON x.series_id = s.id{ts_clause}
+                    WHERE s.source = ? AND s.metric IN ({in_list})
+                    GROUP BY s.id
+                )
+                SELECT agg.room, agg.metric, agg.total, agg.cnt, agg.lo, agg.hi,
+                       agg.last_ts, x.value
+                FROM agg JOIN samples x ON x.series_id = agg.id AND x.ts = agg.last_ts""",
+            ts_params + [source["name"], *metric_fields],
+        ).fetchall()
+        for room, metric, total, cnt, lo, hi, last_ts, latest in rows:
+            entry = result.setdefault(room + "|" + source["name"], {
+                "timestamp": last_ts,
+                "count": 0,
+                **{stat: dict.fromkeys(fields) for stat in ("latest", "avg", "min", "max")},
+            })
+            entry["timestamp"] = max(entry["timestamp"], last_ts)
+            entry["count"] = max(entry["count"], cnt)
+            field, convert = metric_fields[metric]
+            for stat, value in (
+                ("latest", latest), ("avg", total / cnt if cnt else None),
+                ("min", lo), ("max", hi),
+            ):
+                entry[stat][field] = convert(value) if convert else value
+    return result
+
+
+def known_keys(conn):
+    names = [s["name"] for s in queries.enabled_sources()]
+    rows = conn.execute(
+        f"SELECT DISTINCT source, room FROM series WHERE source IN ({', '.join('?' * len(names))})",
+        names,
+    ).fetchall()
+    rows.sort(key=lambda row: (names.index(row[0]), row[1]))
+    return [room + "|" + source for source, room in rows]
+
+
+def data_version(conn):
+    """Series count and newest sample time; one index probe per series.
+
+    Unlike the row-id version this misses backfilled past rows, which show
+    up with the next collector poll instead.
+    """
+    return tuple(conn.execute(
+        "SELECT COUNT(*), MAX((SELECT MAX(ts) FROM samples WHERE series_id = s.id)) FROM series s"
+    ).fetchone())
+
+
+def oldest(conn):
+    return conn.execute(
+        "SELECT MIN((SELECT MIN(ts) FROM samples WHERE series_id = s.id)) FROM series s"
+    ).fetchone()[0]
+
+
+def copy_batch(conn, table, after_id, limit=COPY_BATCH_ROWS):
+    """Copy the next `limit` rows with id > after_id into samples.
+
+    Returns the last id copied, or None when nothing is left; the caller
+    commits.
+    """
+    last_id = conn.execute(
+        f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)",
+        (after_id, limit),
+    ).fetchone()[0]
+    if last_id is None:
+        return None
+    source = source_for(table)
+    room = queries.room_sql(source)
+    for metric in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+        if metric in IDENTITY_COLUMNS:
+            continue
+        conn.execute(
+            f"""INSERT OR IGNORE INTO series (source, room, metric)
+                SELECT DISTINCT ?, {room}, ? FROM {table}
+                WHERE id > ? AND id <= ? AND {metric} IS NOT NULL""",
+            (source["name"], metric, after_id, last_id),
+        )
+        conn.execute(
+            f"""INSERT OR REPLACE INTO samples (series_id, ts, value)
+                SELECT s.id, {queries.epoch_ms_sql('t.timestamp')}, t.{metric}
+                FROM {table} t JOIN series s
+                  ON s.source = ? AND s.room = {room} AND s.metric = ?
+                WHERE t.id > ? AND t.id <= ? AND t.{metric} IS NOT NULL""",
+            (source["name"], metric, after_id, last_id),
+        )
+    return last_id
+
+
+def migrate(purge=False):
+    """Copy every per-source table into series/samples, then optionally empty them."""
+    migrations.migrate()
+    migrations.run_online("copy_to_samples", pause=0)
+    if purge:
+        conn = sqlite3.connect(config.DB_PATH)
+        for source in queries.SOURCES:
+            conn.execute(f"DELETE FROM {source['table']}")
+            conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["migrate"]:
+        raise SystemExit("usage: python storage.py migrate [--purge]")
+    migrate(purge="--purge" in sys.argv)
@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The modules read settings from config.py, which is local to each install;
+# tests run against a bare module and set what they need per test.
+config = types.ModuleType("config")
+sys.modules["config"] = config
+config.ENPHASE_HOST = "127.0.0.1"  # read when solar_collector is imported
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Connection to a freshly migrated database under tmp_path."""
+    import migrations
+    import storage
+
+    monkeypatch.setattr(config, "DB_PATH", str(tmp_path / "test.db"), raising=False)
+    monkeypatch.setattr(storage, "_series_ids", {})  # ids belong to one database
+    migrations.migrate()
+    conn = sqlite3.connect(config.DB_PATH)
+    yield conn
+    conn.close()
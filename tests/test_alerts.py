@@ -0,0 +1,19 @@
+import time
+
+import alerts
+import queries
+import storage
+
+
+def test_seed_silence_starts_from_stored_readings(db, monkeypatch):
+    rule = alerts.Rule({"name": "Solar silent", "source": "Enphase", "silent_minutes": 60})
+    monkeypatch.setattr(alerts, "_rules", [rule])
+    last = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - 600))
+    storage.store(db, "solar_readings", {"timestamp": last, "production_w": 1200.0})
+    storage.commit(db)
+
+    alerts.seed_silence()
+
+    assert rule.state["Solar"]["last"] == queries.iso_to_ms(last)
+    assert rule.check_silence(time.time() * 1000) == []
+    assert rule.check_silence(time.time() * 1000 + 3600 * 1000) == [("Solar", "firing")]
@@ -0,0 +1,46 @@
+import pytest
+
+import archive
+import storage
+
+pytest.importorskip("numpy")
+
+COLUMNS = ("timestamp", "device_id", "room_name", "temperature", "humidity")
+ROWS = [
+    ("2024-01-01T00:00:00Z", "abc", "Den", 21.0, 40.0),
+    ("2024-01-01T00:00:00Z", "def", "Bedroom", 19.0, 45.0),
+    ("2024-01-01T00:05:00Z", "abc", "Den", 21.2, 40.5),
+]
+
+
+def test_export_month_after_lost_delete_keeps_one_copy(db, tmp_path, monkeypatch):
+    import config
+
+    monkeypatch.setattr(config, "ARCHIVE_DIR", str(tmp_path / "archive"), raising=False)
+    storage.store_many(db, "readings", COLUMNS, ROWS)
+    db.commit()
+    assert archive.export_month(db, "readings", "2024-01") == 3
+
+    # A crash between the file swap and the DELETE leaves the rows in both
+    storage.store_many(db, "readings", COLUMNS, ROWS)
+    db.commit()
+    assert archive.export_month(db, "readings", "2024-01") == 3
+
+    assert db.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 0
+    data = archive.load_month("readings", "2024-01")
+    rooms = archive._decode(data["meta"], "room_name", data["cols"]["room_name"][:])
+    assert sorted(zip(data["ts"].tolist(), rooms)) == [
+        (1704067200000, "Bedroom"), (1704067200000, "Den"), (1704067500000, "Den"),
+    ]
+
+
+def test_export_month_appends_new_rows(db, tmp_path, monkeypatch):
+    import config
+
+    monkeypatch.setattr(config, "ARCHIVE_DIR", str(tmp_path / "archive"), raising=False)
+    storage.store_many(db, "readings", COLUMNS, ROWS[:2])
+    db.commit()
+    archive.export_month(db, "readings", "2024-01")
+    storage.store_many(db, "readings", COLUMNS, ROWS[2:])
+    db.commit()
+    assert archive.export_month(db, "readings", "2024-01") == 3
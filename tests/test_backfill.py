@@ -0,0 +1,117 @@
+import pytest
+
+import backfill
+import derived
+
+CSVS = {
+    "readings": (
+        "timestamp,device_id,room_name,temperature,humidity,co2,tvoc,iaq\n"
+        "2024-01-01T00:00:00Z,abc,Den,21.5,45,600,120,50\n"
+        "2024-01-01T00:05:00Z,abc,Den,21.7,,610,,\n"
+    ),
+    "govee_readings": (
+        "timestamp,mac,room_name,temperature,humidity\n"
+        "2024-01-01T00:00:00Z,A4:C1:38:00:00:00,Loft,18.2,55.5\n"
+    ),
+    "weather_readings": (
+        "timestamp,station_id,temperature,humidity,wind_dir,pressure\n"
+        "2024-01-01T00:00:00Z,KTEST1,85,60,270,29.9\n"
+    ),
+    "solar_readings": (
+        "timestamp,production_w,consumption_w,net_consumption_w\n"
+        "2024-01-01T18:00:00Z,3000,1200,-1800\n"
+        "2024-01-01T18:05:00Z,3500,1000,-2500\n"
+    ),
+}
+
+
+@pytest.mark.parametrize("table", sorted(CSVS))
+def test_import_csv_stores_numbers(db, tmp_path, table):
+    path = tmp_path / f"{table}.csv"
+    path.write_text(CSVS[table])
+
+    rows = len(CSVS[table].splitlines()) - 1
+    assert backfill.import_csv(db, table, str(path)) == rows
+
+    header = CSVS[table].splitlines()[0].split(",")
+    numeric = [c for c in header if c not in ("timestamp", "device_id", "room_name", "mac", "station_id")]
+    types = db.execute(
+        f"SELECT {', '.join(f'typeof({c})' for c in numeric)} FROM {table}"
+    ).fetchall()
+    assert all(t in ("integer", "real", "null") for row in types for t in row)
+
+
+def test_import_csv_fills_derived_columns(db, tmp_path, monkeypatch):
+    monkeypatch.setitem(derived._peak, "day", None)  # running state of earlier tests
+    path = tmp_path / "solar.csv"
+    path.write_text(CSVS["solar_readings"])
+    backfill.import_csv(db, "solar_readings", str(path))
+    peaks = [row[0] for row in db.execute(
+        "SELECT production_peak_today_w FROM solar_readings ORDER BY timestamp"
+    )]
+    assert peaks == [3000, 3500]
+
+
+def test_import_csv_rejects_text_in_numeric_column(db, tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("timestamp,mac,room_name,temperature,humidity\n2024-01-01T00:00:00Z,m,Loft,warm,50\n")
+    with pytest.raises(SystemExit, match="line 2"):
+        backfill.import_csv(db, "govee_readings", str(path))
+
+
+@pytest.mark.parametrize("engine", ["tables", "narrow"])
+def test_insert_rows_seeds_peak_inside_large_transaction(db, monkeypatch, engine):
+    import config
+
+    monkeypatch.setattr(config, "STORAGE_ENGINE", engine, raising=False)
+    monkeypatch.setitem(derived._peak, "day", None)
+    db.execute("PRAGMA cache_size = 100")  # spill the open transaction to disk early
+    start = 1704067200000  # 2024-01-01T00:00:00Z
+    rows = [
+        (backfill.ms_to_iso(start + i * 300000), 1000.0 + i % 288, 500.0, 0.0)
+        for i in range(60 * 288)
+    ]
+    backfill.insert_rows(
+        db, "solar_readings", ("timestamp", "production_w", "consumption_w", "net_consumption_w"), rows
+    )
+    db.commit()
+    assert derived._peak["value"] == 1287.0
+
+
+def test_narrow_engine_stores_csv_values_as_numbers(db, tmp_path, monkeypatch):
+    import config
+    import queries
+
+    monkeypatch.setattr(config, "STORAGE_ENGINE", "narrow", raising=False)
+    path = tmp_path / "readings.csv"
+    path.write_text(CSVS["readings"])
+    backfill.import_csv(db, "readings", str(path))
+
+    assert {row[0] for row in db.execute("SELECT typeof(value) FROM samples")} <= {"integer", "real"}
+    series = queries.fetch_series(
+        db, "2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", {"Sensibo": ["temperature"]}, raw=True
+    )
+    assert [p["temperature"] for p in series["Den|Sensibo"]] == [21.5, 21.7]
+
+
+@pytest.mark.parametrize("engine", ["tables", "narrow"])
+def test_find_gaps(db, monkeypatch, engine):
+    import config
+
+    monkeypatch.setattr(config, "STORAGE_ENGINE", engine, raising=False)
+    start = backfill.now_ms() - 3600 * 1000
+    minutes = [0, 5, 10, 40, 45]  # a 30-minute hole, then nothing for the last 15
+    rows = [
+        (backfill.ms_to_iso(start + m * 60000), "abc", "Den", 21.0, 40.0) for m in minutes
+    ]
+    backfill.insert_rows(
+        db, "readings", ("timestamp", "device_id", "room_name", "temperature", "humidity"), rows
+    )
+    db.commit()
+
+    gaps = backfill.find_gaps(db, "readings", backfill.ms_to_iso(start), 600, key_col="room_name")
+
+    assert list(gaps) == ["Den"]
+    (hole_start, hole_end), (tail_start, _) = gaps["Den"]
+    assert (hole_end - hole_start) // 60000 == 30
+    assert tail_start // 1000 == (start + 45 * 60000) // 1000
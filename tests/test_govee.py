@@ -0,0 +1,25 @@
+import pytest
+
+from govee_collector import decode_govee
+from mqtt_bridge import encode_h5074, parse_advert
+
+
+@pytest.mark.parametrize("mfr_data, expected", [
+    ({0xEC88: encode_h5074(21.5, 45)}, ("H5074", 21.5, 45.0)),
+    ({0xEC88: bytes.fromhex("0003499c64")}, None),  # no model sends 5 bytes
+    ({0xEC88: bytes.fromhex("010001016608941164")}, None),  # H5179 layout, wrong company id
+    ({0xEC88: bytes.fromhex("0003499c6400")}, ("H5072/H5075", 21.5, 45.2)),
+    ({0x8801: bytes.fromhex("010001016608941164")}, ("H5179", 21.5, 45.0)),
+    ({0x0001: bytes.fromhex("010103499c64")}, ("H5100/H5101/H5102/H5104/H5174/H5177", 21.5, 45.2)),
+])
+def test_decode_govee(mfr_data, expected):
+    assert decode_govee(mfr_data) == expected
+
+
+def test_docstring_adverts_decode_as_h5074():
+    import mqtt_bridge
+
+    for line in mqtt_bridge.__doc__.splitlines():
+        if line.strip().startswith("{"):
+            _, mfr_data = parse_advert(line.strip())
+            assert decode_govee(mfr_data) == ("H5074", 21.5, 45.0)
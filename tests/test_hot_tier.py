@@ -0,0 +1,77 @@
+import time
+
+import backfill
+import hot_tier
+import queries
+import storage
+
+COLUMNS = ("timestamp", "device_id", "room_name", "temperature", "humidity")
+
+
+def iso(ms):
+    return backfill.ms_to_iso(ms)
+
+
+def test_sync_reloads_rows_backfilled_by_another_process(db, monkeypatch):
+    for name, value in (("_series", {}), ("_covered_since", None), ("_inserted", None),
+                        ("_following", False)):
+        monkeypatch.setattr(hot_tier, name, value)
+    monkeypatch.setattr(storage, "_listeners", [])
+    monkeypatch.setattr(storage, "_commit_listeners", [])
+    now = int(time.time() * 1000)
+    storage.store_many(db, "readings", COLUMNS, [(iso(now - 3600000), "abc", "Den", 21.0, 40.0)])
+    storage.commit(db)
+    hot_tier.rebuild()
+
+    # backfill.py runs in its own process, so no listener sees its rows
+    monkeypatch.setattr(storage, "_listeners", [])
+    backfill.insert_rows(db, "readings", COLUMNS, [(iso(now - 1800000), "abc", "Den", 22.0, 41.0)])
+    db.commit()
+    since = iso(now - 7200000)
+    assert len(hot_tier.fetch_series(since, None, {"Sensibo": ["temperature"]})["Den|Sensibo"]) == 1
+
+    conn = queries.connect()
+    hot_tier.sync(conn)
+    conn.close()
+
+    points = hot_tier.fetch_series(since, None, {"Sensibo": ["temperature"]}, raw=True)["Den|Sensibo"]
+    assert [p["temperature"] for p in points] == [21.0, 22.0]
+
+
+def test_rolled_back_rows_never_reach_memory(db, monkeypatch):
+    for name, value in (("_series", {}), ("_covered_since", None), ("_inserted", None),
+                        ("_following", False)):
+        monkeypatch.setattr(hot_tier, name, value)
+    monkeypatch.setattr(storage, "_listeners", [])
+    monkeypatch.setattr(storage, "_commit_listeners", [])
+    hot_tier.rebuild()
+    now = int(time.time() * 1000)
+
+    failed = queries.connect()
+    storage.store_many(failed, "readings", COLUMNS, [(iso(now - 600000), "abc", "Den", 30.0, 40.0)])
+    failed.rollback()
+    failed.close()
+    storage.store_many(db, "readings", COLUMNS, [(iso(now - 300000), "abc", "Den", 21.0, 40.0)])
+    since = iso(now - 3600000)
+    assert hot_tier.fetch_series(since, None, {"Sensibo": ["temperature"]}) == {}
+    storage.commit(db)
+
+    points = hot_tier.fetch_series(since, None, {"Sensibo": ["temperature"]}, raw=True)["Den|Sensibo"]
+    assert [p["temperature"] for p in points] == [21.0]
+
+
+def test_commit_checks_backfill_mark_without_new_connections(db, monkeypatch):
+    for name, value in (("_series", {}), ("_covered_since", None), ("_inserted", None),
+                        ("_following", False)):
+        monkeypatch.setattr(hot_tier, name, value)
+    monkeypatch.setattr(storage, "_listeners", [])
+    monkeypatch.setattr(storage, "_commit_listeners", [])
+    hot_tier.rebuild()
+
+    def no_connect():
+        raise AssertionError("opened a connection on commit")
+    monkeypatch.setattr(queries, "connect", no_connect)
+    now = int(time.time() * 1000)
+    for minutes in (10, 5):
+        storage.store_many(db, "readings", COLUMNS, [(iso(now - minutes * 60000), "abc", "Den", 21.0, 40.0)])
+        storage.commit(db)
@@ -0,0 +1,25 @@
+import importlib
+
+import config
+import scheduler
+import storage
+
+
+def test_listener_registered_only_by_start(monkeypatch):
+    monkeypatch.setattr(storage, "_listeners", [])
+    monkeypatch.setattr(scheduler, "_following", False)
+    monkeypatch.setattr(config, "ADAPTIVE_POLLING", True, raising=False)
+    importlib.reload(scheduler)
+    assert storage._listeners == []
+
+    scheduler.start()
+    scheduler.start()
+    assert storage._listeners == [scheduler.on_store]
+
+
+def test_start_does_nothing_when_disabled(monkeypatch):
+    monkeypatch.setattr(storage, "_listeners", [])
+    monkeypatch.setattr(scheduler, "_following", False)
+    monkeypatch.setattr(config, "ADAPTIVE_POLLING", False, raising=False)
+    scheduler.start()
+    assert storage._listeners == []
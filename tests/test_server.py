@@ -0,0 +1,39 @@
+import pytest
+
+import server
+
+
+def test_closed_range_needs_both_bounds():
+    with server.app.test_request_context("/api/data?range=custom&end=2020-01-01T00:00:00Z"):
+        assert server.closed_range_key() is None
+    with server.app.test_request_context(
+        "/api/data?range=custom&start=garbage&end=2020-01-01T00:00:00Z"
+    ):
+        assert server.closed_range_key() is None
+    with server.app.test_request_context(
+        "/api/data?range=custom&start=2019-12-01T00:00:00Z&end=2020-01-01T00:00:00Z"
+    ):
+        assert server.closed_range_key() is not None
+
+
+def test_page_loads_vendored_plotly():
+    page = server.app.test_client().get("/").data.decode()
+    assert "/assets/vendor/plotly.min." in page
+    assert server.PLOTLY_CDN_URL not in page
+
+
+@pytest.mark.parametrize("engine", ["tables", "narrow"])
+@pytest.mark.parametrize("url", [
+    "/api/data?range=custom&start=garbage&end=2020-01-01T00:00:00Z",
+    "/api/data?range=custom&start=2019-12-01T00:00:00Z&end=garbage&points=100",
+    "/api/summary?range=custom&start=garbage&end=2020-01-01T00:00:00Z",
+    "/api/join?range=custom&start=garbage&end=2020-01-01T00:00:00Z&series=Den|Sensibo:temperature",
+    "/api/export?source=Sensibo&start=garbage",
+])
+def test_bad_range_bounds_are_rejected(db, monkeypatch, tmp_path, engine, url):
+    import config
+
+    monkeypatch.setattr(config, "STORAGE_ENGINE", engine, raising=False)
+    monkeypatch.setattr(config, "RESPONSE_CACHE_DIR", str(tmp_path / "rc"), raising=False)
+    assert server.app.test_client().get(url).status_code == 400
+    assert not (tmp_path / "rc").exists() or not list((tmp_path / "rc").iterdir())
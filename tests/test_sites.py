@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+import sites
+
+
+@pytest.fixture
+def cabin(tmp_path, monkeypatch):
+    """Write a Cabin site config and register it; returns its path."""
+    import config
+
+    monkeypatch.setattr(sites, "_configs", {})
+    path = tmp_path / "cabin_config.py"
+    monkeypatch.setattr(config, "SITES", {"Cabin": str(path)}, raising=False)
+    return path
+
+
+def test_extra_site_archives_beside_its_database(db, tmp_path, cabin):
+    cabin.write_text(f"DB_PATH = {str(tmp_path / 'cabin.db')!r}\n")
+    assert sites.site_config("Cabin").ARCHIVE_DIR == str(tmp_path / "cabin-archive")
+    with sites.use("Cabin"):
+        assert sites.setting("ARCHIVE_DIR") != "archive"
+
+
+@pytest.mark.parametrize("setting", ["DB_PATH", "ARCHIVE_DIR"])
+def test_extra_site_cannot_share_primary_paths(db, tmp_path, cabin, setting):
+    import config
+
+    values = {"DB_PATH": str(tmp_path / "cabin.db"), "ARCHIVE_DIR": str(tmp_path / "cabin-archive")}
+    values[setting] = getattr(config, setting, "archive")
+    if setting == "ARCHIVE_DIR":
+        values[setting] = os.path.relpath(os.path.abspath(values[setting]))  # same dir, other spelling
+    cabin.write_text("".join(f"{k} = {v!r}\n" for k, v in values.items()))
+    with pytest.raises(ValueError, match=setting):
+        sites.site_config("Cabin")
@@ -0,0 +1,72 @@
+"""Ready-made responses for the preset ranges.
+
+The first request for a preset range (1h ... 1y) registers a builder here.
+After every collector commit the cached bodies are dropped and a background
+thread rebuilds and pre-compresses each registered response, so dashboard
+refreshes are served from memory without touching the database.
+"""
+import threading
+from collections import OrderedDict
+
+import storage
+
+MAX_ENTRIES = 32
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> {"build": fn, "built": None or (etag, bodies)}
+_dirty = threading.Event()
+_generation = 0  # bumped by every commit
+
+
+def get(key):
+    """(etag, {encoding: body}) for a built response, else None."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        _entries.move_to_end(key)
+        return entry["built"]
+
+
+def track(key, build):
+    """Keep `key` warm; build() returns (etag, {encoding: body})."""
+    with _lock:
+        if key not in _entries:
+            _entries[key] = {"build": build, "built": None}
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+    _dirty.set()
+
+
+def on_commit():
+    global _generation
+    with _lock:
+        _generation += 1
+        for entry in _entries.values():
+            entry["built"] = None
+    _dirty.set()
+
+
+def rebuild_all():
+    with _lock:
+        generation = _generation
+        pending = [(k, e) for k, e in _entries.items() if e["built"] is None]
+    for key, entry in pending:
+        try:
+            built = entry["build"]()
+        except Exception as e:
+            print(f"Error warming {key}: {e}")
+            continue
+        with _lock:
+            # A commit during the build makes it stale; the next pass redoes it
+            if _entries.get(key) is entry and _generation == generation:
+                entry["built"] = built
+
+
+def run_warmer():
+    storage.add_commit_listener(on_commit)
+    print("Response warmer started")
+    while True:
+        _dirty.wait()
+        _dirty.clear()
+        rebuild_all()
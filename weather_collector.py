@@ -4,41 +4,18 @@ import time
 import requests
 
 import config
+import migrations
+import profiler
+import scheduler
+import storage
 
-WU_API_URL = "https://api.weather.com/v2/pws/observations/current"
+WU_API_URL = getattr(config, "WU_API_URL", "https://api.weather.com/v2/pws/observations/current")
 WU_API_KEY = "6532d6454b8aa370768e63d6ba5a832e"
-AQI_API_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+AQI_API_URL = getattr(config, "AQI_API_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
 
 
 def init_weather_db():
-    conn = sqlite3.connect(config.DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS weather_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            station_id TEXT NOT NULL,
-            temperature REAL,
-            humidity REAL,
-            dewpoint REAL,
-            wind_speed REAL,
-            wind_gust REAL,
-            wind_dir INTEGER,
-            pressure REAL,
-            precip_rate REAL,
-            precip_total REAL,
-            solar_radiation REAL,
-            uv REAL,
-            aqi INTEGER,
-            pm25 REAL,
-            pm10 REAL
-        )
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_weather_timestamp
-        ON weather_readings (timestamp)
-    """)
-    conn.commit()
-    conn.close()
+    migrations.migrate()
 
 
 def get_aqi(lat, lon):
@@ -77,33 +54,25 @@ def collect_weather_once():
     aqi, pm25, pm10 = get_aqi(obs["lat"], obs["lon"])
 
     conn = sqlite3.connect(config.DB_PATH)
-    conn.execute(
-        """INSERT INTO weather_readings
-           (timestamp, station_id, temperature, humidity, dewpoint,
-            wind_speed, wind_gust, wind_dir, pressure,
-            precip_rate, precip_total, solar_radiation, uv,
-            aqi, pm25, pm10)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (
-            obs["obsTimeUtc"],
-            obs["stationID"],
-            imp["temp"],
-            obs["humidity"],
-            imp["dewpt"],
-            imp["windSpeed"],
-            imp["windGust"],
-            obs["winddir"],
-            imp["pressure"],
-            imp["precipRate"],
-            imp["precipTotal"],
-            obs.get("solarRadiation"),
-            obs.get("uv"),
-            aqi,
-            pm25,
-            pm10,
-        ),
-    )
-    conn.commit()
+    storage.store(conn, "weather_readings", {
+        "timestamp": obs["obsTimeUtc"],
+        "station_id": obs["stationID"],
+        "temperature": imp["temp"],
+        "humidity": obs["humidity"],
+        "dewpoint": imp["dewpt"],
+        "wind_speed": imp["windSpeed"],
+        "wind_gust": imp["windGust"],
+        "wind_dir": obs["winddir"],
+        "pressure": imp["pressure"],
+        "precip_rate": imp["precipRate"],
+        "precip_total": imp["precipTotal"],
+        "solar_radiation": obs.get("solarRadiation"),
+        "uv": obs.get("uv"),
+        "aqi": aqi,
+        "pm25": pm25,
+        "pm10": pm10,
+    })
+    storage.commit(conn)
     conn.close()
     print(
         f"  Outside: {imp['temp']}°F, {obs['humidity']}% humidity, "
@@ -119,10 +88,11 @@ def run_weather_collector():
     while True:
         try:
             print(f"\nCollecting weather at {time.strftime('%Y-%m-%d %H:%M:%S')}...")
-            collect_weather_once()
+            with profiler.track("weather cycle", "cycle"):
+                collect_weather_once()
         except Exception as e:
             print(f"Error collecting weather data: {e}")
-        time.sleep(config.WU_POLL_INTERVAL_SECONDS)
+        time.sleep(scheduler.next_interval("Weather", config.WU_POLL_INTERVAL_SECONDS))
 
 
 if __name__ == "__main__":